@@ -1,3 +1,20 @@
 from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
 
-# Register your models here.
+from tickets.pagination import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+@admin.register(User)
+class CustomUserAdmin(UserAdmin):
+    fieldsets = UserAdmin.fieldsets + (('Helpdesk', {'fields': ('company', 'role')}),)
+    add_fieldsets = UserAdmin.add_fieldsets + (('Helpdesk', {'fields': ('company', 'role')}),)
+    list_display = ['username', 'email', 'company', 'role', 'is_active', 'is_staff']
+    list_select_related = ['company']
+    # choice filters, the default groups filter loads every group
+    list_filter = ['role', 'is_staff', 'is_superuser', 'is_active']
+    autocomplete_fields = ['company']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
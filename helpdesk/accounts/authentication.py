@@ -0,0 +1,143 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+User = get_user_model()
+
+# user fields embedded in every token, enough for the permission checks
+CLAIMS = ('role', 'company_id', 'is_superuser', 'is_staff', 'is_active')
+
+
+def user_claims(user):
+    return {claim: getattr(user, claim) for claim in CLAIMS}
+
+
+def claims_cache_key(user_id):
+    return f'auth:claims:{user_id}'
+
+
+def add_claims(token, user):
+    for claim, value in user_claims(user).items():
+        token[claim] = value
+    return token
+
+
+def load_user(user):
+    """The model instance behind ``request.user``, for code that writes to it."""
+    if isinstance(user, User):
+        return user
+    return User.objects.get(pk=user.pk)
+
+
+def publish_claims(user_id, claims):
+    # tokens carrying other claims stop authenticating until they are refreshed;
+    # any token issued before this expires within the access token lifetime
+    cache.set(claims_cache_key(user_id), claims, timeout=api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def publish_saved_user(sender, instance, **kwargs):
+    publish_claims(instance.pk, user_claims(instance))
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def publish_deleted_user(sender, instance, **kwargs):
+    publish_claims(instance.pk, {**user_claims(instance), 'is_active': False})
+
+
+class ClaimsTokenUser(TokenUser):
+    """A request user built from the token claims, with no database row behind it."""
+
+    @cached_property
+    def id(self):
+        # the claim is a string, compare and store it like the model's primary key
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    @cached_property
+    def role(self):
+        return self.token['role']
+
+    @cached_property
+    def company_id(self):
+        return self.token['company_id']
+
+    @cached_property
+    def is_active(self):
+        return self.token['is_active']
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that, with JWT_STATELESS_AUTH on, trusts the token's
+    claims instead of loading the user on every request.
+
+    Saving a user publishes their current claims to the cache for one access
+    token lifetime, and tokens whose claims differ are rejected, so a role
+    change takes effect as soon as the client refreshes. That cache must be
+    shared by every process (Redis, Memcached or the database cache).
+    """
+
+    def get_user(self, validated_token):
+        if not self.is_stateless(validated_token):
+            # tokens issued before claims were embedded still load the user
+            return super().get_user(validated_token)
+
+        user = api_settings.TOKEN_USER_CLASS(validated_token)
+        self.check_claims(validated_token, cache.get(claims_cache_key(user.pk)))
+        return user
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for async views, the claims check doesn't leave the event loop."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if not self.is_stateless(validated_token):
+            return await sync_to_async(super().get_user)(validated_token)
+
+        user = api_settings.TOKEN_USER_CLASS(validated_token)
+        self.check_claims(validated_token, await cache.aget(claims_cache_key(user.pk)))
+        return user
+
+    def is_stateless(self, validated_token):
+        return settings.JWT_STATELESS_AUTH and all(claim in validated_token for claim in CLAIMS)
+
+    def check_claims(self, validated_token, current):
+        if current is not None and current != {claim: validated_token[claim] for claim in CLAIMS}:
+            raise AuthenticationFailed('Token claims are out of date, refresh the token.', code='token_not_valid')
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # the refresh token's claims may predate a role change, reissue them from the user row
+        access = AccessToken(data['access'])
+        add_claims(access, User.objects.get(**{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]}))
+        data['access'] = str(access)
+        return data
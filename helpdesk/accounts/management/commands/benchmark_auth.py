@@ -0,0 +1,76 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.contrib.auth import get_user_model
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from tickets.models import Ticket, Company
+from tickets.benchmarking import latency_summary
+from accounts.authentication import add_claims
+import json
+import statistics
+import time
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare authenticated request throughput with the user loaded per request and with '
+        'JWT_STATELESS_AUTH, on the same endpoints and data. Runs in a rolled back transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode')
+        parser.add_argument('--tickets', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = self.run_suite(options['requests'], options['tickets'])
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps({'database': connection.vendor, 'endpoints': report}, indent=2))
+
+    def run_suite(self, requests, tickets):
+        company = Company.objects.create(name='Benchmark', slug='benchmark-auth', email='bench@example.com')
+        agent = User.objects.create(username='benchmark-auth-agent', company=company, role='agent')
+        created = Ticket.objects.bulk_create([
+            Ticket(company=company, subject=f'Benchmark {i}', description='...', assigned_to=agent)
+            for i in range(tickets)
+        ])
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_claims(RefreshToken.for_user(agent), agent).access_token}')
+
+        endpoints = {
+            'ticket_list': f'/api/companies/{company.slug}/tickets/',
+            'ticket_detail': f'/api/companies/{company.slug}/tickets/{created[0].public_id}/',
+            'profile_list': '/api/profiles/',
+        }
+        report = {}
+        for name, url in endpoints.items():
+            report[name] = {}
+            for mode, stateless in [('database_user', False), ('stateless', True)]:
+                with override_settings(JWT_STATELESS_AUTH=stateless):
+                    report[name][mode] = self.measure(client, url, requests)
+            speedup = report[name]['stateless']['requests_per_second'] / report[name]['database_user']['requests_per_second']
+            report[name]['speedup'] = round(speedup, 3)
+            self.stderr.write(f'{name}: {speedup:.2f}x')
+        return report
+
+    def measure(self, client, url, requests):
+        timings = []
+        query_counts = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as queries:
+                request_started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - request_started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url} failed with {response.status_code}: {response.data}')
+            query_counts.append(len(queries))
+        elapsed = time.perf_counter() - started
+        return {
+            'requests_per_second': round(requests / elapsed, 1),
+            **latency_summary(timings),
+            'queries_per_request': statistics.fmean(query_counts),
+        }
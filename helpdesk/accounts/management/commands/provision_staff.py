@@ -0,0 +1,35 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import IntegrityError
+from tickets.models import Company
+from accounts.provisioning import provision_users
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        'Create the users of a JSON file in a company, like POST /api/profiles/provision/ without its '
+        'size limit. Passwords are hashed in this process unless --workers starts a pool.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('company', help='Slug of the company the users join')
+        parser.add_argument('path', help='JSON array of users, the items of the provision endpoint')
+        parser.add_argument('--workers', type=int, default=0, help='Processes hashing the passwords, 0 or 1 hashes them here')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        company = Company.objects.filter(slug=options['company']).first()
+        if company is None:
+            raise CommandError(f'No company with the slug {options["company"]}.')
+        with open(options['path']) as file:
+            items = json.load(file)
+        if not isinstance(items, list):
+            raise CommandError('Expected a JSON array of users.')
+
+        try:
+            created, results = provision_users(
+                items, company.pk, allow_admins=True, workers=options['workers'], batch_size=options['batch_size']
+            )
+        except IntegrityError:
+            raise CommandError('A username was taken while provisioning, run the command again.')
+        self.stdout.write(json.dumps({'created': created, 'failed': len(items) - created, 'results': results}, indent=2))
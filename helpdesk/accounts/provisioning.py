@@ -0,0 +1,134 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+from tickets.models import AgentLoad
+from tickets.routing import ROUTABLE_ROLES
+from .serializers import ProvisionUserSerializer
+
+User = get_user_model()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _setup_worker():
+    # forked workers inherit a configured Django, spawned ones start without it
+    if not apps.ready:
+        django.setup()
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(workers, initializer=_setup_worker)
+        return _executor
+
+
+def hash_passwords(passwords, workers=0):
+    """
+    ``make_password`` of each password. With 2 or more ``workers`` they are
+    hashed in a pool of that many processes, kept for the life of this
+    process, so a large provision isn't bound to one core.
+    """
+    if workers < 2 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    executor = _get_executor(workers)
+    chunksize = max(1, len(passwords) // (workers * 4))
+    try:
+        return list(executor.map(make_password, passwords, chunksize=chunksize))
+    except BrokenProcessPool:
+        # a killed worker breaks the pool for good, the next call starts a new one
+        global _executor
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        raise
+
+
+def provision_users(items, company_id, allow_admins, workers=0, batch_size=500):
+    """
+    Create the users described by ``items`` in the company, with one query
+    checking usernames and emails. Returns how many were created and a
+    result per item: the user, or the errors that made it skip the item.
+    Raises IntegrityError when a username is taken while it runs.
+    """
+    # one serializer validates every item, invalid items are reported and skipped
+    serializer = ProvisionUserSerializer()
+    errors = {}
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            data = serializer.run_validation(item)
+        except ValidationError as exc:
+            errors[index] = exc.detail
+            continue
+        if data['role'] == 'admin' and not allow_admins:
+            errors[index] = {"role": ["Only owners can assign admin role."]}
+            continue
+        valid.append((index, data))
+
+    # one query for the usernames and emails already in use, the batch is checked against itself
+    taken = User.objects.filter(
+        Q(username__in=[data['username'] for _, data in valid]) | Q(email__in=[data['email'] for _, data in valid])
+    ).values_list('username', 'email')
+    taken_usernames = {username for username, _ in taken}
+    taken_emails = {email for _, email in taken}
+    users = {}
+    passwords = {}
+    for index, data in valid:
+        if data['username'] in taken_usernames:
+            errors[index] = {"username": ["Username is already taken."]}
+            continue
+        if data['email'] in taken_emails:
+            errors[index] = {"email": ["Email is already in use."]}
+            continue
+        taken_usernames.add(data['username'])
+        taken_emails.add(data['email'])
+        password = data.pop('password', None)
+        users[index] = User(company_id=company_id, **data)
+        if password is None:
+            # invited users choose their password through register/accept_invite
+            users[index].set_unusable_password()
+        else:
+            passwords[index] = password
+
+    for index, encoded in zip(passwords, hash_passwords(list(passwords.values()), workers)):
+        users[index].password = encoded
+
+    with transaction.atomic():
+        User.objects.bulk_create(users.values(), batch_size=batch_size)
+        if any(user.pk is None for user in users.values()):
+            # backends that don't return inserted ids
+            ids = dict(User.objects.filter(
+                username__in=[user.username for user in users.values()]
+            ).values_list('username', 'pk'))
+            for user in users.values():
+                user.pk = ids[user.username]
+        # bulk_create skips post_save, new agents start routing with no load
+        AgentLoad.objects.bulk_create([
+            AgentLoad(agent_id=user.pk, company_id=user.company_id, load=0)
+            for user in users.values() if user.company_id and user.role in ROUTABLE_ROLES
+        ], batch_size=batch_size)
+
+    results = []
+    for index in range(len(items)):
+        if index in errors:
+            results.append({"index": index, "errors": errors[index]})
+            continue
+        user = users[index]
+        result = {"index": index, "id": user.pk, "username": user.username, "role": user.role}
+        if index not in passwords:
+            result["invite_token"] = default_token_generator.make_token(user)
+        results.append(result)
+    return len(users), results
@@ -1,4 +1,6 @@
 from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.auth.validators import UnicodeUsernameValidator
 from rest_framework import serializers
 
 
@@ -50,4 +52,37 @@ class AssignAgentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("You can only assign the agent role.")
         return value
 
-    
\ No newline at end of file
+    
+class ProvisionUserSerializer(serializers.ModelSerializer):
+    """One user of a bulk provision, without a password they get an invite token instead."""
+    password = serializers.CharField(write_only=True, required=False)
+    role = serializers.ChoiceField(choices=['admin', 'agent', 'customer'], default='agent')
+
+    class Meta:
+        model = User
+        fields = ['username', 'email', 'first_name', 'last_name', 'role', 'password']
+        # uniqueness is checked for the whole batch in one query
+        extra_kwargs = {
+            'username': {'validators': [UnicodeUsernameValidator()]},
+            'email': {'required': True, 'allow_blank': False},
+        }
+
+
+class AcceptInviteSerializer(serializers.Serializer):
+    user = serializers.IntegerField()
+    token = serializers.CharField()
+    password = serializers.CharField(write_only=True)
+
+    def validate(self, data):
+        user = User.objects.filter(pk=data['user'], is_active=True).first()
+        # the token stops working once a password is set
+        if user is None or user.has_usable_password() or not default_token_generator.check_token(user, data['token']):
+            raise serializers.ValidationError("Invalid or expired invite.")
+        data['user'] = user
+        return data
+
+    def save(self):
+        user = self.validated_data['user']
+        user.set_password(self.validated_data['password'])
+        user.save()
+        return user
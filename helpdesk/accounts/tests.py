@@ -1,3 +1,186 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from tickets.models import AgentLoad, Ticket, Company
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(JWT_STATELESS_AUTH=True)
+class StatelessJWTTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(
+            username='owner', password='password123', company=self.company, role='owner'
+        )
+        self.member = User.objects.create_user(
+            username='member', password='password123', company=self.company, role='agent'
+        )
+        self.ticket = Ticket.objects.create(
+            company=self.company, subject='a', description='...', assigned_to=self.member
+        )
+        self.url = f'/api/companies/{self.company.slug}/tickets/'
+
+    def login(self, user):
+        tokens = self.client.post(
+            '/api/token/', {'username': user.username, 'password': 'password123'}, format='json'
+        ).data
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        return tokens
+
+    def test_token_claims_replace_the_user_query(self):
+        tokens = self.login(self.member)
+        access = AccessToken(tokens['access'])
+        self.assertEqual((access['role'], access['company_id'], access['is_superuser']), ('agent', self.company.pk, False))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertFalse(any('accounts_customuser' in query['sql'] for query in queries.captured_queries))
+
+    def test_role_change_revokes_outstanding_tokens(self):
+        tokens = self.login(self.member)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.login(self.owner)
+        response = self.client.post(f'/api/profiles/{self.member.pk}/assign_role/', {'role': 'customer'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+        refreshed = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json').data
+        self.assertEqual(AccessToken(refreshed['access'])['role'], 'customer')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {refreshed['access']}")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # customers only see tickets they opened
+        self.assertEqual(response.data['results'], [])
+
+    def test_owner_cannot_change_their_own_role(self):
+        self.login(self.owner)
+        response = self.client.post(f'/api/profiles/{self.owner.pk}/assign_role/', {'role': 'customer'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.role, 'owner')
+
+    def test_token_user_can_write(self):
+        self.login(self.member)
+        response = self.client.post(self.url, {'subject': 'b', 'description': '...'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Ticket.objects.get(public_id=response.data['public_id']).user_id, self.member.pk)
+
+        customer = User.objects.create_user(username='customer', password='password123')
+        self.login(customer)
+        response = self.client.post(
+            '/api/companies/', {'name': 'Globex', 'slug': 'globex', 'email': 'globex@example.com'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        customer.refresh_from_db()
+        self.assertEqual(customer.role, 'owner')
+
+
+class ProvisionStaffTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.admin = User.objects.create_user(username='admin', company=self.company, role='admin')
+        User.objects.create_user(username='taken', email='taken@example.com')
+        self.url = '/api/profiles/provision/'
+
+    @override_settings(PASSWORD_HASH_WORKERS=2)
+    def test_provisions_a_batch_with_one_uniqueness_query(self):
+        self.client.force_authenticate(self.owner)
+        items = [
+            {'username': 'agent1', 'email': 'agent1@example.com', 'password': 'password123'},
+            {'username': 'agent2', 'email': 'agent2@example.com', 'password': 'password456'},
+            {'username': 'lead', 'email': 'lead@example.com', 'role': 'admin'},
+            {'username': 'agent1', 'email': 'other@example.com'},
+            {'username': 'new', 'email': 'taken@example.com'},
+            {'username': 'nomail'},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (3, 3))
+        errors = {result['index']: result['errors'] for result in response.data['results'] if 'errors' in result}
+        self.assertEqual(list(errors), [3, 4, 5])
+        self.assertIn('username', errors[3])
+        self.assertIn('email', errors[4])
+        self.assertIn('email', errors[5])
+        lookups = [query for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(lookups), 1)
+
+        agent = User.objects.get(username='agent2')
+        self.assertEqual((agent.company_id, agent.role), (self.company.pk, 'agent'))
+        self.assertTrue(agent.check_password('password456'))
+        self.assertFalse(User.objects.get(username='lead').has_usable_password())
+        self.assertEqual(
+            set(AgentLoad.objects.filter(company=self.company).values_list('agent__username', flat=True)),
+            {'admin', 'agent1', 'agent2', 'lead'}
+        )
+        # only invited users get a token
+        self.assertEqual([result['username'] for result in response.data['results'] if 'invite_token' in result], ['lead'])
+
+    def test_invite_token_sets_the_password_once(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(self.url, [{'username': 'invited', 'email': 'invited@example.com'}], format='json')
+        self.assertEqual(response.status_code, 201)
+        result = response.data['results'][0]
+
+        self.client.force_authenticate(None)
+        accept = {'user': result['id'], 'token': result['invite_token'], 'password': 'chosen-password'}
+        self.assertEqual(self.client.post('/api/register/accept_invite/', accept, format='json').status_code, 200)
+        self.assertTrue(User.objects.get(username='invited').check_password('chosen-password'))
+        accept['password'] = 'another-password'
+        self.assertEqual(self.client.post('/api/register/accept_invite/', accept, format='json').status_code, 400)
+
+    def test_only_owners_provision_admins_and_only_staff_provision(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(self.url, [{'username': 'lead', 'email': 'lead@example.com', 'role': 'admin'}], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertIn('role', response.data['results'][0]['errors'])
+
+        agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.client.force_authenticate(agent)
+        response = self.client.post(self.url, [{'username': 'x', 'email': 'x@example.com'}], format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(User.objects.filter(username='x').exists())
+
+    def test_company_less_staff_cannot_provision(self):
+        owner = User.objects.create_user(username='loose', role='owner')
+        self.client.force_authenticate(owner)
+        response = self.client.post(self.url, [{'username': 'x', 'email': 'x@example.com'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(username='x').exists())
+
+    def test_command_provisions_a_file_with_a_hashing_pool(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'users.json')
+        with open(path, 'w') as output:
+            json.dump([
+                {'username': 'agent1', 'email': 'agent1@example.com', 'password': 'password123'},
+                {'username': 'agent2', 'email': 'agent2@example.com', 'password': 'password456'},
+                {'username': 'lead', 'email': 'lead@example.com', 'role': 'admin'},
+                {'username': 'new', 'email': 'taken@example.com'},
+            ], output)
+        output = io.StringIO()
+        call_command('provision_staff', self.company.slug, path, workers=2, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual((report['created'], report['failed']), (3, 1))
+        self.assertIn('email', report['results'][3]['errors'])
+        self.assertTrue(User.objects.get(username='agent2').check_password('password456'))
+        self.assertEqual(User.objects.get(username='lead').role, 'admin')
+        self.assertIn('invite_token', report['results'][2])
+        self.assertTrue(AgentLoad.objects.filter(agent__username='agent1', company=self.company).exists())
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.shortcuts import render
 from rest_framework import viewsets
-from .serializers import RegisterSerializer, ProfileSerializer, AssignAgentSerializer
+from .serializers import RegisterSerializer, ProfileSerializer, AssignAgentSerializer, AcceptInviteSerializer
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
 from rest_framework.decorators import action
@@ -9,6 +10,8 @@ from rest_framework import status
 from rest_framework.decorators import action
 from .permissions import CanAssignAgent
 from django.shortcuts import get_object_or_404
+from django.db import IntegrityError
+from .provisioning import provision_users
 
 # Create your views here.
 User = get_user_model()
@@ -18,18 +21,30 @@ class RegisterViewSet(viewsets.ModelViewSet):
     serializer_class = RegisterSerializer
     http_method_names = ['post']
 
+    @action(detail=False, methods=['post'])
+    def accept_invite(self, request):
+        serializer = AcceptInviteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.save()
+        return Response(
+            {"detail": "Password set.", "user": ProfileSerializer(user).data},
+            status=status.HTTP_200_OK
+        )
+
 
 class ProfileViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
+    provision_max_items = 500
+    provision_batch_size = 500
 
     def get_queryset(self):
         user = self.request.user
         if user.is_superuser:
             return User.objects.all()
-        if hasattr(user, 'company') and user.role in ['owner', 'admin']:
-            return User.objects.filter(company=user.company)
+        if user.company_id and user.role in ['owner', 'admin']:
+            return User.objects.filter(company_id=user.company_id)
         return User.objects.filter(id=user.id)
     
     @action(detail=True, methods=['post'], permission_classes=[CanAssignAgent])
@@ -43,7 +58,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
         new_role = serializer.validated_data['role']
         actor = request.user
 
-        if actor == user_to_update:
+        if actor.pk == user_to_update.pk:
             return Response(
                 {"detail": "You cannot change your own role."},
                 status=status.HTTP_403_FORBIDDEN
@@ -56,7 +71,7 @@ class ProfileViewSet(viewsets.ModelViewSet):
             )
 
         serializer.save(
-            company=actor.company
+            company_id=actor.company_id
         )
         return Response(
             {
@@ -65,3 +80,43 @@ class ProfileViewSet(viewsets.ModelViewSet):
             },
             status=status.HTTP_200_OK
         )
+
+    @action(detail=False, methods=['post'], permission_classes=[CanAssignAgent])
+    def provision(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {"detail": "Expected a list of users."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.provision_max_items:
+            return Response(
+                {"detail": f"A provisioning request can create at most {self.provision_max_items} users."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        actor = request.user
+        if actor.company_id is None:
+            return Response(
+                {"detail": "Only staff of a company can provision users."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            created, results = provision_users(
+                items, actor.company_id, allow_admins=actor.role == 'owner',
+                workers=settings.PASSWORD_HASH_WORKERS, batch_size=self.provision_batch_size
+            )
+        except IntegrityError:
+            return Response(
+                {"detail": "A username was taken while provisioning, retry the request."},
+                status=status.HTTP_409_CONFLICT
+            )
+        failed = len(items) - created
+        return Response(
+            {
+                "created": created,
+                "failed": failed,
+                "results": results
+            },
+            status=status.HTTP_201_CREATED if not failed else status.HTTP_207_MULTI_STATUS
+        )
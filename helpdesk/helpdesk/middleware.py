@@ -0,0 +1,184 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('helpdesk.performance')
+
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RequestMetrics:
+    """Per-request counters, also installed as the database execute wrapper."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.statements = {}
+        self.timings = {}
+        self.view_started = None
+        self.view_finished = None
+        self.render_finished = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.db_ms += elapsed
+            # statements are grouped by their parameterized SQL, so N+1 loops add up
+            count, total = self.statements.get(sql, (0, 0.0))
+            self.statements[sql] = (count + 1, total + elapsed)
+
+    def add(self, name, elapsed_ms):
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed_ms
+
+    def repeated_statements(self, limit=5):
+        repeated = [
+            {'sql': sql, 'count': count, 'total_ms': round(total, 3)}
+            for sql, (count, total) in self.statements.items() if count > 1
+        ]
+        repeated.sort(key=lambda statement: statement['count'], reverse=True)
+        return repeated[:limit]
+
+
+class RouteHistograms:
+    """Process-local latency histograms keyed by ``"<METHOD> <route>"``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def observe(self, route, total_ms, db_ms, queries):
+        bucket = bisect.bisect_left(HISTOGRAM_BUCKETS_MS, total_ms)
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = {
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'db_ms': 0.0,
+                    'queries': 0,
+                    'buckets': [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+                }
+            entry['count'] += 1
+            entry['total_ms'] += total_ms
+            entry['db_ms'] += db_ms
+            entry['queries'] += queries
+            entry['buckets'][bucket] += 1
+
+    def snapshot(self):
+        labels = [f'le_{bound}' for bound in HISTOGRAM_BUCKETS_MS] + ['inf']
+        with self._lock:
+            return {
+                route: {
+                    'count': entry['count'],
+                    'mean_ms': round(entry['total_ms'] / entry['count'], 3),
+                    'mean_db_ms': round(entry['db_ms'] / entry['count'], 3),
+                    'mean_queries': round(entry['queries'] / entry['count'], 3),
+                    'buckets': dict(zip(labels, entry['buckets'])),
+                }
+                for route, entry in self._routes.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+histograms = RouteHistograms()
+
+
+@contextmanager
+def timing(request, name):
+    """Time a block as its own Server-Timing entry, a no-op when instrumentation is off."""
+    metrics = getattr(request, '_performance', None)
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, (time.perf_counter() - started) * 1000)
+
+
+class PerformanceMiddleware:
+    """
+    Opt-in per-request instrumentation, enabled with PERFORMANCE_INSTRUMENTATION.
+
+    Adds a Server-Timing header with SQL, view, render and total time, feeds
+    the per-route histograms and logs requests slower than
+    PERFORMANCE_SLOW_REQUEST_MS together with their repeated SQL statements.
+    DRF authenticates and serializes inside the view, so that time is part
+    of ``view`` unless a block is wrapped with ``timing()``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, 'PERFORMANCE_SLOW_REQUEST_MS', 500)
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        request._performance = metrics
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        finished = time.perf_counter()
+
+        total_ms = (finished - started) * 1000
+        view_ms = render_ms = None
+        if metrics.view_started is not None:
+            view_ms = ((metrics.view_finished or finished) - metrics.view_started) * 1000
+        if metrics.view_finished is not None and metrics.render_finished is not None:
+            render_ms = (metrics.render_finished - metrics.view_finished) * 1000
+
+        entries = [f'db;dur={metrics.db_ms:.2f};desc="{metrics.queries} queries"']
+        entries += [f'{name};dur={elapsed:.2f}' for name, elapsed in metrics.timings.items()]
+        if view_ms is not None:
+            entries.append(f'view;dur={view_ms:.2f}')
+        if render_ms is not None:
+            entries.append(f'render;dur={render_ms:.2f}')
+        entries.append(f'total;dur={total_ms:.2f}')
+        response['Server-Timing'] = ', '.join(entries)
+
+        match = request.resolver_match
+        route = f'{request.method} {match.route if match else "unresolved"}'
+        histograms.observe(route, total_ms, metrics.db_ms, metrics.queries)
+
+        if total_ms >= self.slow_request_ms:
+            record = {
+                'route': route,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 3),
+                'db_ms': round(metrics.db_ms, 3),
+                'queries': metrics.queries,
+                'view_ms': round(view_ms, 3) if view_ms is not None else None,
+                'render_ms': round(render_ms, 3) if render_ms is not None else None,
+                'timings': {name: round(elapsed, 3) for name, elapsed in metrics.timings.items()},
+                'repeated_sql': metrics.repeated_statements(),
+            }
+            logger.warning('Slow request %s', json.dumps(record), extra={'performance': record})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._performance.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        metrics = request._performance
+        metrics.view_finished = time.perf_counter()
+
+        def finish_render(response):
+            metrics.render_finished = time.perf_counter()
+        response.add_post_render_callback(finish_render)
+        return response
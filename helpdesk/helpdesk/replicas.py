@@ -0,0 +1,130 @@
+import hashlib
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'helpdesk_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# routing state of the current request, None outside requests (commands, shells, workers)
+_state = ContextVar('replica_routing', default=None)
+_replicas = itertools.count()
+
+
+class RoutingState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+@contextmanager
+def read_from_replica():
+    """Let reads in the block go to a replica, e.g. for a report in a management command."""
+    token = _state.set(RoutingState(use_replica=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Send reads to the DATABASE_REPLICAS and writes to the primary.
+
+    Only reads of safe requests go to a replica: unsafe requests, code
+    outside requests and open transactions read the primary. Once anything
+    is written the rest of the request reads the primary too, and
+    ReplicaRoutingMiddleware pins the client to it for
+    REPLICA_STICKY_SECONDS, so a create followed by a retrieve finds the row
+    even while the replicas lag.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        replicas = settings.DATABASE_REPLICAS
+        if state is None or not state.use_replica or not replicas:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replicas[next(_replicas) % len(replicas)]
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+            state.use_replica = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Decide per request whether its reads may use a replica, and pin clients that wrote."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState(use_replica=self.may_use_replica(request))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response, state)
+
+    async def __acall__(self, request):
+        # views run in worker threads with a copy of this context, sharing the state object
+        state = RoutingState(use_replica=self.may_use_replica(request))
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response, state)
+
+    def may_use_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        try:
+            if float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+                return False
+        except ValueError:
+            pass
+        key = self.client_key(request)
+        return key is None or not cache.get(key)
+
+    def pin(self, request, response, state):
+        if not state.wrote:
+            return response
+        sticky = settings.REPLICA_STICKY_SECONDS
+        # browsers send the cookie back, token clients are recognized by their credentials
+        response.set_cookie(PIN_COOKIE, str(time.time() + sticky), max_age=sticky, httponly=True, samesite='Lax')
+        key = self.client_key(request)
+        if key is not None:
+            cache.set(key, True, timeout=sticky)
+        return response
+
+    def client_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return f'replica-pin:{hashlib.sha1(authorization.encode()).hexdigest()}'
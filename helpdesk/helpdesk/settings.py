@@ -56,10 +56,18 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tickets.tenancy.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Opt-in per-request instrumentation: Server-Timing headers, slow request
+# logging and per-route histograms served from /api/performance/
+PERFORMANCE_INSTRUMENTATION = os.getenv('PERFORMANCE_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+PERFORMANCE_SLOW_REQUEST_MS = int(os.getenv('PERFORMANCE_SLOW_REQUEST_MS', '500'))
+if PERFORMANCE_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'helpdesk.middleware.PerformanceMiddleware')
+
 ROOT_URLCONF = 'helpdesk.urls'
 
 TEMPLATES = [
@@ -105,6 +113,24 @@ else:
     }
 
 
+# Optional read replicas: a comma-separated list of database URLs. Reads of
+# safe requests are spread over them, writes and the reads of clients that
+# just wrote stay on the primary for REPLICA_STICKY_SECONDS.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+DATABASE_REPLICAS = []
+for index, url in enumerate(DATABASE_REPLICA_URLS, 1):
+    DATABASES[f'replica{index}'] = {
+        **dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True),
+        # tests read the primary through the replica aliases
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['helpdesk.replicas.ReplicaRouter']
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1, 'helpdesk.replicas.ReplicaRoutingMiddleware')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -123,6 +149,12 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Processes hashing the passwords of a bulk staff provisioning request, 0 or 1
+# hashes them in the request's thread. A pool per web worker multiplies the
+# processes of the deployment, large imports belong to provision_staff --workers.
+# Invited users are not hashed up front.
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '0'))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -147,7 +179,7 @@ REST_FRAMEWORK ={
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ]
 }
@@ -163,4 +195,36 @@ SIMPLE_JWT = {
        # Token Rotation (IMPORTANT FOR SECURITY)
     'ROTATE_REFRESH_TOKENS': True,                   # Generate new refresh token on refresh
     'BLACKLIST_AFTER_ROTATION': True,                # Blacklist old refresh tokens
-}
\ No newline at end of file
+    # tokens carry role, company_id and is_superuser claims
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.authentication.ClaimsTokenRefreshSerializer',
+    'TOKEN_USER_CLASS': 'accounts.authentication.ClaimsTokenUser',
+}
+
+# Opt-in: authenticate API requests from the token claims without loading the
+# user row. Role changes are revoked through the cache, so every process must
+# share one cache backend when this is on.
+JWT_STATELESS_AUTH = os.getenv('JWT_STATELESS_AUTH', '').lower() in ('1', 'true', 'yes')
+
+# Opt-in: serve the ticket list, detail and create routes with async views.
+# Only worth it under an ASGI server (helpdesk.asgi), under WSGI every
+# request pays for a new event loop instead.
+ASYNC_TICKET_VIEWS = os.getenv('ASYNC_TICKET_VIEWS', '').lower() in ('1', 'true', 'yes')
+
+# archive_tickets moves closed tickets untouched for this many days out of
+# the ticket table; the resolution endpoints and public lookups still read them.
+TICKET_ARCHIVE_AFTER_DAYS = int(os.getenv('TICKET_ARCHIVE_AFTER_DAYS', '180'))
+
+# The ticket changes feed only returns rows older than this many seconds, so
+# a transaction that commits after a sync can't land behind the client's
+# token. Keep it above the longest ticket-writing transaction.
+TICKET_SYNC_SETTLE_SECONDS = float(os.getenv('TICKET_SYNC_SETTLE_SECONDS', '2'))
+# Tombstones are kept this long; older sync tokens must sync from scratch.
+TICKET_SYNC_TOMBSTONE_DAYS = int(os.getenv('TICKET_SYNC_TOMBSTONE_DAYS', '30'))
+
+# Admin changelists on Postgres show the planner's row estimate instead of
+# running COUNT(*) once the estimate passes this many rows.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.getenv('ADMIN_ESTIMATED_COUNT_THRESHOLD', '10000'))
+
+# prune_ticket_events deletes outbox events delivered, or given up, this many days ago.
+TICKET_EVENT_RETENTION_DAYS = int(os.getenv('TICKET_EVENT_RETENTION_DAYS', '7'))
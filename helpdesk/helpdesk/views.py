@@ -0,0 +1,26 @@
+import os
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .middleware import HISTOGRAM_BUCKETS_MS, histograms
+
+
+class PerformanceStatsView(APIView):
+    """Per-route latency histograms collected by PerformanceMiddleware in this worker process."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': settings.PERFORMANCE_INSTRUMENTATION,
+            'pid': os.getpid(),
+            'buckets_ms': HISTOGRAM_BUCKETS_MS,
+            'routes': histograms.snapshot(),
+        })
+
+    def delete(self, request):
+        histograms.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,3 +1,186 @@
-from django.contrib import admin
+from uuid import UUID
 
-# Register your models here.
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .counters import counter_key, record_change
+from .models import Company, Ticket, TicketResolution, TicketTombstone
+from .outbox import record_events, ticket_event
+from .pagination import EstimatedCountPaginator
+from .routing import ROUTABLE_ROLES
+from .search import search_tickets
+from .transitions import delete_tickets, reassign_tickets, transition_tickets
+
+User = get_user_model()
+
+
+class CompanyFilter(admin.SimpleListFilter):
+    """
+    Tickets of one company, linked from the company admin. Only the selected
+    company is listed, since offering every company would load them all on
+    each page. Every ticket index leads with the company, so the status and
+    priority filters narrow an index range within it.
+    """
+    title = 'company'
+    parameter_name = 'company'
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value or not value.isdigit():
+            return []
+        return Company.objects.filter(pk=value).values_list('pk', 'name')
+
+    def queryset(self, request, queryset):
+        # a hand-edited ?company=abc lists every ticket instead of failing
+        if self.value() and self.value().isdigit():
+            return queryset.filter(company_id=self.value())
+        return queryset
+
+
+class TicketActionForm(ActionForm):
+    resolution_message = forms.CharField(required=False, help_text='Required to close tickets')
+    agent = forms.CharField(required=False, label='Agent username', help_text='Required to reassign tickets')
+
+
+class TicketAdminForm(forms.ModelForm):
+    class Meta:
+        model = Ticket
+        fields = '__all__'
+
+    def clean_assigned_to(self):
+        agent = self.cleaned_data['assigned_to']
+        if agent is not None and agent.company_id != self.instance.company_id:
+            raise forms.ValidationError('The agent does not belong to the same company as the ticket.')
+        if agent is not None and agent.role not in ROUTABLE_ROLES:
+            raise forms.ValidationError('Tickets can only be assigned to agents and admins.')
+        return agent
+
+
+@admin.register(Ticket)
+class TicketAdmin(admin.ModelAdmin):
+    """
+    Tickets are created through the API, which routes them. Status changes
+    go through the close action, so they get a resolution, and every write
+    here keeps counters, agent loads, tombstones and the outbox in step
+    like the API does.
+    """
+    form = TicketAdminForm
+    action_form = TicketActionForm
+    actions = ['close_tickets', 'reassign_tickets']
+    list_display = ['subject', 'company', 'status', 'priority', 'assigned_to', 'user', 'created_at']
+    list_select_related = ['company', 'user', 'assigned_to']
+    list_filter = [CompanyFilter, 'status', 'priority']
+    # the owner/admin listing order, read from ticket_co_prio_created_idx
+    ordering = ['company', '-priority', 'created_at']
+    search_fields = ['subject', 'description']
+    search_help_text = 'A ticket id, or words of the subject and description.'
+    fields = [
+        'public_id', 'company', 'user', 'status', 'priority', 'assigned_to',
+        'subject', 'description', 'first_name', 'last_name', 'email', 'created_at', 'updated_at',
+    ]
+    readonly_fields = ['public_id', 'company', 'user', 'status', 'created_at', 'updated_at']
+    autocomplete_fields = ['assigned_to']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            return queryset.filter(public_id=UUID(search_term)), False
+        except ValueError:
+            pass
+        # the API's full-text index instead of a LIKE scan per search field
+        return search_tickets(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        old_key, old_assigned_to = None, None
+        if change:
+            old = Ticket.objects.select_for_update().only('company', 'status', 'priority', 'assigned_to').get(pk=obj.pk)
+            old_key, old_assigned_to = counter_key(old), old.assigned_to_id
+        super().save_model(request, obj, form, change)
+        record_change(old_key, counter_key(obj))
+        if obj.assigned_to_id != old_assigned_to:
+            if old_assigned_to is not None:
+                # drops out of the previous agent's changes feed
+                TicketTombstone.objects.create(
+                    company_id=obj.company_id, public_id=obj.public_id, user=obj.user_id,
+                    assigned_to=old_assigned_to, reason='unassigned'
+                )
+            if obj.assigned_to_id is not None:
+                record_events([ticket_event('ticket.assigned', obj)])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            delete_tickets(Ticket.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            delete_tickets(queryset)
+
+    @admin.action(description='Close selected tickets', permissions=['change'])
+    def close_tickets(self, request, queryset):
+        message = request.POST.get('resolution_message', '').strip()
+        if not message:
+            self.message_user(request, 'Enter a resolution message to close tickets.', messages.ERROR)
+            return
+        with transaction.atomic():
+            closed = transition_tickets(queryset, 'closed', message)
+        self.message_user(request, f'Closed {len(closed)} tickets.', messages.SUCCESS)
+
+    @admin.action(description='Reassign selected tickets', permissions=['change'])
+    def reassign_tickets(self, request, queryset):
+        username = request.POST.get('agent', '').strip()
+        agents = User.objects.filter(
+            username=username, role__in=ROUTABLE_ROLES, company_id__in=queryset.values('company_id')
+        )
+        agent = agents.first() if username else None
+        if agent is None:
+            self.message_user(
+                request, 'Enter the username of an agent or admin of the selected tickets\' company to reassign them.',
+                messages.ERROR
+            )
+            return
+        with transaction.atomic():
+            reassigned = reassign_tickets(queryset, agent)
+        self.message_user(
+            request,
+            f'Reassigned {len(reassigned)} tickets to {agent.username}. Closed tickets, tickets already '
+            f'theirs and tickets of other companies were left alone.',
+            messages.SUCCESS
+        )
+
+
+@admin.register(TicketResolution)
+class TicketResolutionAdmin(admin.ModelAdmin):
+    list_display = ['ticket', 'created_at']
+    # the ticket's name includes its customer
+    list_select_related = ['ticket__user']
+    raw_id_fields = ['ticket']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Company)
+class CompanyAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'email', 'auto_assign', 'created_at', 'tickets']
+    search_fields = ['name', 'slug', 'email']
+    prepopulated_fields = {'slug': ['name']}
+    ordering = ['name']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.display(description='Tickets')
+    def tickets(self, obj):
+        url = reverse('admin:tickets_ticket_changelist')
+        return format_html('<a href="{}?{}={}">View tickets</a>', url, CompanyFilter.parameter_name, obj.pk)
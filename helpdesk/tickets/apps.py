@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TicketsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tickets'
+
+    def ready(self):
+        # connects the Company cache invalidation, counter and routing receivers
+        from . import tenancy, counters, routing  # noqa: F401
+        from .search import ensure_search_index
+        post_migrate.connect(ensure_search_index, sender=self)
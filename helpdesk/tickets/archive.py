@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import ArchivedTicket, ArchivedTicketResolution, Ticket, TicketResolution, TicketTombstone
+
+# columns the hot and archive tables share, copied as they are
+TICKET_COLUMNS = [
+    Ticket._meta.get_field(name).column for name in (
+        'public_id', 'company', 'user', 'first_name', 'last_name', 'email', 'subject',
+        'description', 'status', 'priority', 'created_at', 'updated_at', 'assigned_to',
+    )
+]
+RESOLUTION_COLUMNS = [TicketResolution._meta.get_field(name).column for name in ('ticket', 'message', 'created_at')]
+
+
+def archive_cutoff(days):
+    """Closed tickets last updated before this moment are archived."""
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable_tickets(cutoff, company_id=None):
+    """Closed tickets last updated before ``cutoff``, oldest first."""
+    tickets = Ticket.objects.filter(status='closed', updated_at__lt=cutoff)
+    if company_id is not None:
+        tickets = tickets.filter(company_id=company_id)
+    return tickets.order_by('updated_at', 'public_id')
+
+
+def archive_batch(cutoff, batch_size, company_id=None):
+    """
+    Move up to ``batch_size`` archivable tickets and their resolutions into
+    the archive tables. Returns ``(selected, moved)``, selected is 0 once
+    nothing is left to archive.
+
+    The copy and the delete run in one transaction with INSERT ... SELECT,
+    so rows never travel through Python and an interrupted run leaves only
+    whole batches behind. Counters don't change: they keep counting
+    archived tickets, and closed tickets carry no agent load. Each moved
+    ticket leaves a tombstone for the changes feed.
+    """
+    connection = connections[router.db_for_write(Ticket)]
+    quote = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias):
+        candidates = archivable_tickets(cutoff, company_id).values_list('public_id', flat=True)
+        if connection.features.has_select_for_update_skip_locked:
+            # tickets another transaction is writing wait for the next run
+            candidates = candidates.select_for_update(skip_locked=True)
+        public_ids = [
+            Ticket._meta.pk.get_db_prep_value(public_id, connection)
+            for public_id in candidates[:batch_size]
+        ]
+        if not public_ids:
+            return 0, 0
+
+        placeholders = ', '.join(['%s'] * len(public_ids))
+        ticket_table, resolution_table = quote(Ticket._meta.db_table), quote(TicketResolution._meta.db_table)
+        ticket_columns = ', '.join(map(quote, TICKET_COLUMNS))
+        resolution_columns = ', '.join(map(quote, RESOLUTION_COLUMNS))
+        # reopened since they were selected: stay hot
+        moving = f"{quote('public_id')} IN ({placeholders}) AND {quote('status')} = 'closed'"
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(TicketTombstone._meta.db_table)} "
+                f"({quote('company_id')}, {quote('public_id')}, {quote('user')}, {quote('assigned_to')}, "
+                f"{quote('reason')}, {quote('created_at')}) "
+                f"SELECT {quote('company_id')}, {quote('public_id')}, {quote('user_id')}, {quote('assigned_to_id')}, "
+                f"'archived', %s FROM {ticket_table} WHERE {moving}",
+                [TicketTombstone._meta.get_field('created_at').get_db_prep_save(now, connection), *public_ids]
+            )
+            cursor.execute(
+                f"INSERT INTO {quote(ArchivedTicket._meta.db_table)} ({ticket_columns}, {quote('archived_at')}) "
+                f"SELECT {ticket_columns}, %s FROM {ticket_table} WHERE {moving}",
+                [ArchivedTicket._meta.get_field('archived_at').get_db_prep_save(now, connection), *public_ids]
+            )
+            moved = cursor.rowcount
+            cursor.execute(
+                f"INSERT INTO {quote(ArchivedTicketResolution._meta.db_table)} ({resolution_columns}) "
+                f"SELECT {resolution_columns} FROM {resolution_table} "
+                f"WHERE {quote('ticket_id')} IN (SELECT {quote('public_id')} FROM {ticket_table} WHERE {moving})",
+                public_ids
+            )
+            cursor.execute(
+                f"DELETE FROM {resolution_table} "
+                f"WHERE {quote('ticket_id')} IN (SELECT {quote('public_id')} FROM {ticket_table} WHERE {moving})",
+                public_ids
+            )
+            cursor.execute(f'DELETE FROM {ticket_table} WHERE {moving}', public_ids)
+    return len(public_ids), moved
@@ -0,0 +1,128 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from accounts.authentication import ClaimsJWTAuthentication
+from .models import Ticket
+from .serializers import TicketListSerializer
+from .tenancy import aget_request_company_id
+from .views import TicketViewSet
+
+ticket_list_view = TicketViewSet.as_view({'get': 'list', 'post': 'create'})
+ticket_detail_view = TicketViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+})
+
+
+async def authenticate(request):
+    """JWT first, then the session, like the API's authentication classes."""
+    result = await ClaimsJWTAuthentication().aauthenticate(request)
+    if result is not None:
+        return result
+    user = await request._request.auser()
+    if user.is_authenticated and user.is_active:
+        if request.method not in SAFE_METHODS:
+            SessionAuthentication().enforce_csrf(request)
+        return user, None
+    return AnonymousUser(), None
+
+
+def bind(request, actions, **kwargs):
+    """A TicketViewSet instance for ``request``, as ``as_view()`` would set it up."""
+    view = TicketViewSet(action_map=actions, args=(), kwargs=kwargs, format_kwarg=None)
+    view.request = view.initialize_request(request, **kwargs)
+    view.headers = view.default_response_headers
+    return view
+
+
+async def initial(view):
+    # APIView.initial, with the user and the company resolved on the event loop
+    request = view.request
+    request.accepted_renderer, request.accepted_media_type = view.perform_content_negotiation(request)
+    request.user, request.auth = await authenticate(request)
+    await aget_request_company_id(request, view.kwargs['slug'])
+    view.check_permissions(request)
+
+
+async def ticket_list(view):
+    request = view.request
+    querysets = view.get_list_querysets()
+    etag, last_modified = view.list_validators(request, [
+        await queryset.order_by().aaggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        for queryset in querysets
+    ])
+    not_modified = view.not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    querysets = [TicketListSerializer.values(queryset) for queryset in querysets]
+    if len(querysets) == 1:
+        page = await view.paginator.apaginate_queryset(querysets[0], request, view=view)
+    else:
+        page = await view.paginator.apaginate_querysets(querysets, request, view=view)
+    response = view.get_paginated_response(TicketListSerializer(page, many=True).data)
+    return view.add_validators(response, etag, last_modified)
+
+
+async def ticket_retrieve(view):
+    request = view.request
+    queryset = view.filter_queryset(view.get_queryset())
+    try:
+        instance = await queryset.aget(pk=view.kwargs['pk'])
+    except (Ticket.DoesNotExist, DjangoValidationError, ValueError):
+        raise Http404('No Ticket matches the given query.')
+    view.check_object_permissions(request, instance)
+
+    etag = view.make_etag(request, instance.updated_at.isoformat())
+    not_modified = view.not_modified(request, etag, instance.updated_at)
+    if not_modified is not None:
+        return not_modified
+    response = Response(view.get_serializer(instance).data)
+    return view.add_validators(response, etag, instance.updated_at)
+
+
+@csrf_exempt
+async def ticket_collection(request, slug):
+    """
+    Async list and create for ``companies/<slug>/tickets/``, including the
+    anonymous ``?public_id=`` lookup.
+
+    A create validates and saves in one worker thread: routing, the insert
+    and the counter deltas share a transaction, which the async ORM can't
+    open.
+    """
+    if request.method not in ('GET', 'POST'):
+        return await sync_to_async(ticket_list_view)(request, slug=slug)
+    view = bind(request, {'get': 'list', 'post': 'create'}, slug=slug)
+    try:
+        await initial(view)
+        if request.method == 'GET':
+            response = await ticket_list(view)
+        else:
+            response = await sync_to_async(view.create)(view.request)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+    return view.finalize_response(view.request, response)
+
+
+@csrf_exempt
+async def ticket_detail(request, slug, pk):
+    """Async retrieve for ``companies/<slug>/tickets/<pk>/``, writes go to the DRF view."""
+    if request.method != 'GET':
+        return await sync_to_async(ticket_detail_view)(request, slug=slug, pk=pk)
+    view = bind(request, {'get': 'retrieve'}, slug=slug, pk=pk)
+    try:
+        await initial(view)
+        response = await ticket_retrieve(view)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+    return view.finalize_response(view.request, response)
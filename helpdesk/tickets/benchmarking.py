@@ -0,0 +1,30 @@
+import math
+import statistics
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def latency_summary(timings_ms):
+    return {
+        'p50_ms': round(percentile(timings_ms, 50), 3),
+        'p95_ms': round(percentile(timings_ms, 95), 3),
+        'p99_ms': round(percentile(timings_ms, 99), 3),
+        'mean_ms': round(statistics.fmean(timings_ms), 3),
+        'max_ms': round(max(timings_ms), 3),
+    }
+
+
+def rows_in(data):
+    """Number of serialized records in a response payload."""
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return len(data['results'])
+    if isinstance(data, list):
+        return len(data)
+    return 1 if data else 0
@@ -0,0 +1,137 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import AgentLoad, ArchivedTicket, Ticket, TicketCounter
+from .routing import apply_load_deltas, rebuild_agent_loads
+
+
+def counter_key(ticket):
+    """The counter bucket of a ticket instance, unassigned tickets use 0."""
+    return (ticket.company_id, ticket.status, ticket.priority, ticket.assigned_to_id or 0)
+
+
+def apply_deltas(deltas):
+    """
+    Add ``{counter_key: delta}`` to the counters with ``F()`` updates.
+
+    Call inside the transaction that changed the tickets. Agent loads are
+    updated first, then counters, each in a fixed key order, so concurrent
+    writers lock rows in the same order.
+    """
+    apply_load_deltas(deltas)
+    for key in sorted(key for key, delta in deltas.items() if delta):
+        company_id, status, priority, assigned_to = key
+        delta = deltas[key]
+        counters = TicketCounter.objects.filter(
+            company_id=company_id, status=status, priority=priority, assigned_to=assigned_to
+        )
+        if counters.update(count=F('count') + delta):
+            continue
+        try:
+            # savepoint, so losing the race to create the row keeps the transaction usable
+            with transaction.atomic():
+                TicketCounter.objects.create(
+                    company_id=company_id, status=status, priority=priority,
+                    assigned_to=assigned_to, count=delta
+                )
+        except IntegrityError:
+            counters.update(count=F('count') + delta)
+
+
+def record_change(before, after):
+    """Move one ticket between counter keys, ``None`` for creation or deletion."""
+    if before == after:
+        return
+    deltas = Counter()
+    if before is not None:
+        deltas[before] -= 1
+    if after is not None:
+        deltas[after] += 1
+    apply_deltas(deltas)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def unassign_deleted_user(sender, instance, **kwargs):
+    # the ticket FK sets assigned_to to NULL, move the user's counts to unassigned
+    deltas = Counter()
+    rows = TicketCounter.objects.filter(assigned_to=instance.pk).values_list(
+        'company_id', 'status', 'priority', 'count'
+    )
+    for company_id, status, priority, count in rows:
+        deltas[(company_id, status, priority, instance.pk)] -= count
+        deltas[(company_id, status, priority, 0)] += count
+    apply_deltas(deltas)
+
+
+def rebuild_counters(company_ids=None):
+    """
+    Recompute counters and agent loads from the ticket table, for every
+    company or only ``company_ids``. Archived tickets still count.
+    """
+    tickets = Ticket.objects.all()
+    archived = ArchivedTicket.objects.all()
+    counters = TicketCounter.objects.all()
+    if company_ids is not None:
+        tickets = tickets.filter(company_id__in=company_ids)
+        archived = archived.filter(company_id__in=company_ids)
+        counters = counters.filter(company_id__in=company_ids)
+
+    with transaction.atomic():
+        connection = connections[router.db_for_write(TicketCounter)]
+        if connection.vendor == 'postgresql':
+            # concurrent delta updates wait, instead of landing on rows being replaced
+            with connection.cursor() as cursor:
+                for model in [AgentLoad, TicketCounter]:
+                    cursor.execute(f'LOCK TABLE {model._meta.db_table} IN SHARE ROW EXCLUSIVE MODE')
+        rebuild_agent_loads(company_ids)
+        counters.delete()
+        totals = Counter()
+        for queryset in (tickets, archived):
+            rows = (
+                queryset.order_by()
+                .values_list('company_id', 'status', 'priority', 'assigned_to')
+                .annotate(total=Count('pk'))
+            )
+            for company_id, status, priority, assigned_to, total in rows:
+                totals[(company_id, status, priority, assigned_to or 0)] += total
+        created = TicketCounter.objects.bulk_create([
+            TicketCounter(
+                company_id=company_id,
+                status=status,
+                priority=priority,
+                assigned_to=assigned_to,
+                count=total
+            )
+            for (company_id, status, priority, assigned_to), total in totals.items()
+        ], batch_size=1000)
+    return len(created)
+
+
+def company_stats(company_id):
+    """Dashboard totals for a company, read from its counter rows only."""
+    statuses = [value for value, _ in Ticket.STATUS_CHOICES]
+    by_status = dict.fromkeys(statuses, 0)
+    by_priority = {value: dict.fromkeys(statuses, 0) for value, _ in Ticket.PRIORITY_CHOICES}
+    by_agent = {}
+    rows = TicketCounter.objects.filter(company_id=company_id, count__gt=0).values_list(
+        'status', 'priority', 'assigned_to', 'count'
+    )
+    for status, priority, assigned_to, count in rows:
+        by_status[status] += count
+        by_priority[priority][status] += count
+        agent = by_agent.setdefault(assigned_to or None, dict.fromkeys(statuses, 0))
+        agent[status] += count
+    return {
+        'total': sum(by_status.values()),
+        'by_status': by_status,
+        'by_priority': by_priority,
+        'by_agent': [
+            {'assigned_to': assigned_to, **counts}
+            for assigned_to, counts in sorted(by_agent.items(), key=lambda item: item[0] or 0)
+        ],
+    }
@@ -0,0 +1,32 @@
+from .serializers import TicketListSerializer
+
+# CSV has no nesting, so the resolution is flattened into two columns
+CSV_COLUMNS = [
+    'public_id', 'user', 'first_name', 'last_name', 'email', 'subject',
+    'description', 'status', 'priority', 'assigned_to', 'created_at',
+    'updated_at', 'resolution_message', 'resolution_created_at',
+]
+
+# stable and served by the (company, updated_at) index
+EXPORT_ORDERING = ('updated_at', 'public_id')
+
+
+def export_records(queryset, chunk_size=2000):
+    """
+    Yield the tickets of ``queryset`` as TicketSerializer-shaped dicts.
+
+    Rows come from a server-side cursor where the backend has one, fetched
+    ``chunk_size`` at a time, so memory does not grow with the export.
+    """
+    serializer = TicketListSerializer()
+    rows = TicketListSerializer.values(queryset.order_by(*EXPORT_ORDERING))
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield serializer.to_representation(row)
+
+
+def flatten(records):
+    for record in records:
+        resolution = record.pop('resolution')
+        record['resolution_message'] = resolution and resolution['message']
+        record['resolution_created_at'] = resolution and resolution['created_at']
+        yield record
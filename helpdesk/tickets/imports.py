@@ -0,0 +1,244 @@
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Ticket, TicketResolution
+
+User = get_user_model()
+
+# column order of the rows TicketRowMapper produces; updated_at is written
+# per batch by the import, see write_rows
+TICKET_FIELDS = [
+    Ticket._meta.get_field(name) for name in (
+        'public_id', 'company', 'user', 'first_name', 'last_name', 'email', 'subject',
+        'description', 'status', 'priority', 'created_at', 'assigned_to',
+    )
+]
+TICKET_INDEX = {field.name: index for index, field in enumerate(TICKET_FIELDS)}
+RESOLUTION_FIELDS = [TicketResolution._meta.get_field(name) for name in ('ticket', 'message', 'created_at')]
+
+STATUSES = {value for value, _ in Ticket.STATUS_CHOICES}
+PRIORITIES = {value for value, _ in Ticket.PRIORITY_CHOICES}
+MAX_LENGTHS = {
+    name: Ticket._meta.get_field(name).max_length
+    for name in ('first_name', 'last_name', 'email', 'subject')
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=100000)
+def is_valid_email(email):
+    # requesters repeat across historical tickets, validate each address once
+    try:
+        validate_email(email)
+    except ValidationError:
+        return False
+    return True
+
+
+def read_records(path, file_format):
+    """Yield the records of a CSV or NDJSON file one at a time, None for unparseable lines."""
+    with open(path, newline='', encoding='utf-8') as source:
+        if file_format == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else None
+
+
+def build_user_index():
+    """``{email: (pk, company_id)}`` of every user, None for emails several users share."""
+    index = {}
+    users = User.objects.exclude(email='').values_list('email', 'pk', 'company_id')
+    for email, pk, company_id in users.iterator(chunk_size=10000):
+        email = email.lower()
+        index[email] = None if email in index else (pk, company_id)
+    return index
+
+
+class TicketRowMapper:
+    """
+    Map an import record onto a ticket row and an optional resolution row,
+    in TICKET_FIELDS and RESOLUTION_FIELDS order. Raises RowError when the
+    record is invalid.
+
+    Users and agents are looked up by email in a prebuilt index, agents must
+    belong to the company the tickets are imported into.
+    """
+
+    def __init__(self, company_id, users):
+        self.company_id = company_id
+        self.users = users
+        self.now = timezone.now()
+        self.timezone = timezone.get_default_timezone() if settings.USE_TZ else None
+
+    def __call__(self, record):
+        if record is None:
+            raise RowError('Not a JSON object.')
+        record = {name: value.strip() if isinstance(value, str) else value for name, value in record.items()}
+        value = record.get
+
+        for name in ('subject', 'description'):
+            if not value(name):
+                raise RowError(f'{name} is required.')
+        for name, max_length in MAX_LENGTHS.items():
+            if value(name) and len(value(name)) > max_length:
+                raise RowError(f'{name} is longer than {max_length} characters.')
+        if value('email') and not is_valid_email(value('email')):
+            raise RowError(f"email {value('email')!r} is not valid.")
+
+        public_id = self.parse_uuid(value('public_id')) if value('public_id') else uuid.uuid4()
+        status = value('status') or 'open'
+        if status not in STATUSES:
+            raise RowError(f'status {status!r} is not one of {", ".join(sorted(STATUSES))}.')
+        priority = self.parse_priority(value('priority'))
+        if status == 'closed':
+            # closing a ticket resets its priority, like the API does
+            priority = 0
+
+        user_id = self.find_user(value('user_email'), 'user_email')
+        assigned_to = self.find_user(value('assigned_to_email'), 'assigned_to_email', company_only=True)
+        created_at = self.parse_datetime(value('created_at'), 'created_at') or self.now
+        # the ticket's updated_at becomes the import time, so the changes feed
+        # picks it up; the source's only dates a resolution that has no time
+        updated_at = self.parse_datetime(value('updated_at'), 'updated_at') or created_at
+
+        resolution = None
+        message = value('resolution_message')
+        if status == 'closed':
+            if not message:
+                raise RowError('resolution_message is required for closed tickets.')
+            resolved_at = self.parse_datetime(value('resolution_created_at'), 'resolution_created_at')
+            resolution = (public_id, message, resolved_at or updated_at)
+        elif message:
+            raise RowError('resolution_message is only allowed on closed tickets.')
+
+        ticket = (
+            public_id, self.company_id, user_id,
+            value('first_name') or '', value('last_name') or '', value('email') or '',
+            value('subject'), value('description'), status, priority,
+            created_at, assigned_to,
+        )
+        return ticket, resolution
+
+    def find_user(self, email, name, company_only=False):
+        if not email:
+            return None
+        email = email.lower()
+        if email not in self.users:
+            raise RowError(f'{name} {email!r} matches no user.')
+        if self.users[email] is None:
+            raise RowError(f'{name} {email!r} matches several users.')
+        pk, company_id = self.users[email]
+        if company_only and company_id != self.company_id:
+            raise RowError(f'{name} {email!r} does not belong to the company.')
+        return pk
+
+    def parse_uuid(self, value):
+        try:
+            return uuid.UUID(str(value))
+        except ValueError:
+            raise RowError(f'public_id {value!r} is not a UUID.')
+
+    def parse_priority(self, value):
+        if value in (None, ''):
+            return 1
+        try:
+            priority = int(value)
+        except (TypeError, ValueError):
+            priority = None
+        if priority not in PRIORITIES:
+            raise RowError(f'priority {value!r} is not one of {", ".join(map(str, sorted(PRIORITIES)))}.')
+        return priority
+
+    def parse_datetime(self, value, name):
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            try:
+                parsed = parse_datetime(str(value))
+            except ValueError:
+                parsed = None
+        if parsed is None:
+            raise RowError(f'{name} {value!r} is not an ISO 8601 datetime.')
+        if self.timezone is not None and parsed.tzinfo is None:
+            parsed = timezone.make_aware(parsed, self.timezone)
+        return parsed
+
+
+# COPY's text format: tab separated, \N for NULL, backslash escapes
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        return value.translate(COPY_ESCAPES)
+    return str(value)
+
+
+def format_row(connection, fields, row):
+    """A row of ``fields`` values as ``write_rows`` sends it: a COPY line or INSERT parameters."""
+    if connection.vendor == 'postgresql':
+        return '\t'.join(map(_copy_value, row)) + '\n'
+    # only UUIDs and datetimes need the backend's conversion
+    return [
+        value if value is None or isinstance(value, (str, int)) else field.get_db_prep_save(value, connection)
+        for field, value in zip(fields, row)
+    ]
+
+
+def write_rows(connection, model, fields, rows, constants=()):
+    """
+    Insert a batch of rows built by ``format_row`` into ``model``'s table,
+    with COPY on PostgreSQL and an executemany INSERT elsewhere.
+    ``constants`` are ``(field, value)`` pairs written to every row.
+
+    Unlike bulk_create the values are written as given, so a historical
+    created_at survives auto_now_add.
+    """
+    if not rows:
+        return
+    if constants:
+        constant_fields = [field for field, _ in constants]
+        constant_row = format_row(connection, constant_fields, [value for _, value in constants])
+        fields = [*fields, *constant_fields]
+        if connection.vendor == 'postgresql':
+            rows = [f'{row[:-1]}\t{constant_row}' for row in rows]
+        else:
+            rows = [row + constant_row for row in rows]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            sql = f'COPY {table} ({columns}) FROM STDIN'
+            if hasattr(cursor, 'copy_expert'):
+                cursor.copy_expert(sql, io.StringIO(''.join(rows)))
+            else:
+                with cursor.copy(sql) as copy:
+                    copy.write(''.join(rows))
+            return
+        placeholders = ', '.join(['%s'] * len(fields))
+        cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
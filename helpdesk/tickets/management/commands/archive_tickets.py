@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from tickets.models import Company
+from tickets.archive import archivable_tickets, archive_batch, archive_cutoff
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Move closed tickets not updated for --older-than days, with their resolutions, from the ticket '
+        'table into the archive tables. Every batch commits on its own, so an interrupted run is resumed '
+        'by running the command again. The resolution endpoints and public ticket lookups read both.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int, default=settings.TICKET_ARCHIVE_AFTER_DAYS,
+            help='Days since the last update, defaults to TICKET_ARCHIVE_AFTER_DAYS'
+        )
+        parser.add_argument('--company', help='Slug of the only company to archive')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Count the archivable tickets only')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0:
+            raise CommandError('--older-than must not be negative.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        company_id = None
+        if options['company']:
+            company = Company.objects.filter(slug=options['company']).first()
+            if company is None:
+                raise CommandError(f"No company with slug {options['company']}.")
+            company_id = company.pk
+
+        cutoff = archive_cutoff(options['older_than'])
+        if options['dry_run']:
+            count = archivable_tickets(cutoff, company_id).count()
+            self.stdout.write(f'{count} closed tickets last updated before {cutoff.isoformat()} would be archived.')
+            return
+
+        total = 0
+        started = time.perf_counter()
+        while True:
+            selected, moved = archive_batch(cutoff, options['batch_size'], company_id)
+            if not selected:
+                break
+            total += moved
+            self.stdout.write(f'Archived {total} tickets', ending='\r')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total} closed tickets last updated before {cutoff.isoformat()} in {elapsed:.1f}s.'
+        ))
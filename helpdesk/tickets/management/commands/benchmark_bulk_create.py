@@ -0,0 +1,47 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from tickets.models import Company
+import time
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare ticket creation throughput of single POSTs against the bulk endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = options['tickets']
+        # everything is created inside a transaction that is rolled back at the end
+        with transaction.atomic():
+            company = Company.objects.create(name='Bulk benchmark', email='bench@example.com')
+            user = User.objects.create(username='bulk-benchmark-user', company=company, role='owner')
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            url = f'/api/companies/{company.slug}/tickets/'
+            payload = [
+                {'subject': f'Ticket {i}', 'description': 'Generated by benchmark_bulk_create', 'priority': 2}
+                for i in range(count)
+            ]
+
+            started = time.perf_counter()
+            for item in payload:
+                response = client.post(url, item, format='json')
+                if response.status_code != 201:
+                    raise CommandError(f'Single create failed: {response.status_code} {response.data}')
+            single = time.perf_counter() - started
+
+            started = time.perf_counter()
+            response = client.post(f'{url}bulk/', payload, format='json')
+            if response.status_code != 201:
+                raise CommandError(f'Bulk create failed: {response.status_code} {response.data}')
+            bulk = time.perf_counter() - started
+
+            self.stdout.write(f'Single creates: {count / single:.0f} tickets/s ({single:.2f}s)')
+            self.stdout.write(f'Bulk create:    {count / bulk:.0f} tickets/s ({bulk:.2f}s)')
+            self.stdout.write(self.style.SUCCESS(f'Speedup: {single / bulk:.1f}x'))
+            transaction.set_rollback(True)
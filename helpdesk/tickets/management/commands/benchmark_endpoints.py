@@ -0,0 +1,166 @@
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from tickets.models import Ticket, Company
+from tickets.benchmarking import latency_summary, rows_in
+from tickets.counters import apply_deltas, counter_key
+from collections import Counter
+from io import StringIO
+import json
+import random
+import statistics
+import time
+import uuid
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a dataset and drive the API endpoints in-process, reporting latency percentiles, '
+        'SQL query counts and rows serialized per endpoint as JSON. Uses the configured database, '
+        'so set DATABASE_URL (sqlite:///bench.sqlite3 or a Postgres URL) to pick the backend.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=5)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--tickets', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data instead of rolling it back')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # the suite only touches the companies and users of this run, other data may share the database
+            seeded_after = Company.objects.aggregate(last=Max('pk'))['last'] or 0
+            call_command(
+                'seed',
+                companies=options['companies'],
+                users=options['users'],
+                tickets=options['tickets'],
+                seed=options['seed'],
+                stdout=StringIO()
+            )
+            endpoints = self.run_suite(options['requests'], random.Random(options['seed']), seeded_after)
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        report = json.dumps({
+            'database': connection.vendor,
+            'dataset': {
+                'companies': options['companies'],
+                'users': options['users'],
+                'tickets': options['tickets'],
+                'seed': options['seed'],
+            },
+            'requests_per_endpoint': options['requests'],
+            'endpoints': endpoints,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+    def run_suite(self, requests, rng, seeded_after):
+        company = (
+            Company.objects.filter(pk__gt=seeded_after)
+            .annotate(ticket_count=Count('tickets')).order_by('-ticket_count', 'pk').first()
+        )
+        password = make_password(PASSWORD)
+        # kept runs leave their users behind
+        run = uuid.uuid4().hex[:8]
+        staff = {}
+        for role in ['owner', 'admin', 'agent', 'customer']:
+            staff[role] = User.objects.create(
+                username=f'benchmark-{run}-{role}',
+                password=password,
+                company=company if role != 'customer' else None,
+                role=role
+            )
+        staff['superuser'] = User.objects.create(
+            username=f'benchmark-{run}-superuser', password=password, is_superuser=True
+        )
+
+        clients = {}
+        for role, user in staff.items():
+            clients[role] = APIClient(SERVER_NAME='localhost')
+            token = clients[role].post(
+                '/api/token/', {'username': user.username, 'password': PASSWORD}, format='json'
+            ).data['access']
+            clients[role].credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        tickets_url = f'/api/companies/{company.slug}/tickets/'
+        existing = list(Ticket.objects.filter(company=company).values_list('public_id', flat=True)[:1000])
+        # assignment and closing consume a fresh open ticket per request
+        fresh = Ticket.objects.bulk_create([
+            Ticket(company=company, subject=f'Benchmark {i}', description='...', priority=2)
+            for i in range(requests * 2)
+        ])
+        apply_deltas(Counter(counter_key(ticket) for ticket in fresh))
+        to_assign, to_close = fresh[:requests], fresh[requests:]
+
+        owner = clients['owner']
+        # validators the polling clients would send back
+        list_etag = owner.get(tickets_url)['ETag']
+        detail_etag = owner.get(f'{tickets_url}{existing[0]}/')['ETag']
+        suite = {
+            'token_obtain': lambda i: APIClient(SERVER_NAME='localhost').post(
+                '/api/token/', {'username': staff['agent'].username, 'password': PASSWORD}, format='json'
+            ),
+            'ticket_list': lambda i: owner.get(tickets_url),
+            'ticket_list_not_modified': lambda i: owner.get(tickets_url, HTTP_IF_NONE_MATCH=list_etag),
+            'ticket_detail': lambda i: owner.get(f'{tickets_url}{rng.choice(existing)}/'),
+            'ticket_detail_not_modified': lambda i: owner.get(
+                f'{tickets_url}{existing[0]}/', HTTP_IF_NONE_MATCH=detail_etag
+            ),
+            'ticket_create': lambda i: clients['customer'].post(
+                tickets_url, {'subject': f'Load test {i}', 'description': '...'}, format='json'
+            ),
+            'assign_agent': lambda i: owner.patch(
+                f'{tickets_url}{to_assign[i].public_id}/assign_agent/',
+                {'assigned_to': staff['agent'].pk}, format='json'
+            ),
+            'close_with_resolution': lambda i: owner.patch(
+                f'{tickets_url}{to_close[i].public_id}/',
+                {'status': 'closed', 'resolution_message': 'Resolved by benchmark'}, format='json'
+            ),
+            'ticket_resolution_list': lambda i: clients['agent'].get(
+                f'/api/companies/{company.slug}/ticket-resolution/'
+            ),
+            'company_list': lambda i: clients['superuser'].get('/api/companies/'),
+            'company_stats': lambda i: owner.get(f'/api/companies/{company.slug}/stats/'),
+        }
+        results = {}
+        for name, send in suite.items():
+            results[name] = self.measure(name, send, requests)
+            self.stderr.write(f"{name}: p50 {results[name]['p50_ms']}ms")
+        return results
+
+    def measure(self, name, send, requests):
+        timings = []
+        query_counts = []
+        rows = []
+        for i in range(requests):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = send(i)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f'{name} failed with {response.status_code}: {response.data}')
+            query_counts.append(len(queries))
+            # 304 responses carry no body
+            rows.append(rows_in(getattr(response, 'data', None)))
+        return {
+            **latency_summary(timings),
+            'queries_per_request': statistics.fmean(query_counts),
+            'rows_serialized': statistics.fmean(rows),
+        }
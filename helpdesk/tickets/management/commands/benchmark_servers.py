@@ -0,0 +1,187 @@
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.contrib.auth import get_user_model
+from accounts.authentication import ClaimsTokenObtainPairSerializer
+from tickets.models import Ticket, Company
+from tickets.benchmarking import latency_summary
+from tickets.counters import rebuild_counters
+from collections import Counter
+from contextlib import contextmanager
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+User = get_user_model()
+
+BENCHMARK_SUBJECT = 'Server benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve the API from real server processes, gunicorn with sync workers (WSGI) and uvicorn '
+        'with ASYNC_TICKET_VIEWS on (ASGI), and drive the ticket list, detail, public lookup and '
+        'create endpoints with concurrent keep-alive clients. Reports requests per second and '
+        'latency percentiles per endpoint and deployment. Run it against a seeded database '
+        '(manage.py seed); tickets it creates are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', help='Slug of the company to query, defaults to the one with most tickets')
+        parser.add_argument('--deployments', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--workers', type=int, default=2, help='Server processes per deployment')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client connections')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per endpoint')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        company = self.get_company(options['company'])
+        owner = User.objects.filter(company=company, role__in=['owner', 'admin']).first()
+        ticket = Ticket.objects.filter(company=company).first()
+        if owner is None or ticket is None:
+            raise CommandError(f'Company {company.slug} needs an owner or admin and at least one ticket.')
+        token = ClaimsTokenObtainPairSerializer.get_token(owner).access_token
+
+        base = f'/api/companies/{company.slug}/tickets/'
+        auth = {'Authorization': f'Bearer {token}'}
+        endpoints = {
+            'list': ('GET', f'{base}?page_size=50', auth, None),
+            'detail': ('GET', f'{base}{ticket.public_id}/', auth, None),
+            'public_lookup': ('GET', f'{base}?public_id={ticket.public_id}', {}, None),
+            'create': ('POST', base, {**auth, 'Content-Type': 'application/json'}, json.dumps({
+                'subject': BENCHMARK_SUBJECT, 'description': '...', 'priority': 1
+            })),
+        }
+
+        deployments = {}
+        try:
+            for deployment in options['deployments']:
+                with self.serve(deployment, options['workers'], options['port']):
+                    deployments[deployment] = {
+                        name: self.load(options['port'], *endpoint, options['concurrency'], options['duration'])
+                        for name, endpoint in endpoints.items()
+                    }
+        finally:
+            Ticket.objects.filter(company=company, subject=BENCHMARK_SUBJECT).delete()
+            rebuild_counters([company.pk])
+
+        report = json.dumps({
+            'database': connection.vendor,
+            'company': company.slug,
+            'tickets': Ticket.objects.filter(company=company).count(),
+            'workers': options['workers'],
+            'concurrency': options['concurrency'],
+            'duration_s': options['duration'],
+            'deployments': deployments,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+    def get_company(self, slug):
+        if slug:
+            company = Company.objects.filter(slug=slug).first()
+            if company is None:
+                raise CommandError(f'No company with slug {slug}.')
+            return company
+        company_id = (
+            Ticket.objects.order_by().values('company_id')
+            .annotate(total=Count('pk')).order_by('-total')
+            .values_list('company_id', flat=True).first()
+        )
+        if company_id is None:
+            raise CommandError('No tickets to query, run manage.py seed first.')
+        return Company.objects.get(pk=company_id)
+
+    def server_command(self, deployment, workers, port):
+        if deployment == 'wsgi':
+            return [
+                sys.executable, '-m', 'gunicorn', 'helpdesk.wsgi:application',
+                '--bind', f'127.0.0.1:{port}', '--workers', str(workers)
+            ]
+        return [
+            sys.executable, '-m', 'uvicorn', 'helpdesk.asgi:application',
+            '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers)
+        ]
+
+    @contextmanager
+    def serve(self, deployment, workers, port):
+        env = {**os.environ, 'ASYNC_TICKET_VIEWS': '1' if deployment == 'asgi' else ''}
+        process = subprocess.Popen(
+            self.server_command(deployment, workers, port),
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            self.wait_until_listening(process, deployment, port)
+            yield
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def wait_until_listening(self, process, deployment, port):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'The {deployment} server exited with {process.returncode}.')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'The {deployment} server did not start listening on port {port}.')
+
+    def load(self, port, method, path, headers, body, concurrency, duration):
+        deadline = time.perf_counter() + duration
+        results = [None] * concurrency
+
+        def client(index):
+            result = results[index] = {'timings': [], 'errors': 0, 'statuses': Counter()}
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    result['errors'] += 1
+                    result['statuses']['connection_error'] += 1
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                    continue
+                result['statuses'][str(response.status)] += 1
+                if response.status >= 400:
+                    result['errors'] += 1
+                else:
+                    result['timings'].append((time.perf_counter() - started) * 1000)
+            conn.close()
+
+        threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings = [timing for result in results for timing in result['timings']]
+        return {
+            'requests': len(timings),
+            'errors': sum(result['errors'] for result in results),
+            'statuses': dict(sum((result['statuses'] for result in results), Counter())),
+            'requests_per_second': round(len(timings) / elapsed, 1),
+            **(latency_summary(timings) if timings else {}),
+        }
@@ -0,0 +1,106 @@
+from django.core.management import BaseCommand
+from django.db import DatabaseError, connection
+from django.contrib.auth import get_user_model
+from tickets.models import Ticket, Company
+from tickets.counters import rebuild_counters
+from tickets.queue import claim_next_ticket, unassigned_queue
+from tickets.benchmarking import latency_summary
+from tickets.management.commands.seed import bulk_create_ids
+import json
+import random
+import threading
+import time
+import uuid
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Have many agents claim tickets from one queue at the same time, one thread and database '
+        'connection per agent, and report claims per second, claim latency and any ticket claimed '
+        'twice. Works on a throwaway company that is deleted afterwards, against the configured '
+        'database (use PostgreSQL for meaningful numbers).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agents', type=int, default=100)
+        parser.add_argument('--tickets', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        suffix = uuid.uuid4().hex[:8]
+        company = Company.objects.create(
+            name='Claim benchmark', slug=f'claim-benchmark-{suffix}', email='claims@example.com'
+        )
+        agent_ids = []
+        try:
+            agent_ids = bulk_create_ids(User, [
+                User(username=f'claim-benchmark-{suffix}-{i}', company=company, role='agent')
+                for i in range(options['agents'])
+            ], 'username')
+            Ticket.objects.bulk_create([
+                Ticket(company=company, subject=f'Claim {i}', description='...', priority=rng.randint(0, 3))
+                for i in range(options['tickets'])
+            ], batch_size=1000)
+            rebuild_counters([company.pk])
+            report = self.run_agents(company.pk, agent_ids)
+            report['unclaimed'] = unassigned_queue(company.pk).count()
+        finally:
+            # agents first, their counter moves need the company rows
+            User.objects.filter(pk__in=agent_ids).delete()
+            company.delete()
+
+        self.stdout.write(json.dumps({
+            'database': connection.vendor,
+            'agents': options['agents'],
+            'tickets': options['tickets'],
+            **report,
+        }, indent=2))
+
+    def run_agents(self, company_id, agent_ids):
+        barrier = threading.Barrier(len(agent_ids))
+        results = [None] * len(agent_ids)
+        threads = [
+            threading.Thread(target=self.work, args=(company_id, agent_id, barrier, results, index))
+            for index, agent_id in enumerate(agent_ids)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings = [timing for result in results for timing in result['timings']]
+        claimed = [public_id for result in results for public_id in result['claimed']]
+        return {
+            'claimed': len(claimed),
+            'claimed_twice': len(claimed) - len(set(claimed)),
+            'errors': sum(result['errors'] for result in results),
+            'seconds': round(elapsed, 3),
+            'claims_per_second': round(len(claimed) / elapsed, 1),
+            **latency_summary(timings),
+        }
+
+    def work(self, company_id, agent_id, barrier, results, index):
+        result = {'timings': [], 'claimed': [], 'errors': 0}
+        results[index] = result
+        try:
+            barrier.wait()
+            while True:
+                started = time.perf_counter()
+                try:
+                    public_id = claim_next_ticket(company_id, agent_id)
+                except DatabaseError:
+                    # e.g. SQLite giving up on its write lock
+                    result['errors'] += 1
+                    continue
+                if public_id is None:
+                    return
+                result['timings'].append((time.perf_counter() - started) * 1000)
+                result['claimed'].append(str(public_id))
+        finally:
+            # every thread opened its own connection
+            connection.close()
@@ -0,0 +1,182 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.contrib.auth import get_user_model
+from tickets.models import Ticket, Company
+import random
+import statistics
+import time
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench-'
+
+
+def ticket_queries(company, agent, customer):
+    # mirrors the access paths of TicketViewSet and TicketResolutionViewset
+    tickets = Ticket.objects.filter(company=company)
+    return [
+        ('owner/admin list', tickets.order_by('-priority', 'created_at')),
+        ('agent list', tickets.filter(assigned_to=agent).order_by('-priority', 'created_at')),
+        ('customer list', tickets.filter(user=customer).order_by('-priority', 'created_at')),
+        ('resolution list', tickets.filter(status='closed').order_by('-priority', 'created_at')),
+        ('open queue', tickets.filter(status='open').order_by('-priority', 'created_at')),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large ticket table and compare query plans and timings with and without the ticket indexes. '
+        'Drops the ticket indexes while it runs, so it needs --allow-destructive; the indexes are recreated '
+        'and the seeded bench- rows deleted when it ends.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=2_000_000, help='Total benchmark tickets to have in the table')
+        parser.add_argument('--companies', type=int, default=50)
+        parser.add_argument('--agents', type=int, default=20, help='Agents per company')
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--limit', type=int, default=50, help='Rows fetched per query, roughly one page')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--allow-destructive', action='store_true',
+            help='Confirm that the database may lose its ticket indexes for the length of the run'
+        )
+
+    def handle(self, *args, **options):
+        if not options['allow_destructive']:
+            raise CommandError(
+                'This drops the ticket indexes while it runs and seeds benchmark rows. Run it against a '
+                'database that serves no traffic, with --allow-destructive.'
+            )
+        try:
+            self.seed(options)
+
+            company = Company.objects.filter(slug__startswith=BENCH_PREFIX).order_by('pk').first()
+            agent = User.objects.filter(company=company, role='agent').order_by('pk').first()
+            customer = User.objects.filter(username__startswith=f'{BENCH_PREFIX}customer-').order_by('pk').first()
+            queries = ticket_queries(company, agent, customer)
+
+            dropped = []
+            try:
+                for index in Ticket._meta.indexes:
+                    # one index at a time, so only indexes actually dropped are recreated
+                    with connection.schema_editor() as editor:
+                        editor.remove_index(Ticket, index)
+                    dropped.append(index)
+                self.analyze()
+                self.report('without ticket indexes', queries, options)
+            finally:
+                with connection.schema_editor() as editor:
+                    for index in dropped:
+                        editor.add_index(Ticket, index)
+            self.analyze()
+            self.report('with ticket indexes', queries, options)
+        finally:
+            self.clean_up(options['batch_size'])
+
+    def clean_up(self, batch_size):
+        """Delete the seeded tickets, users and companies; they bypassed the counters."""
+        tickets = Ticket.objects.filter(company__slug__startswith=BENCH_PREFIX)
+        deleted = 0
+        while ids := list(tickets.values_list('pk', flat=True)[:batch_size]):
+            deleted += Ticket.objects.filter(pk__in=ids).delete()[1].get(Ticket._meta.label, 0)
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+        Company.objects.filter(slug__startswith=BENCH_PREFIX).delete()
+        self.stdout.write(f'Deleted {deleted} benchmark tickets.')
+
+    def seed(self, options):
+        existing = Ticket.objects.filter(company__slug__startswith=BENCH_PREFIX).count()
+        missing = options['tickets'] - existing
+        if missing <= 0:
+            self.stdout.write(f'Reusing {existing} benchmark tickets.')
+            return
+
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            Company.objects.bulk_create(
+                [
+                    Company(name=f'Bench {i}', slug=f'{BENCH_PREFIX}{i}', email=f'bench{i}@example.com')
+                    for i in range(options['companies'])
+                ],
+                ignore_conflicts=True
+            )
+            companies = list(Company.objects.filter(slug__startswith=BENCH_PREFIX))
+
+            User.objects.bulk_create(
+                [
+                    User(
+                        username=f'{BENCH_PREFIX}agent-{company.pk}-{i}',
+                        email=f'agent{i}@{company.slug}.example.com',
+                        password='!',
+                        company=company,
+                        role='agent'
+                    )
+                    for company in companies for i in range(options['agents'])
+                ] + [
+                    User(
+                        username=f'{BENCH_PREFIX}customer-{i}',
+                        email=f'customer{i}@example.com',
+                        password='!'
+                    )
+                    for i in range(options['customers'])
+                ],
+                batch_size=batch_size,
+                ignore_conflicts=True
+            )
+
+        agents = {}
+        for agent in User.objects.filter(company__in=companies, role='agent'):
+            agents.setdefault(agent.company_id, []).append(agent)
+        customers = list(User.objects.filter(username__startswith=f'{BENCH_PREFIX}customer-'))
+
+        created = 0
+        started = time.perf_counter()
+        while created < missing:
+            batch = []
+            for _ in range(min(batch_size, missing - created)):
+                company = random.choice(companies)
+                # closed tickets dominate real tables
+                status_choice = random.choices(['open', 'in_progress', 'closed'], weights=[2, 1, 7])[0]
+                assigned_to = None
+                if status_choice != 'open':
+                    assigned_to = random.choice(agents[company.pk])
+                batch.append(Ticket(
+                    company=company,
+                    user=random.choice(customers) if random.random() < 0.5 else None,
+                    subject='Benchmark ticket',
+                    description='Generated by benchmark_ticket_queries',
+                    status=status_choice,
+                    priority=0 if status_choice == 'closed' else random.randint(1, 3),
+                    assigned_to=assigned_to
+                ))
+            Ticket.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+            self.stdout.write(f'Seeded {created}/{missing} tickets', ending='\r')
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {created} tickets in {time.perf_counter() - started:.1f}s.'
+        ))
+
+    def analyze(self):
+        table = connection.ops.quote_name(Ticket._meta.db_table)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            elif connection.vendor == 'mysql':
+                cursor.execute(f'ANALYZE TABLE {table}')
+            else:
+                cursor.execute(f'ANALYZE {table}')
+
+    def report(self, title, queries, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {title} =='))
+        for name, queryset in queries:
+            page = queryset[:options['limit']]
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(page.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: median {statistics.median(timings):.2f}ms, best {min(timings):.2f}ms'
+            ))
+            self.stdout.write(page.explain())
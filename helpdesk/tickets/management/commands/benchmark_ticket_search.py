@@ -0,0 +1,59 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from tickets.models import Ticket, Company
+from tickets.search import search_tickets
+from tickets.serializers import TicketListSerializer
+from tickets.benchmarking import latency_summary
+import json
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Time ranked ticket searches against the existing data, seed it first '
+        '(e.g. seed --tickets 2000000). Queries are 1-3 word phrases taken from real tickets.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        company = Company.objects.annotate(ticket_count=Count('tickets')).order_by('-ticket_count').first()
+        if company is None:
+            raise CommandError('No tickets to search, run the seed command first.')
+
+        # owner/admin visibility: every ticket of the company
+        tickets = Ticket.objects.filter(company=company)
+        subjects = list(tickets.values_list('subject', flat=True)[:1000])
+        queries = []
+        for _ in range(options['queries']):
+            words = rng.choice(subjects).rstrip('.').split()
+            length = rng.randint(1, min(3, len(words)))
+            start = rng.randrange(len(words) - length + 1)
+            queries.append(' '.join(words[start:start + length]))
+
+        timings = []
+        matched = 0
+        for query in queries:
+            started = time.perf_counter()
+            page = list(
+                search_tickets(tickets, query)
+                .order_by('-rank', '-priority', 'created_at', 'public_id')
+                .values(*TicketListSerializer.columns, 'rank')[:options['page_size']]
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            matched += bool(page)
+
+        self.stdout.write(json.dumps({
+            'database': connection.vendor,
+            'company_tickets': tickets.count(),
+            'queries': len(queries),
+            'queries_with_results': matched,
+            'under_50ms': sum(timing < 50 for timing in timings) / len(timings),
+            **latency_summary(timings),
+        }, indent=2))
@@ -0,0 +1,66 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from tickets.models import Ticket, Company, TicketResolution
+from tickets.serializers import TicketSerializer, TicketListSerializer
+import json
+import random
+import statistics
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare TicketSerializer with the TicketListSerializer fast path on a throwaway dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # everything is created inside a transaction that is rolled back at the end
+        with transaction.atomic():
+            company = self.seed(options['tickets'])
+            queryset = Ticket.objects.filter(company=company).order_by('-priority', 'created_at', 'public_id')
+
+            full = self.measure(
+                lambda: TicketSerializer(queryset.select_related('resolution').all(), many=True).data,
+                options['repeat']
+            )
+            fast = self.measure(
+                lambda: TicketListSerializer(TicketListSerializer.values(queryset), many=True).data,
+                options['repeat']
+            )
+            if json.dumps(full[1]) != json.dumps(fast[1]):
+                raise CommandError('TicketListSerializer output differs from TicketSerializer')
+
+            per_10k = 10_000 / options['tickets']
+            self.stdout.write(f'TicketSerializer:     {full[0] * per_10k:.1f}ms per 10k tickets')
+            self.stdout.write(f'TicketListSerializer: {fast[0] * per_10k:.1f}ms per 10k tickets')
+            self.stdout.write(self.style.SUCCESS(f'Speedup: {full[0] / fast[0]:.1f}x'))
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        company = Company.objects.create(name='Serialization benchmark', email='bench@example.com')
+        tickets = Ticket.objects.bulk_create([
+            Ticket(
+                company=company,
+                subject=f'Ticket {i}',
+                description='Generated by benchmark_ticket_serialization',
+                status=random.choice(['open', 'in_progress', 'closed']),
+                priority=random.randint(0, 3)
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        TicketResolution.objects.bulk_create([
+            TicketResolution(ticket=ticket, message='Resolved')
+            for ticket in tickets if ticket.status == 'closed'
+        ], batch_size=1000)
+        return company
+
+    def measure(self, serialize, repeat):
+        timings = []
+        data = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = serialize()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), data
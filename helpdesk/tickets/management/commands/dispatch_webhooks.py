@@ -0,0 +1,74 @@
+from django.core.management import BaseCommand
+from django.db.models import Min
+from django.utils import timezone
+from tickets.models import TicketEvent
+from tickets.webhooks import WebhookDispatcher
+from tickets.benchmarking import latency_summary
+import json
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver ticket events from the outbox to the companies\' webhook endpoints, in batches per '
+        'endpoint over keep-alive connections. Runs until interrupted, or until the outbox is drained '
+        'with --once. Failed events are retried with exponential backoff, up to --max-attempts times. '
+        'Reports delivery lag, the time from the ticket change committing to its delivery.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Events leased per round')
+        parser.add_argument('--endpoint-batch-size', type=int, default=100, help='Events per webhook request')
+        parser.add_argument('--concurrency', type=int, default=8, help='Endpoints delivered to in parallel')
+        parser.add_argument('--timeout', type=float, default=10, help='Seconds per webhook request')
+        parser.add_argument('--tries', type=int, default=3, help='Attempts per request before the events are rescheduled')
+        parser.add_argument('--retry-backoff', type=float, default=0.5, help='Seconds before the second try, doubling')
+        parser.add_argument('--max-attempts', type=int, default=10, help='Rounds an event is tried before it is given up')
+        parser.add_argument('--interval', type=float, default=1, help='Seconds to wait when no event is due')
+        parser.add_argument('--report-every', type=float, default=60, help='Seconds between lag reports')
+        parser.add_argument('--once', action='store_true', help='Stop once no event is due')
+
+    def handle(self, *args, **options):
+        dispatcher = WebhookDispatcher(
+            batch_size=options['batch_size'],
+            endpoint_batch_size=options['endpoint_batch_size'],
+            concurrency=options['concurrency'],
+            timeout=options['timeout'],
+            tries=options['tries'],
+            retry_backoff=options['retry_backoff'],
+            max_attempts=options['max_attempts'],
+        )
+        totals = {'delivered': 0, 'failed': 0}
+        lags = []
+        reported = time.monotonic()
+        try:
+            while True:
+                delivered, failed, batch_lags = dispatcher.run_once()
+                totals['delivered'] += delivered
+                totals['failed'] += failed
+                lags.extend(batch_lags)
+                if time.monotonic() - reported >= options['report_every']:
+                    self.report(totals, lags, options['max_attempts'])
+                    lags, reported = [], time.monotonic()
+                if not delivered and not failed:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.close()
+        self.report(totals, lags, options['max_attempts'])
+
+    def report(self, totals, lags, max_attempts):
+        undelivered = TicketEvent.objects.filter(delivered_at__isnull=True)
+        pending = undelivered.filter(attempts__lt=max_attempts)
+        oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+        self.stdout.write(json.dumps({
+            **totals,
+            'pending': pending.count(),
+            'given_up': undelivered.filter(attempts__gte=max_attempts).count(),
+            # how far behind the outbox is right now
+            'oldest_pending_s': round((timezone.now() - oldest).total_seconds(), 3) if oldest else 0,
+            'lag': latency_summary(lags) if lags else {},
+        }))
@@ -0,0 +1,226 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+from tickets.models import ArchivedTicket, Ticket, Company, TicketImport, TicketResolution
+from tickets.counters import rebuild_counters
+from tickets.imports import (
+    RESOLUTION_FIELDS, TICKET_FIELDS, TICKET_INDEX, RowError, TicketRowMapper, build_user_index, format_row,
+    read_records, write_rows
+)
+from tickets.outbox import record_events, ticket_event
+from itertools import islice
+import django
+import os
+import time
+
+FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+# invalid rows listed in the final report
+REPORTED_ERRORS = 20
+
+_worker_context = None
+
+
+def init_worker(context):
+    global _worker_context
+    django.setup()
+    _worker_context = {
+        'mapper': TicketRowMapper(context['company_id'], context['users']),
+        'connection': connections[context['alias']],
+        'dry_run': context['dry_run'],
+    }
+
+
+def prepare_batch(batch):
+    """Validate and format a batch of ``(number, record)``, the CPU-bound half of an import."""
+    mapper = _worker_context['mapper']
+    connection = _worker_context['connection']
+    # a dry run only validates
+    format_rows = not _worker_context['dry_run']
+    rows, failed = [], []
+    for number, record in batch:
+        try:
+            ticket, resolution = mapper(record)
+        except RowError as exc:
+            failed.append((number, str(exc)))
+            continue
+        rows.append((
+            number,
+            ticket[0],
+            bool(record.get('public_id')),
+            format_row(connection, TICKET_FIELDS, ticket) if format_rows else None,
+            resolution and format_rows and format_row(connection, RESOLUTION_FIELDS, resolution),
+            # what the ticket.created event needs
+            tuple(ticket[TICKET_INDEX[name]] for name in ('status', 'priority', 'assigned_to')),
+        ))
+    return len(batch), rows, failed
+
+
+class Command(BaseCommand):
+    help = (
+        "Import historical tickets and their resolutions into a company from a CSV or NDJSON file. "
+        "Columns: subject, description, status, priority, first_name, last_name, email, user_email, "
+        "assigned_to_email, created_at, updated_at, resolution_message, resolution_created_at and an "
+        "optional public_id. Every batch commits with its checkpoint, so an interrupted import resumes "
+        "where it stopped when run again with the same file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--company', required=True, help='Slug of the company the tickets belong to')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Defaults to the file extension')
+        parser.add_argument('--source', help='Checkpoint name, defaults to the file name')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--max-errors', type=int, default=0, help='Invalid rows skipped before the import stops')
+        parser.add_argument('--workers', type=int, default=1, help='Processes validating and formatting rows')
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without writing anything')
+        parser.add_argument(
+            '--no-events', action='store_false', dest='events',
+            help='Write no ticket.created webhook events, one per imported ticket by default'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'No file at {path}.')
+        file_format = options['format'] or FORMATS.get(os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise CommandError('Cannot tell the file format from its extension, pass --format.')
+        company = Company.objects.filter(slug=options['company']).first()
+        if company is None:
+            raise CommandError(f"No company with slug {options['company']}.")
+        dry_run = options['dry_run']
+
+        checkpoint = None
+        skip = 0
+        if not dry_run:
+            checkpoint, _ = TicketImport.objects.get_or_create(
+                company=company, source=options['source'] or os.path.basename(path)
+            )
+            if checkpoint.finished_at is not None:
+                raise CommandError(
+                    f'{checkpoint.source} was already imported into {company.slug}, '
+                    f'pass another --source to import it again.'
+                )
+            skip = checkpoint.rows_read
+            if skip:
+                self.stdout.write(f'Resuming {checkpoint.source} after row {skip}.')
+
+        connection = connections[router.db_for_write(Ticket)]
+        context = {
+            'company_id': company.pk,
+            'users': build_user_index(),
+            'alias': connection.alias,
+            'dry_run': dry_run,
+        }
+        records = enumerate(islice(read_records(path, file_format), skip, None), skip + 1)
+        batches = iter(lambda: list(islice(records, options['batch_size'])), [])
+        totals = {'read': 0, 'imported': 0, 'failed': 0}
+        errors = []
+        started = time.perf_counter()
+
+        for count, rows, failed in self.prepare(batches, context, options['workers']):
+            tickets, resolutions, created = self.drop_taken(connection, rows, failed)
+            totals['read'] += count
+            totals['imported'] += len(tickets)
+            totals['failed'] += len(failed)
+            errors.extend(sorted(failed)[:REPORTED_ERRORS - len(errors)])
+
+            if not dry_run:
+                if totals['failed'] > options['max_errors']:
+                    self.report(totals, errors, started, dry_run)
+                    raise CommandError(
+                        f"Stopped after {totals['failed']} invalid rows (--max-errors {options['max_errors']}). "
+                        f'Batches before this one are imported; fix the rows and run the command again to resume.'
+                    )
+                with transaction.atomic(using=connection.alias):
+                    # stamped at commit time, like any other write, so changes feed
+                    # clients and webhook receivers hear about imported tickets
+                    updated_at = timezone.now()
+                    write_rows(
+                        connection, Ticket, TICKET_FIELDS, tickets,
+                        constants=[(Ticket._meta.get_field('updated_at'), updated_at)]
+                    )
+                    write_rows(connection, TicketResolution, RESOLUTION_FIELDS, resolutions)
+                    if options['events']:
+                        record_events([
+                            ticket_event('ticket.created', Ticket(
+                                public_id=public_id, company_id=company.pk, status=status, priority=priority,
+                                assigned_to_id=assigned_to
+                            ), imported=True)
+                            for public_id, (status, priority, assigned_to) in created
+                        ])
+                    TicketImport.objects.filter(pk=checkpoint.pk).update(
+                        rows_read=F('rows_read') + count,
+                        rows_imported=F('rows_imported') + len(tickets),
+                        rows_failed=F('rows_failed') + len(failed),
+                        updated_at=timezone.now()
+                    )
+            self.stdout.write(f"{'Validated' if dry_run else 'Imported'} {totals['read']} rows", ending='\r')
+
+        if not dry_run:
+            # rows were written behind the ORM, so count them once for the dashboards and routing
+            rebuild_counters([company.pk])
+            TicketImport.objects.filter(pk=checkpoint.pk).update(finished_at=timezone.now())
+        self.report(totals, errors, started, dry_run)
+
+    def prepare(self, batches, context, workers):
+        """Yield prepared batches in file order, at most two per worker in flight."""
+        if workers <= 1:
+            init_worker(context)
+            for batch in batches:
+                yield prepare_batch(batch)
+            return
+        # workers set up their own connections
+        connections.close_all()
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(context,)) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(prepare_batch, batch))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def drop_taken(self, connection, rows, failed):
+        """
+        Split valid rows into ticket rows, resolution rows and the
+        ``(public_id, (status, priority, assigned_to))`` of the tickets,
+        failing given public_ids already in use.
+        """
+        given = [public_id for _, public_id, is_given, *_ in rows if is_given]
+        taken = set()
+        # a lookup per chunk of ids, within the backend's bound parameter limit
+        chunk = min(1000, connection.features.max_query_params or 1000)
+        for start in range(0, len(given), chunk):
+            # archived tickets keep their public_id
+            for model in (Ticket, ArchivedTicket):
+                taken.update(
+                    model.objects.using(connection.alias).filter(public_id__in=given[start:start + chunk])
+                    .values_list('public_id', flat=True)
+                )
+        tickets, resolutions, created = [], [], []
+        for number, public_id, is_given, ticket, resolution, summary in rows:
+            if public_id in taken:
+                failed.append((number, f'public_id {public_id} already exists.'))
+                continue
+            if is_given:
+                taken.add(public_id)
+            tickets.append(ticket)
+            if resolution is not None:
+                resolutions.append(resolution)
+            created.append((public_id, summary))
+        return tickets, resolutions, created
+
+    def report(self, totals, errors, started, dry_run):
+        elapsed = time.perf_counter() - started
+        for number, message in errors:
+            self.stdout.write(self.style.WARNING(f'Row {number}: {message}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Validated' if dry_run else 'Read'} {totals['read']} rows in {elapsed:.1f}s "
+            f"({totals['read'] / elapsed if elapsed else 0:.0f} rows/s): "
+            f"{totals['imported']} {'valid' if dry_run else 'imported'}, {totals['failed']} invalid."
+        ))
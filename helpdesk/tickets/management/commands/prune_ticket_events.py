@@ -0,0 +1,38 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+from tickets.models import TicketEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete outbox events delivered more than TICKET_EVENT_RETENTION_DAYS ago, and events created '
+        'that long ago that dispatch_webhooks gave up on, so the outbox stays small.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--max-attempts', type=int, default=10, help='The dispatcher\'s --max-attempts, events tried this often are given up'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.TICKET_EVENT_RETENTION_DAYS)
+        delivered = self.prune(TicketEvent.objects.filter(delivered_at__lt=cutoff), options['batch_size'])
+        given_up = self.prune(
+            TicketEvent.objects.filter(
+                delivered_at__isnull=True, attempts__gte=options['max_attempts'], created_at__lt=cutoff
+            ),
+            options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {delivered} delivered and {given_up} given up events older than {cutoff.isoformat()}.'
+        ))
+
+    def prune(self, events, batch_size):
+        total = 0
+        # oldest ids first, where old events sit; short deletes keep the dispatcher's leases quick
+        while ids := list(events.order_by('pk').values_list('pk', flat=True)[:batch_size]):
+            total += TicketEvent.objects.filter(pk__in=ids).delete()[0]
+        return total
@@ -0,0 +1,24 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+from tickets.models import TicketTombstone
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete changes-feed tombstones older than TICKET_SYNC_TOMBSTONE_DAYS. Sync tokens that old are '
+        'refused anyway, their clients sync from scratch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.TICKET_SYNC_TOMBSTONE_DAYS)
+        old = TicketTombstone.objects.filter(created_at__lt=cutoff)
+        total = 0
+        # short deletes, so feeds reading the table aren't held up
+        while ids := list(old.values_list('pk', flat=True)[:options['batch_size']]):
+            total += TicketTombstone.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} tombstones older than {cutoff.isoformat()}.'))
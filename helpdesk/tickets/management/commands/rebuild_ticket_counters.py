@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand, CommandError
+from tickets.models import Company
+from tickets.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard ticket counters from the ticket table, e.g. after they drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', action='append', dest='companies', metavar='SLUG',
+                            help='Only rebuild this company, can be repeated')
+
+    def handle(self, *args, **options):
+        company_ids = None
+        if options['companies']:
+            slugs = options['companies']
+            company_ids = list(Company.objects.filter(slug__in=slugs).values_list('pk', flat=True))
+            if len(company_ids) != len(set(slugs)):
+                raise CommandError('Unknown company slug.')
+        rows = rebuild_counters(company_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} ticket counter rows.'))
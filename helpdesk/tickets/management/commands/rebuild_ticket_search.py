@@ -0,0 +1,35 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from tickets.search import rebuild_sqlite_search_index, sqlite_search_index_problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Check the SQLite full-text index against the ticket table and rebuild it when they disagree. '
+        'Postgres keeps its search vector in a generated column and needs no rebuild.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report, exit with an error when the index is inconsistent')
+        parser.add_argument('--force', action='store_true', help='Rebuild even when the index looks consistent')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(f'The {connection.vendor} backend has no separate search index to rebuild.')
+            return
+        problems = sqlite_search_index_problems(connection)
+        for problem in problems:
+            self.stdout.write(self.style.WARNING(problem))
+        if options['check']:
+            if problems:
+                raise CommandError('The search index does not match the tickets.')
+            self.stdout.write(self.style.SUCCESS('The search index matches the tickets.'))
+            return
+        if not problems and not options['force']:
+            self.stdout.write(self.style.SUCCESS('The search index matches the tickets, nothing to rebuild.'))
+            return
+        with transaction.atomic():
+            rebuild_sqlite_search_index(connection)
+        if problems := sqlite_search_index_problems(connection):
+            raise CommandError(f'The rebuilt search index is still inconsistent: {"; ".join(problems)}')
+        self.stdout.write(self.style.SUCCESS('Rebuilt the search index.'))
@@ -1,116 +1,252 @@
+from concurrent.futures import ProcessPoolExecutor
 from django.core.management import BaseCommand
-from tickets.models import Ticket, Company, TicketResolution
+from django.db import connection, connections, transaction
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils.text import slugify
+from tickets.models import Ticket, Company, TicketResolution
+from tickets.counters import rebuild_counters
 from faker import Faker
+import django
 import random
 import re
+import time
+import uuid
 
 User = get_user_model()
 
-def status(users, company):
-    status_choice = random.choice((['open', 'in_progress', 'closed']))
+# tickets draw their text from pools built once with Faker, generating
+# fresh text per ticket dominates the runtime at millions of rows
+TEXT_POOL_SIZE = 1000
+
+_worker_context = None
+
+
+def status(agents, company_id, rng):
+    status_choice = rng.choice(['open', 'in_progress', 'closed'])
     assigned_to = None
-    eligible_agents = []
-    for user in users:
-        if user.company == company and user.role in ['agent', 'admin'] :
-            eligible_agents.append(user)
-    if status_choice in ['in_progress', 'closed']:
-        assigned_to = random.choice(eligible_agents) if eligible_agents else None
+    eligible_agents = agents.get(company_id)
+    if status_choice in ['in_progress', 'closed'] and eligible_agents:
+        assigned_to = rng.choice(eligible_agents)
     return status_choice, assigned_to
 
 
-def resolution_message(tickets, faker):
-    message = faker.sentence()
-    for ticket in tickets:
-        if ticket.status == 'closed':
-            TicketResolution.objects.create(
-                ticket=ticket,
-                message=message
-            )
+def resolution_message(tickets, messages, rng):
+    return [
+        TicketResolution(ticket_id=ticket.public_id, message=rng.choice(messages))
+        for ticket in tickets if ticket.status == 'closed'
+    ]
+
 
-def assign_company(users, company):
+def assign_company(owned_companies, company_id, rng):
     roles = ['admin', 'agent', 'owner', 'customer']
-    role = random.choice(roles)
+    role = rng.choice(roles)
 
-    owner_exists = any(
-        user.role == 'owner' and user.company == company for user in users
-    )
+    if role == 'owner' and company_id in owned_companies:
+        role = rng.choice(['admin', 'agent', 'customer'])
+    if role == 'owner':
+        owned_companies.add(company_id)
+    if role == 'customer':
+        company_id = None
 
-    if owner_exists and role == 'owner':
-        role = random.choice(['admin', 'agent', 'customer'])
+    return role, company_id
 
-    if role == 'customer':
-        company = None
 
-    return role, company
+def bulk_create_ids(model, objs, key):
+    """bulk_create ``objs`` and return their primary keys, in order."""
+    model.objects.bulk_create(objs)
+    if connection.features.can_return_rows_from_bulk_insert:
+        return [obj.pk for obj in objs]
+    # backends like MySQL don't hand back the generated keys
+    keys = [getattr(obj, key) for obj in objs]
+    pks = dict(model.objects.filter(**{f'{key}__in': keys}).values_list(key, 'pk'))
+    return [pks[value] for value in keys]
+
+
+def seed_ticket_batch(batch_index, count):
+    context = _worker_context
+    pool = context['pool']
+    # every batch has its own generator, so output doesn't depend on --workers
+    rng = random.Random(f"{context['seed']}-tickets-{batch_index}")
+
+    tickets = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            user_id = rng.choice(context['user_ids'])
+            first_name = ''
+            last_name = ''
+            email = ''
+        else:
+            user_id = None
+            first_name = rng.choice(pool['first_names'])
+            last_name = rng.choice(pool['last_names'])
+            email = rng.choice(pool['emails'])
+        company_id = rng.choice(context['company_ids'])
+        status_choice, assigned_to = status(context['agents'], company_id, rng)
+        tickets.append(Ticket(
+            # random ids, seeding again with the same --seed adds new tickets
+            public_id=uuid.uuid4(),
+            user_id=user_id,
+            first_name=first_name,
+            last_name=last_name,
+            email=email,
+            subject=rng.choice(pool['subjects']),
+            description=rng.choice(pool['descriptions']),
+            status=status_choice,
+            assigned_to_id=assigned_to,
+            company_id=company_id,
+            # closing a ticket resets its priority
+            priority=0 if status_choice == 'closed' else rng.randint(0, 3)
+        ))
+
+    with transaction.atomic():
+        Ticket.objects.bulk_create(tickets)
+        TicketResolution.objects.bulk_create(resolution_message(tickets, pool['messages'], rng))
+    return count
+
+
+def init_worker(context):
+    global _worker_context
+    django.setup()
+    _worker_context = context
+
 
 class Command(BaseCommand):
     help = 'Seed the database with sample tickets'
-    
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=5)
+        parser.add_argument('--users', type=int, default=30)
+        parser.add_argument('--tickets', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible data, random by default')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=1, help='Processes inserting tickets in parallel')
+
+    def handle(self, *args, **options):
+        seed = options['seed']
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.stdout.write(f'Seeding with --seed {seed}')
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows a single writer, seeding tickets with one worker.'))
+            workers = 1
+
+        self.company_ids = []
+        self.user_ids = []
+        if workers == 1:
+            with transaction.atomic():
+                self.seed(seed, workers, options)
+            return
+        try:
+            self.seed(seed, workers, options)
+        except BaseException:
+            # worker batches commit on their own connections, remove what the failed run created
+            self.clean_up(options['batch_size'])
+            raise
+
+    def seed(self, seed, workers, options):
+        rng = random.Random(seed)
         faker = Faker()
+        faker.seed_instance(seed)
+        batch_size = options['batch_size']
+        started = time.perf_counter()
 
         #create sample companies
+        taken_slugs = set(Company.objects.values_list('slug', flat=True))
         companies = []
-        for _ in range(5):
+        for index in range(options['companies']):
             name = faker.company()
-            mail = faker.email()
-            phone = faker.phone_number()
-            digits_only = re.sub(r'\D', '', phone)
-            phone_12 = digits_only[:12]
-            address = faker.address()
-            description = faker.sentence()
-            company = Company.objects.create(name=name, email=mail, phone=phone_12, address=address, description=description)
-            companies.append(company)
-        self.stdout.write(self.style.SUCCESS('Created 5 sample companies.'))
-
-        # Create sample users
-        users = []
-        for _ in range (30):
-            username = faker.user_name()
-            email = faker.email()
-            role, place_of_work = assign_company(users, random.choice(companies))
-            user = User.objects.create(
-                username=username, 
-                email=email, password='password123', 
-                company=place_of_work, 
-                role=role
-            )
-            users.append(user)
-        self.stdout.write(self.style.SUCCESS('Created 30 sample users.'))
+            slug = base = slugify(name)
+            # earlier runs with the same --seed took the same names
+            suffix = index
+            while slug in taken_slugs:
+                slug = f'{base}-{suffix}'
+                suffix += options['companies']
+            taken_slugs.add(slug)
+            phone_12 = re.sub(r'\D', '', faker.phone_number())[:12]
+            companies.append(Company(
+                name=name[:35],
+                slug=slug,
+                email=faker.email(),
+                phone=phone_12,
+                address=faker.address(),
+                description=faker.sentence()
+            ))
+        company_ids = bulk_create_ids(Company, companies, 'slug')
+        self.company_ids = company_ids
+        self.stdout.write(self.style.SUCCESS(f'Created {len(company_ids)} sample companies.'))
+
+        # Create sample users, indexing eligible agents per company as we go
+        password = make_password('password123')
+        offset = User.objects.count()
+        owned_companies = set()
+        agents = {}
+        user_ids = self.user_ids
+        for start in range(0, options['users'], batch_size):
+            users = []
+            for index in range(start, min(start + batch_size, options['users'])):
+                role, company_id = assign_company(owned_companies, rng.choice(company_ids), rng)
+                users.append(User(
+                    username=f'{faker.user_name()}{offset + index}',
+                    email=faker.email(),
+                    password=password,
+                    company_id=company_id,
+                    role=role
+                ))
+            for user, pk in zip(users, bulk_create_ids(User, users, 'username')):
+                user_ids.append(pk)
+                if user.role in ['agent', 'admin']:
+                    agents.setdefault(user.company_id, []).append(pk)
+        self.stdout.write(self.style.SUCCESS(f'Created {len(user_ids)} sample users.'))
 
         # Create sample tickets
-        tickets = []
-        for _ in range(100):
-            if random.choice([True, False]):
-                user = random.choice(users)
-                first_name = ''
-                last_name = '' 
-                email = ''
-            else:
-                user = None
-                first_name = faker.first_name()
-                last_name = faker.last_name()
-                email = faker.email()
-            company = random.choice(companies)
-            subject = faker.sentence(nb_words=6)
-            description = faker.paragraph(nb_sentences=3)
-            status_choice, assigned_to = status(users, company)
-            priority =  random.randint(0, 4)
-            ticket = Ticket.objects.create(
-                user=user,
-                first_name=first_name,
-                last_name=last_name,
-                email=email,
-                subject=subject,
-                description=description,
-                status=status_choice,
-                assigned_to=assigned_to,
-                company=company,
-                priority=priority
-            )
-            tickets.append(ticket)
-        resolution_message(tickets, faker)
-        self.stdout.write(self.style.SUCCESS('Successfully seeded the database with sample tickets and resolution messages.'))
+        context = {
+            'seed': seed,
+            'company_ids': company_ids,
+            'user_ids': user_ids,
+            'agents': agents,
+            'pool': {
+                'first_names': [faker.first_name() for _ in range(TEXT_POOL_SIZE)],
+                'last_names': [faker.last_name() for _ in range(TEXT_POOL_SIZE)],
+                'emails': [faker.email() for _ in range(TEXT_POOL_SIZE)],
+                'subjects': [faker.sentence(nb_words=6) for _ in range(TEXT_POOL_SIZE)],
+                'descriptions': [faker.paragraph(nb_sentences=3) for _ in range(TEXT_POOL_SIZE)],
+                'messages': [faker.sentence() for _ in range(TEXT_POOL_SIZE)],
+            },
+        }
+        total = options['tickets']
+        batches = [
+            (index, min(batch_size, total - start))
+            for index, start in enumerate(range(0, total, batch_size))
+        ]
+        created = 0
+        if workers > 1:
+            # workers open their own connections
+            connections.close_all()
+            with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(context,)) as executor:
+                for count in executor.map(seed_ticket_batch, *zip(*batches)):
+                    created += count
+                    self.stdout.write(f'Created {created}/{total} tickets', ending='\r')
+        else:
+            init_worker(context)
+            for index, count in batches:
+                created += seed_ticket_batch(index, count)
+                self.stdout.write(f'Created {created}/{total} tickets', ending='\r')
+
+        # tickets were bulk inserted, so count them once for the dashboards
+        rebuild_counters(company_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully seeded the database with {created} sample tickets and resolution messages '
+            f'in {time.perf_counter() - started:.1f}s.'
+        ))
 
+    def clean_up(self, batch_size):
+        tickets = Ticket.objects.filter(company_id__in=self.company_ids)
+        while ids := list(tickets.values_list('pk', flat=True)[:batch_size]):
+            Ticket.objects.filter(pk__in=ids).delete()
+        for start in range(0, len(self.user_ids), batch_size):
+            User.objects.filter(pk__in=self.user_ids[start:start + batch_size]).delete()
+        Company.objects.filter(pk__in=self.company_ids).delete()
+        self.stdout.write(self.style.WARNING('Seeding failed, removed the companies, users and tickets it created.'))
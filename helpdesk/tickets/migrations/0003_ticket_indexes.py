@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 19:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0002_ticket_assigned_to_ticket_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['company', '-priority', 'created_at'], name='ticket_co_prio_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['company', 'status', '-priority', 'created_at'], name='ticket_co_status_prio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['company', 'assigned_to', 'status'], name='ticket_co_assignee_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['company', 'user'], name='ticket_co_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['company', '-priority', 'created_at'], name='ticket_open_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 19:52
+
+from django.db import migrations
+from tickets.search import install_search_index, uninstall_search_index
+
+
+def install(apps, schema_editor):
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0003_ticket_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 19:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_ticket_counters(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketCounter = apps.get_model('tickets', 'TicketCounter')
+    rows = (
+        Ticket.objects.order_by().values('company_id', 'status', 'priority', 'assigned_to')
+        .annotate(count=Count('pk'))
+    )
+    TicketCounter.objects.bulk_create([
+        TicketCounter(
+            company_id=row['company_id'], status=row['status'], priority=row['priority'],
+            assigned_to=row['assigned_to'] or 0, count=row['count']
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_ticket_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('in_progress', 'In Progress'), ('closed', 'Closed')], max_length=20)),
+                ('priority', models.IntegerField(choices=[(0, 'None'), (1, 'Low'), (2, 'Medium'), (3, 'High')])),
+                ('assigned_to', models.BigIntegerField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_counters', to='tickets.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'status', 'priority', 'assigned_to'), name='unique_ticket_counter')],
+            },
+        ),
+        migrations.RunPython(populate_ticket_counters, migrations.RunPython.noop),
+    ]
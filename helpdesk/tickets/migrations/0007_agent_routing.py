@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 19:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def populate_agent_loads(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Ticket = apps.get_model('tickets', 'Ticket')
+    AgentLoad = apps.get_model('tickets', 'AgentLoad')
+    loads = {
+        (row['company_id'], row['assigned_to']): row['load']
+        for row in Ticket.objects.exclude(status='closed').filter(assigned_to__isnull=False)
+        .order_by().values('company_id', 'assigned_to').annotate(load=Sum(F('priority') + 1))
+    }
+    agents = User.objects.filter(role__in=['agent', 'admin'], company__isnull=False, is_active=True)
+    AgentLoad.objects.bulk_create([
+        AgentLoad(agent_id=agent_id, company_id=company_id, load=loads.get((company_id, agent_id), 0))
+        for agent_id, company_id in agents.values_list('pk', 'company_id')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_ticket_updated_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='auto_assign',
+            field=models.BooleanField(default=False, help_text='Route new tickets to the least-loaded agent'),
+        ),
+        migrations.CreateModel(
+            name='AgentLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('load', models.IntegerField(default=0)),
+                ('agent', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='routing_load', to=settings.AUTH_USER_MODEL)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agent_loads', to='tickets.company')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'load', 'agent'], name='agent_load_company_load_idx')],
+            },
+        ),
+        migrations.RunPython(populate_agent_loads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 19:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_agent_routing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', True), ('status', 'open')), fields=['company', '-priority', 'created_at', 'public_id'], name='ticket_unassigned_queue_idx'),
+        ),
+    ]
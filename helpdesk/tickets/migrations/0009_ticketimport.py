@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_ticket_claim_queue_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('rows_read', models.BigIntegerField(default=0)),
+                ('rows_imported', models.BigIntegerField(default=0)),
+                ('rows_failed', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_imports', to='tickets.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'source'), name='unique_ticket_import_source')],
+            },
+        ),
+    ]
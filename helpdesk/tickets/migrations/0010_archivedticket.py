@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-18 20:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_ticketimport'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTicket',
+            fields=[
+                ('public_id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('first_name', models.CharField(blank=True, max_length=100)),
+                ('last_name', models.CharField(blank=True, max_length=100)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('subject', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('status', models.CharField(choices=[('open', 'Open'), ('in_progress', 'In Progress'), ('closed', 'Closed')], default='closed', max_length=20)),
+                ('priority', models.IntegerField(choices=[(0, 'None'), (1, 'Low'), (2, 'Medium'), (3, 'High')], default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_assigned_tickets', to=settings.AUTH_USER_MODEL)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tickets', to='tickets.company')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_tickets', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedTicketResolution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resolution', to='tickets.archivedticket')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedticket',
+            index=models.Index(fields=['company', '-priority', 'created_at', 'public_id'], name='archived_co_prio_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedticket',
+            index=models.Index(fields=['company', 'user'], name='archived_co_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedticket',
+            index=models.Index(fields=['company', 'updated_at'], name='archived_co_updated_idx'),
+        ),
+    ]
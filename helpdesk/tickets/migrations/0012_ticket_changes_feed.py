@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 21:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0011_ticket_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('public_id', models.UUIDField()),
+                ('user', models.BigIntegerField(blank=True, null=True)),
+                ('assigned_to', models.BigIntegerField(blank=True, null=True)),
+                ('reason', models.CharField(choices=[('deleted', 'Deleted'), ('archived', 'Archived'), ('unassigned', 'Unassigned')], max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='ticket',
+            name='ticket_co_updated_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['company', 'updated_at', 'public_id'], name='ticket_co_updated_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='tickettombstone',
+            name='company',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ticket_tombstones', to='tickets.company'),
+        ),
+        migrations.AddIndex(
+            model_name='tickettombstone',
+            index=models.Index(fields=['company', 'created_at', 'id'], name='tombstone_co_created_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-19 09:12
+
+from django.db import migrations
+from tickets.search import install_search_index, uninstall_search_index
+
+
+def reinstall(apps, schema_editor):
+    # the SQLite index moves from the ticket table's rowid to a key table of its own
+    if schema_editor.connection.vendor == 'sqlite':
+        uninstall_search_index(schema_editor.connection)
+        install_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0012_ticket_changes_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(reinstall, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 import uuid
 from django.utils.text import slugify
 
@@ -13,6 +14,7 @@ class Company(models.Model):
     phone = models.CharField(blank=True, null=True, max_length=12)
     address = models.CharField(max_length=255, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
+    auto_assign = models.BooleanField(default=False, help_text='Route new tickets to the least-loaded agent')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -50,6 +52,33 @@ class Ticket(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_tickets')
 
+    class Meta:
+        indexes = [
+            # owner/admin listing: company tickets ordered by priority
+            models.Index(fields=['company', '-priority', 'created_at'], name='ticket_co_prio_created_idx'),
+            # status scoped listings (resolutions, open queues)
+            models.Index(fields=['company', 'status', '-priority', 'created_at'], name='ticket_co_status_prio_idx'),
+            # agent listing
+            models.Index(fields=['company', 'assigned_to', 'status'], name='ticket_co_assignee_status_idx'),
+            # customer listing
+            models.Index(fields=['company', 'user'], name='ticket_co_user_idx'),
+            # list validators: MAX(updated_at) and COUNT(*) from the index alone;
+            # the changes feed walks (updated_at, public_id) in the same index
+            models.Index(fields=['company', 'updated_at', 'public_id'], name='ticket_co_updated_id_idx'),
+            # open tickets are a small, hot slice of the table
+            models.Index(
+                fields=['company', '-priority', 'created_at'],
+                condition=models.Q(status='open'),
+                name='ticket_open_queue_idx'
+            ),
+            # claim queue: unassigned open tickets in claim order
+            models.Index(
+                fields=['company', '-priority', 'created_at', 'public_id'],
+                condition=models.Q(status='open', assigned_to__isnull=True),
+                name='ticket_unassigned_queue_idx'
+            ),
+        ]
+
     def __str__(self):
         if self.user:
             return f"{self.subject} by {self.user.username}"
@@ -63,4 +92,175 @@ class TicketResolution(models.Model):
 
     def __str__(self):
         return f'Resolution for {self.ticket.public_id} with the subject {self.ticket.subject}'
-    
\ No newline at end of file
+
+
+class TicketCounter(models.Model):
+    # maintained incrementally by tickets.counters, so dashboards never COUNT(*) tickets
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='ticket_counters')
+    status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    priority = models.IntegerField(choices=Ticket.PRIORITY_CHOICES)
+    # plain user id rather than a FK, 0 when unassigned, so the key stays unique
+    assigned_to = models.BigIntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['company', 'status', 'priority', 'assigned_to'],
+                name='unique_ticket_counter'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.company_id}/{self.status}/{self.priority}/{self.assigned_to}: {self.count}'
+
+
+class AgentLoad(models.Model):
+    # one row per agent/admin, maintained by tickets.routing from the counter deltas
+    agent = models.OneToOneField(User, on_delete=models.CASCADE, related_name='routing_load')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='agent_loads')
+    # unresolved assigned tickets, weighted by priority
+    load = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # least-loaded agent of a company is the first index entry
+            models.Index(fields=['company', 'load', 'agent'], name='agent_load_company_load_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.agent_id}: {self.load}'
+
+
+
+class TicketImport(models.Model):
+    # checkpoint of an import_tickets run, advanced in the transaction of every batch
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='ticket_imports')
+    source = models.CharField(max_length=255)
+    rows_read = models.BigIntegerField(default=0)
+    rows_imported = models.BigIntegerField(default=0)
+    rows_failed = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'source'], name='unique_ticket_import_source'),
+        ]
+
+    def __str__(self):
+        return f'{self.source} into {self.company_id}: {self.rows_imported} imported'
+
+
+class ArchivedTicket(models.Model):
+    # closed tickets moved out of Ticket by archive_tickets, same columns and public_id; read-only from the API
+    public_id = models.UUIDField(primary_key=True, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='archived_tickets')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_tickets')
+    first_name = models.CharField(max_length=100, blank=True)
+    last_name = models.CharField(max_length=100, blank=True)
+    email = models.EmailField(blank=True)
+    subject = models.CharField(max_length=200)
+    description = models.TextField()
+    status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES, default='closed')
+    priority = models.IntegerField(choices=Ticket.PRIORITY_CHOICES, default=0)
+    # copied from the hot row, not auto_now
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    assigned_to = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_assigned_tickets'
+    )
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # resolution listing, in TicketCursorPagination order
+            models.Index(fields=['company', '-priority', 'created_at', 'public_id'], name='archived_co_prio_created_idx'),
+            # customer resolution listing
+            models.Index(fields=['company', 'user'], name='archived_co_user_idx'),
+            # list validators
+            models.Index(fields=['company', 'updated_at'], name='archived_co_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} (archived)'
+
+
+class ArchivedTicketResolution(models.Model):
+    ticket = models.OneToOneField(ArchivedTicket, on_delete=models.CASCADE, related_name='resolution')
+    message = models.TextField()
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'Resolution for archived {self.ticket_id}'
+
+
+class WebhookEndpoint(models.Model):
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='webhook_endpoints')
+    url = models.URLField(max_length=500)
+    # request bodies are signed with HMAC-SHA256 when set
+    secret = models.CharField(max_length=128, blank=True)
+    # TicketEvent types to receive, empty for every type
+    event_types = models.JSONField(default=list, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.url} for {self.company_id}'
+
+
+class TicketEvent(models.Model):
+    # transactional outbox: written with the ticket change, delivered by dispatch_webhooks
+    EVENT_TYPES = [
+        ('ticket.created', 'Ticket created'),
+        ('ticket.assigned', 'Ticket assigned'),
+        ('ticket.closed', 'Ticket closed'),
+    ]
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='ticket_events')
+    # plain id, events outlive deleted tickets
+    ticket_id = models.UUIDField()
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPES)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # the dispatcher's queue: undelivered events that are due
+            models.Index(
+                fields=['next_attempt_at', 'id'],
+                condition=models.Q(delivered_at__isnull=True),
+                name='ticket_event_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.event_type} {self.ticket_id}'
+
+
+class TicketTombstone(models.Model):
+    # a ticket that left the changes feed of some callers: deleted, archived, or moved to another agent
+    REASONS = [
+        ('deleted', 'Deleted'),
+        ('archived', 'Archived'),
+        ('unassigned', 'Unassigned'),
+    ]
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='ticket_tombstones')
+    public_id = models.UUIDField()
+    # plain user ids of the ticket at the time, so the feed knows whom to tell
+    user = models.BigIntegerField(null=True, blank=True)
+    assigned_to = models.BigIntegerField(null=True, blank=True)
+    reason = models.CharField(max_length=20, choices=REASONS)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'created_at', 'id'], name='tombstone_co_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.public_id} {self.reason}'
@@ -0,0 +1,22 @@
+from .models import TicketEvent
+
+
+def ticket_event(event_type, ticket, **extra):
+    """An unsaved outbox row for a Ticket instance, saved or not."""
+    payload = {
+        'public_id': str(ticket.public_id),
+        'status': ticket.status,
+        'priority': ticket.priority,
+        'assigned_to': ticket.assigned_to_id,
+        **extra,
+    }
+    return TicketEvent(company_id=ticket.company_id, ticket_id=ticket.public_id, event_type=event_type, payload=payload)
+
+
+def record_events(events):
+    """
+    Append outbox rows. Call inside the transaction that changed the
+    tickets, so an event exists exactly when its change committed.
+    """
+    if events:
+        TicketEvent.objects.bulk_create(events, batch_size=1000)
@@ -0,0 +1,225 @@
+import heapq
+import json
+from datetime import date, datetime
+from functools import cmp_to_key
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+def _encode_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed on the whole ordering instead of its first field.
+
+    DRF's CursorPagination positions on the first ordering field and uses an
+    OFFSET for rows sharing that value, which degrades on a low-cardinality
+    field like ``priority``. Here ``tie_breakers`` are appended to the
+    ordering and the cursor carries every value, so each page is one range
+    query with no OFFSET and no COUNT(*), however deep the client pages.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    tie_breakers = ()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        if queryset is None:
+            return None
+        return self.set_page([row async for row in queryset])
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+        Paginate querysets sharing the ordering fields, such as hot and
+        archived tickets, as one list: each yields one page from the cursor
+        on and the pages are merged in order.
+        """
+        querysets = [self.page_queryset(queryset, request, view) for queryset in querysets]
+        if querysets[0] is None:
+            return None
+        return self.set_page(self.merge_pages([list(queryset) for queryset in querysets]))
+
+    async def apaginate_querysets(self, querysets, request, view=None):
+        querysets = [self.page_queryset(queryset, request, view) for queryset in querysets]
+        if querysets[0] is None:
+            return None
+        return self.set_page(self.merge_pages([[row async for row in queryset] for queryset in querysets]))
+
+    def merge_pages(self, pages):
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+
+        def compare(first, second):
+            for field in ordering:
+                name = field.lstrip('-')
+                a, b = self._get_value(first, name), self._get_value(second, name)
+                if a != b:
+                    result = -1 if a < b else 1
+                    return -result if field.startswith('-') else result
+            return 0
+        merged = heapq.merge(*pages, key=cmp_to_key(compare))
+        return list(islice(merged, self.page_size + 1))
+
+    def page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None and self.cursor.position is not None:
+            values = self.decode_position(queryset.model, self.cursor.position)
+            queryset = queryset.filter(self.position_filter(ordering, values))
+
+        # fetch one extra row to know whether another page follows
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        reverse = self.cursor is not None and self.cursor.reverse
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        fields = {field.lstrip('-') for field in ordering}
+        return ordering + tuple(field for field in self.tie_breakers if field not in fields)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def position_filter(self, ordering, values):
+        # (a, b, c) after (x, y, z) expands to
+        # a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        for index, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{field.lstrip("-")}__{lookup}': values[index]})
+            for previous, value in zip(ordering[:index], values[:index]):
+                clause &= Q(**{previous.lstrip('-'): value})
+            condition |= clause
+        return condition
+
+    def decode_position(self, model, position):
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.to_python(model, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, model, name, value):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # annotations such as a search rank are plain JSON values
+            return value
+        return field.to_python(value)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [self._get_value(instance, field.lstrip('-')) for field in ordering]
+        return json.dumps([_encode_value(value) for value in values])
+
+    def _get_value(self, instance, field_name):
+        if isinstance(instance, dict):
+            return instance[field_name]
+        return getattr(instance, field_name)
+
+
+class TicketCursorPagination(KeysetCursorPagination):
+    ordering = '-priority'
+    tie_breakers = ('created_at', 'public_id')
+
+
+class TicketSearchPagination(KeysetCursorPagination):
+    ordering = '-rank'
+    tie_breakers = ('-priority', 'created_at', 'public_id')
+
+
+def estimated_count(queryset):
+    """The Postgres planner's row estimate for ``queryset``, from EXPLAIN without running it."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for admin changelists over large tables.
+
+    On Postgres the count is the planner's estimate once it passes
+    ADMIN_ESTIMATED_COUNT_THRESHOLD, so paging a filtered changelist of
+    millions of tickets doesn't scan them all for COUNT(*). Smaller results
+    and other backends get the exact count. Page numbers near the end of an
+    estimated list may be empty or miss a few rows.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = estimated_count(queryset)
+            if estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
@@ -1,9 +1,23 @@
 from rest_framework.permissions import BasePermission
+from .tenancy import get_request_company_id
 
 class CanAccessTicketResolution(BasePermission):
     def has_object_permission(self, request, view, obj):
         user = request.user
         if  user.is_authenticated and user.role in ['owner', 'admin','agent']:
-            if obj.company == user.company and obj.status == 'closed':
+            if obj.company_id == user.company_id and obj.status == 'closed':
                 return True
-        return False
\ No newline at end of file
+        return False
+
+
+class IsCompanyStaff(BasePermission):
+    def has_permission(self, request, view):
+        user = request.user
+        if not user.is_authenticated:
+            return False
+        if user.is_superuser:
+            return True
+        return (
+            user.role in ['owner', 'admin', 'agent'] and
+            user.company_id == get_request_company_id(request, view.kwargs.get('slug'))
+        )
@@ -0,0 +1,100 @@
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .counters import record_change
+from .models import Ticket
+from .outbox import record_events, ticket_event
+
+TICKET_TABLE = Ticket._meta.db_table
+
+# highest priority first, oldest first within a priority
+QUEUE_ORDERING = ('-priority', 'created_at', 'public_id')
+
+CLAIM_SQL = f"""
+    UPDATE {TICKET_TABLE} SET assigned_to_id = %s, status = 'in_progress', updated_at = %s
+    WHERE public_id = (
+        SELECT public_id FROM {TICKET_TABLE}
+        WHERE company_id = %s AND status = 'open' AND assigned_to_id IS NULL
+        ORDER BY priority DESC, created_at, public_id
+        LIMIT 1
+        {{lock}}
+    )
+    RETURNING public_id, priority
+"""
+# Postgres skips candidates other claims hold; SQLite runs one writer at a
+# time, so its statement needs no lock and waits on the busy timeout instead
+# of failing a read-then-write upgrade
+CLAIM_LOCKS = {
+    'postgresql': 'FOR UPDATE SKIP LOCKED',
+    'sqlite': '',
+}
+
+# backends without UPDATE ... RETURNING (MySQL, SQLite < 3.35) retry when a concurrent claim took the candidate first
+CLAIM_ATTEMPTS = 10
+
+
+def can_update_returning(connection):
+    """Whether the backend runs CLAIM_SQL: UPDATE ... RETURNING is in every supported Postgres and SQLite 3.35+."""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+def unassigned_queue(company_id):
+    return Ticket.objects.filter(
+        company_id=company_id, status='open', assigned_to__isnull=True
+    ).order_by(*QUEUE_ORDERING)
+
+
+def claim_next_ticket(company_id, agent_id):
+    """
+    Assign the next unassigned open ticket of a company to ``agent_id`` and
+    move it to in_progress. Returns its public_id, or None when no ticket
+    could be claimed.
+
+    On Postgres and SQLite one UPDATE picks and claims the ticket; Postgres
+    skips rows other claims have locked, so concurrent agents never wait on
+    each other's candidate. Elsewhere the UPDATE is a compare-and-set on a
+    candidate that is retried if another claim won it.
+    """
+    connection = connections[router.db_for_write(Ticket)]
+    with transaction.atomic(using=connection.alias):
+        if can_update_returning(connection):
+            now = Ticket._meta.get_field('updated_at').get_db_prep_value(timezone.now(), connection)
+            with connection.cursor() as cursor:
+                cursor.execute(CLAIM_SQL.format(lock=CLAIM_LOCKS[connection.vendor]), [agent_id, now, company_id])
+                claimed = cursor.fetchone()
+            if claimed is not None:
+                # raw rows carry the backend's UUID format, e.g. undashed hex on SQLite
+                claimed = (Ticket._meta.pk.to_python(claimed[0]), claimed[1])
+        else:
+            claimed = _claim_with_retries(connection, company_id, agent_id)
+        if claimed is None:
+            return None
+
+        public_id, priority = claimed
+        # counters last, so their hot rows are locked only until the commit
+        record_change((company_id, 'open', priority, 0), (company_id, 'in_progress', priority, agent_id))
+        record_events([ticket_event('ticket.assigned', Ticket(
+            public_id=public_id, company_id=company_id, status='in_progress', priority=priority, assigned_to_id=agent_id
+        ))])
+        return public_id
+
+
+def _claim_with_retries(connection, company_id, agent_id):
+    queue = unassigned_queue(company_id)
+    candidates = queue.values_list('public_id', 'priority')
+    if connection.features.has_select_for_update_skip_locked:
+        candidates = candidates.select_for_update(skip_locked=True)
+    for _ in range(CLAIM_ATTEMPTS):
+        candidate = candidates.first()
+        if candidate is None:
+            return None
+        # only succeeds while the ticket is still open and unassigned
+        if queue.filter(public_id=candidate[0]).update(
+            assigned_to_id=agent_id, status='in_progress', updated_at=timezone.now()
+        ):
+            return candidate
+    return None
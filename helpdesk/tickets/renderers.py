@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON, one record per line; ``stream`` renders rows lazily."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        records = data if isinstance(data, list) else [data]
+        return ''.join(self.stream(records)).encode(self.charset)
+
+    def stream(self, records, batch_size=1000):
+        lines = []
+        for record in records:
+            lines.append(json.dumps(record, cls=JSONEncoder, ensure_ascii=False) + '\n')
+            if len(lines) >= batch_size:
+                yield ''.join(lines)
+                lines = []
+        if lines:
+            yield ''.join(lines)
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV with a header row, from flat records; ``stream`` renders rows lazily."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        records = data if isinstance(data, list) else [data]
+        header = list(records[0]) if records else []
+        return ''.join(self.stream(records, header)).encode(self.charset)
+
+    def stream(self, records, header, batch_size=1000):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=header, extrasaction='ignore')
+        writer.writeheader()
+        for count, record in enumerate(records, 1):
+            writer.writerow(record)
+            if count % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
@@ -0,0 +1,145 @@
+import heapq
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, router
+from django.db.models import F, Sum
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import AgentLoad, Ticket
+
+User = get_user_model()
+
+ROUTABLE_ROLES = ['agent', 'admin']
+
+
+def ticket_weight(priority):
+    """Load an unresolved ticket adds to its agent, None=1 up to High=4."""
+    return priority + 1
+
+
+def pick_agent(company_id):
+    """
+    Return the id of the least-loaded agent of a company routing tickets
+    automatically, or None.
+
+    The chosen load row stays locked until the transaction ends, so the
+    ticket insert and its load delta commit together. Concurrent creates
+    skip rows already locked and route to the next agent instead of
+    queueing on the same one.
+    """
+    loads = (
+        AgentLoad.objects.filter(company_id=company_id, company__auto_assign=True)
+        .order_by('load', 'agent_id')
+        .values_list('agent_id', flat=True)
+    )
+    features = connections[router.db_for_write(AgentLoad)].features
+    # lock the load row only, not the joined company
+    lock = {'of': ('self',)} if features.has_select_for_update_of else {}
+    if features.has_select_for_update_skip_locked:
+        agent_id = loads.select_for_update(skip_locked=True, **lock).first()
+        if agent_id is not None:
+            return agent_id
+    # every row is taken (or the backend can't skip): wait for the least loaded
+    return loads.select_for_update(**lock).first()
+
+
+def assign(ticket, agent_id):
+    """Give ``ticket`` to an agent, who takes it in progress, like assign_agent does."""
+    ticket.assigned_to_id = agent_id
+    ticket.status = 'in_progress'
+
+
+def route_tickets(company_id, tickets):
+    """
+    Assign the unsaved ``tickets`` of a company routing automatically that
+    are neither assigned nor closed to its least-loaded agents. Returns the
+    tickets routed, the caller inserts them with their counter changes and
+    ``ticket.assigned`` events in the same transaction.
+
+    A batch locks every load row of the company and spreads its tickets as
+    consecutive creates would.
+    """
+    routable = [ticket for ticket in tickets if ticket.assigned_to_id is None and ticket.status != 'closed']
+    if len(routable) == 1:
+        agent_id = pick_agent(company_id)
+        if agent_id is None:
+            return []
+        assign(routable[0], agent_id)
+        return routable
+    if not routable:
+        return []
+
+    features = connections[router.db_for_write(AgentLoad)].features
+    lock = {'of': ('self',)} if features.has_select_for_update_of else {}
+    loads = [
+        (load, agent_id) for agent_id, load in
+        AgentLoad.objects.filter(company_id=company_id, company__auto_assign=True)
+        .order_by('agent_id').select_for_update(**lock).values_list('agent_id', 'load')
+    ]
+    if not loads:
+        return []
+    heapq.heapify(loads)
+    for ticket in routable:
+        load, agent_id = heapq.heappop(loads)
+        assign(ticket, agent_id)
+        heapq.heappush(loads, (load + ticket_weight(ticket.priority), agent_id))
+    return routable
+
+
+def apply_load_deltas(deltas):
+    """Apply ``{counter_key: delta}`` ticket moves to the agents' loads."""
+    loads = Counter()
+    for (company_id, status, priority, assigned_to), delta in deltas.items():
+        if assigned_to and status != 'closed':
+            loads[(company_id, assigned_to)] += ticket_weight(priority) * delta
+    # agents that aren't routable have no row, the update is then a no-op
+    for company_id, agent_id in sorted(key for key, delta in loads.items() if delta):
+        AgentLoad.objects.filter(company_id=company_id, agent_id=agent_id).update(
+            load=F('load') + loads[(company_id, agent_id)]
+        )
+
+
+def agent_loads(tickets):
+    """``{(company_id, agent_id): load}`` of ``tickets``, weighted like ``ticket_weight``."""
+    tickets = tickets.exclude(status='closed').filter(assigned_to__isnull=False)
+    rows = (
+        tickets.order_by()
+        .values('company_id', 'assigned_to')
+        .annotate(load=Sum(F('priority') + 1))
+    )
+    return {(row['company_id'], row['assigned_to']): row['load'] for row in rows}
+
+
+def rebuild_agent_loads(company_ids=None):
+    """Recreate the load rows of every routable user, inside the caller's transaction."""
+    agents = User.objects.filter(role__in=ROUTABLE_ROLES, company__isnull=False, is_active=True)
+    tickets = Ticket.objects.all()
+    existing = AgentLoad.objects.all()
+    if company_ids is not None:
+        agents = agents.filter(company_id__in=company_ids)
+        tickets = tickets.filter(company_id__in=company_ids)
+        existing = existing.filter(company_id__in=company_ids)
+    loads = agent_loads(tickets)
+    existing.delete()
+    AgentLoad.objects.bulk_create([
+        AgentLoad(agent_id=agent_id, company_id=company_id, load=loads.get((company_id, agent_id), 0))
+        for agent_id, company_id in agents.values_list('pk', 'company_id')
+    ], batch_size=1000)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def sync_agent_load(sender, instance, **kwargs):
+    # role, company and activation changes add or drop the user from routing
+    routable = instance.company_id and instance.role in ROUTABLE_ROLES and instance.is_active
+    current = AgentLoad.objects.filter(agent_id=instance.pk).values_list('company_id', flat=True).first()
+    if routable and current == instance.company_id:
+        return
+    if current is not None:
+        AgentLoad.objects.filter(agent_id=instance.pk).delete()
+    if routable:
+        tickets = Ticket.objects.filter(company_id=instance.company_id, assigned_to_id=instance.pk)
+        load = agent_loads(tickets).get((instance.company_id, instance.pk), 0)
+        AgentLoad.objects.create(agent_id=instance.pk, company_id=instance.company_id, load=load)
@@ -0,0 +1,197 @@
+import re
+
+from django.db import DatabaseError, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+TICKET_TABLE = 'tickets_ticket'
+SQLITE_FTS_TABLE = 'tickets_ticket_fts'
+POSTGRES_SEARCH_CONFIG = 'english'
+
+# Postgres keeps a generated tsvector column, so every write path (save,
+# bulk_create, update) maintains it without application code
+POSTGRES_INSTALL = [
+    f"""
+    ALTER TABLE {TICKET_TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{POSTGRES_SEARCH_CONFIG}', coalesce(subject, '')), 'A') ||
+        setweight(to_tsvector('{POSTGRES_SEARCH_CONFIG}', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    f'CREATE INDEX ticket_search_vector_idx ON {TICKET_TABLE} USING GIN (search_vector)',
+]
+POSTGRES_UNINSTALL = [
+    'DROP INDEX IF EXISTS ticket_search_vector_idx',
+    f'ALTER TABLE {TICKET_TABLE} DROP COLUMN IF EXISTS search_vector',
+]
+
+# SQLite indexes subject/description in a contentless FTS5 table. Its rowids
+# come from a key table with an INTEGER PRIMARY KEY per ticket public_id: the
+# ticket table's own rowid is implicit, VACUUM and the table rebuilds of
+# migrations renumber it, while declared integer keys never change
+SQLITE_KEY_TABLE = f'{SQLITE_FTS_TABLE}_key'
+SQLITE_KEY = f'(SELECT id FROM {SQLITE_KEY_TABLE} WHERE public_id = {{ticket}}.public_id)'
+SQLITE_TRIGGERS = {
+    f'{SQLITE_FTS_TABLE}_insert': f"""
+        CREATE TRIGGER {SQLITE_FTS_TABLE}_insert AFTER INSERT ON {TICKET_TABLE} BEGIN
+            INSERT INTO {SQLITE_KEY_TABLE}(public_id) VALUES (new.public_id);
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, subject, description)
+            VALUES ({SQLITE_KEY.format(ticket='new')}, new.subject, new.description);
+        END
+    """,
+    f'{SQLITE_FTS_TABLE}_delete': f"""
+        CREATE TRIGGER {SQLITE_FTS_TABLE}_delete AFTER DELETE ON {TICKET_TABLE} BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, subject, description)
+            VALUES ('delete', {SQLITE_KEY.format(ticket='old')}, old.subject, old.description);
+            DELETE FROM {SQLITE_KEY_TABLE} WHERE public_id = old.public_id;
+        END
+    """,
+    f'{SQLITE_FTS_TABLE}_update': f"""
+        CREATE TRIGGER {SQLITE_FTS_TABLE}_update AFTER UPDATE OF subject, description ON {TICKET_TABLE} BEGIN
+            INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, subject, description)
+            VALUES ('delete', {SQLITE_KEY.format(ticket='old')}, old.subject, old.description);
+            INSERT INTO {SQLITE_FTS_TABLE}(rowid, subject, description)
+            VALUES ({SQLITE_KEY.format(ticket='new')}, new.subject, new.description);
+        END
+    """,
+}
+
+
+def install_search_index(connection):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for sql in POSTGRES_INSTALL:
+                cursor.execute(sql)
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {SQLITE_KEY_TABLE} (id INTEGER PRIMARY KEY, public_id char(32) NOT NULL UNIQUE)'
+            )
+            cursor.execute(f"CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} USING fts5(subject, description, content='')")
+        ensure_sqlite_search_index(connection)
+
+
+def uninstall_search_index(connection):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for sql in POSTGRES_UNINSTALL:
+                cursor.execute(sql)
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for trigger in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute(f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}')
+            cursor.execute(f'DROP TABLE IF EXISTS {SQLITE_KEY_TABLE}')
+
+
+def rebuild_sqlite_search_index(connection):
+    """Reindex every ticket, with new keys."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('delete-all')")
+        cursor.execute(f'DELETE FROM {SQLITE_KEY_TABLE}')
+        cursor.execute(f'INSERT INTO {SQLITE_KEY_TABLE}(public_id) SELECT public_id FROM {TICKET_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {SQLITE_FTS_TABLE}(rowid, subject, description) '
+            f'SELECT k.id, t.subject, t.description FROM {TICKET_TABLE} t '
+            f'JOIN {SQLITE_KEY_TABLE} k ON k.public_id = t.public_id'
+        )
+
+
+def sqlite_search_index_problems(connection):
+    """
+    Return how the index disagrees with the ticket table, empty when it is
+    consistent: tickets without a key, keys without a ticket, and the FTS5
+    table's own integrity check.
+    """
+    problems = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT count(*) FROM {TICKET_TABLE} t WHERE NOT EXISTS '
+            f'(SELECT 1 FROM {SQLITE_KEY_TABLE} k WHERE k.public_id = t.public_id)'
+        )
+        if unkeyed := cursor.fetchone()[0]:
+            problems.append(f'{unkeyed} tickets are not indexed')
+        cursor.execute(
+            f'SELECT count(*) FROM {SQLITE_KEY_TABLE} k WHERE NOT EXISTS '
+            f'(SELECT 1 FROM {TICKET_TABLE} t WHERE t.public_id = k.public_id)'
+        )
+        if orphaned := cursor.fetchone()[0]:
+            problems.append(f'{orphaned} index entries have no ticket')
+        try:
+            cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('integrity-check')")
+        except DatabaseError as exc:
+            problems.append(f'the FTS5 integrity check failed: {exc}')
+    return problems
+
+
+def ensure_sqlite_search_index(connection):
+    """
+    Recreate missing FTS triggers, and rebuild the index when it no longer
+    matches the tickets.
+
+    SQLite migrations that alter the ticket table rebuild it from a copy,
+    which drops its triggers, so this runs after every migrate.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = %s OR name LIKE %s",
+            [SQLITE_FTS_TABLE, f'{SQLITE_FTS_TABLE}_%']
+        )
+        existing = {name for (name,) in cursor.fetchall()}
+        if SQLITE_FTS_TABLE not in existing:
+            return
+        missing = [sql for name, sql in SQLITE_TRIGGERS.items() if name not in existing]
+        for sql in missing:
+            cursor.execute(sql)
+    if missing and sqlite_search_index_problems(connection):
+        rebuild_sqlite_search_index(connection)
+
+
+def ensure_search_index(sender, using, **kwargs):
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        ensure_sqlite_search_index(connection)
+
+
+def search_tickets(queryset, query):
+    """
+    Filter ``queryset`` to tickets matching ``query`` and annotate a ``rank``,
+    higher being more relevant.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{POSTGRES_SEARCH_CONFIG}', %s)"
+        # ts_rank is a float4; the pagination cursor carries rank as a float8, which
+        # would no longer equal the float4 rank of its own row
+        return queryset.annotate(
+            rank=RawSQL(f'ts_rank({TICKET_TABLE}.search_vector, {tsquery})::float8', (query,), output_field=FloatField())
+        ).filter(
+            RawSQL(f'{TICKET_TABLE}.search_vector @@ {tsquery}', (query,), output_field=BooleanField())
+        )
+
+    if vendor == 'sqlite':
+        # quote every term so user input can't use FTS5 query syntax
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return queryset.none()
+        match = ' '.join(f'"{term}"' for term in terms)
+        return queryset.annotate(
+            # bm25 is lower for better matches; subject hits weigh double
+            rank=RawSQL(
+                f'(SELECT -bm25({SQLITE_FTS_TABLE}, 2.0, 1.0) FROM {SQLITE_FTS_TABLE} '
+                f'WHERE {SQLITE_FTS_TABLE} MATCH %s AND {SQLITE_FTS_TABLE}.rowid = {SQLITE_KEY.format(ticket=TICKET_TABLE)})',
+                (match,),
+                output_field=FloatField()
+            )
+        ).filter(
+            RawSQL(
+                f'{TICKET_TABLE}.public_id IN (SELECT k.public_id FROM {SQLITE_FTS_TABLE} '
+                f'JOIN {SQLITE_KEY_TABLE} k ON k.id = {SQLITE_FTS_TABLE}.rowid WHERE {SQLITE_FTS_TABLE} MATCH %s)',
+                (match,),
+                output_field=BooleanField()
+            )
+        )
+
+    # no text index on other backends, fall back to unranked substring matching
+    return queryset.annotate(rank=Value(0.0, output_field=FloatField())).filter(
+        Q(subject__icontains=query) | Q(description__icontains=query)
+    )
@@ -1,5 +1,9 @@
-from rest_framework import serializers
-from .models import Ticket, Company, TicketResolution
+from rest_framework import serializers, ISO_8601
+from rest_framework.settings import api_settings
+from django.utils import timezone
+from .models import Ticket, Company, TicketResolution, TicketTombstone
+from .counters import counter_key, record_change
+from .outbox import record_events, ticket_event
 from django.db import transaction
 from django.contrib.auth import get_user_model
 
@@ -48,6 +52,8 @@ class TicketSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         old_status = instance.status
         new_status = validated_data.get('status', old_status)
+        old_key = counter_key(instance)
+        old_assigned_to = instance.assigned_to_id
 
 
         #remove the message before updating the message
@@ -55,30 +61,161 @@ class TicketSerializer(serializers.ModelSerializer):
 
         instance = super().update(instance, validated_data)
 
-        if old_status == new_status:
-            return instance
-
-        
         #continue from here not done
-        if new_status == 'closed':
+        if old_status != new_status and new_status == 'closed':
             TicketResolution.objects.create(
                 ticket=instance,
                 message=resolution_message
             )
             instance.priority = 0
             instance.save(update_fields=['priority'])
+
+        record_change(old_key, counter_key(instance))
+
+        if old_assigned_to is not None and instance.assigned_to_id != old_assigned_to:
+            # drops out of the previous agent's changes feed
+            TicketTombstone.objects.create(
+                company_id=instance.company_id, public_id=instance.public_id, user=instance.user_id,
+                assigned_to=old_assigned_to, reason='unassigned'
+            )
+
+        events = []
+        if instance.assigned_to_id is not None and instance.assigned_to_id != old_assigned_to:
+            events.append(ticket_event('ticket.assigned', instance))
+        if old_status != new_status and new_status == 'closed':
+            events.append(ticket_event('ticket.closed', instance, resolution_message=resolution_message))
+        record_events(events)
         return instance
 
 
+def _datetime_formatter():
+    """
+    Build a DateTimeField.to_representation equivalent for a whole response.
+
+    The current timezone and output format are looked up once instead of
+    once per value.
+    """
+    if api_settings.DATETIME_FORMAT != ISO_8601:
+        return serializers.DateTimeField().to_representation
+    current_timezone = timezone.get_current_timezone()
+
+    def format_datetime(value):
+        if value is None:
+            return None
+        if timezone.is_aware(value):
+            value = value.astimezone(current_timezone)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return format_datetime
+
+
+class TicketListSerializer(serializers.BaseSerializer):
+    """
+    Read-only fast path for ticket list responses.
+
+    Renders the same JSON as TicketSerializer from ``.values()`` rows, so
+    listing skips model instantiation and per-row field introspection.
+    Querysets must be prepared with ``TicketListSerializer.values()``.
+    """
+    columns = (
+        'user', 'first_name', 'last_name', 'email', 'subject',
+        'description', 'status', 'created_at', 'public_id',
+        'assigned_to', 'updated_at', 'priority',
+        'resolution__id', 'resolution__message', 'resolution__created_at',
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.format_datetime = _datetime_formatter()
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.columns)
+
+    def to_representation(self, row):
+        format_datetime = self.format_datetime
+        resolution = None
+        if row['resolution__id'] is not None:
+            resolution = {
+                'message': row['resolution__message'],
+                'created_at': format_datetime(row['resolution__created_at']),
+            }
+        return {
+            'user': row['user'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'email': row['email'],
+            'subject': row['subject'],
+            'description': row['description'],
+            'status': row['status'],
+            'created_at': format_datetime(row['created_at']),
+            'public_id': str(row['public_id']),
+            'assigned_to': row['assigned_to'],
+            'updated_at': format_datetime(row['updated_at']),
+            'resolution': resolution,
+            'priority': row['priority'],
+        }
+
+
+class TicketFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Ticket.STATUS_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Ticket.PRIORITY_CHOICES, required=False)
+    assigned_to = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError('At least one filter is required.')
+        return data
+
+
+class TicketExportSerializer(serializers.Serializer):
+    updated_since = serializers.DateTimeField(required=False)
+    updated_before = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if 'updated_since' in data and 'updated_before' in data and data['updated_since'] >= data['updated_before']:
+            raise serializers.ValidationError('updated_since must be earlier than updated_before.')
+        return data
+
+
+class TicketChangesSerializer(serializers.Serializer):
+    sync_token = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=2000)
+
+
+class BulkTransitionSerializer(serializers.Serializer):
+    public_ids = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+    filter = TicketFilterSerializer(required=False)
+    status = serializers.ChoiceField(choices=Ticket.STATUS_CHOICES)
+    resolution_message = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, data):
+        if ('public_ids' in data) == ('filter' in data):
+            raise serializers.ValidationError('Provide either public_ids or filter.')
+        if data['status'] == 'closed':
+            resolution_message = data.get('resolution_message')
+            if not resolution_message or not resolution_message.strip():
+                raise serializers.ValidationError({
+                    'resolution_message': 'Resolution message is required when closing a ticket.'
+                })
+        return data
+
+
 class CompanySerializer(serializers.ModelSerializer):
     owner = serializers.SerializerMethodField(read_only=True)
     class Meta:
         model = Company
-        fields = ['id', 'name', 'slug', 'email', 'phone', 'address', 'description', 'created_at', 'updated_at', 'owner']
+        fields = ['id', 'name', 'slug', 'email', 'phone', 'address', 'description', 'auto_assign', 'created_at', 'updated_at', 'owner']
         read_only_fields = ['id', 'created_at', 'updated_at', 'owner']
     
     def get_owner(self, obj):
-        owner = User.objects.filter(company=obj, role='owner').first()
+        # CompanyViewSet prefetches owners in bulk; single objects fall back to a query
+        if hasattr(obj, 'prefetched_owners'):
+            owner = obj.prefetched_owners[0] if obj.prefetched_owners else None
+        else:
+            owner = User.objects.filter(company=obj, role='owner').first()
         if owner:
             return {
                 'id': owner.id,
@@ -0,0 +1,117 @@
+from datetime import timedelta
+from uuid import UUID
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import TicketTombstone
+from .serializers import TicketListSerializer
+
+TOKEN_SALT = 'tickets.sync'
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'The sync token has expired or belongs to another view of the tickets, sync from scratch.'
+    default_code = 'resync'
+
+
+def caller_scope(user):
+    """What a caller sees of a company's tickets: all of them, or only those assigned to or raised by them."""
+    if user.is_superuser or user.role in ['owner', 'admin']:
+        return 'all'
+    return 'agent' if user.role == 'agent' else 'user'
+
+
+def tombstones_for(company_id, user):
+    tombstones = TicketTombstone.objects.filter(company_id=company_id)
+    scope = caller_scope(user)
+    if scope == 'all':
+        # staff still see tickets given to another agent
+        return tombstones.exclude(reason='unassigned')
+    if scope == 'agent':
+        return tombstones.filter(assigned_to=user.pk)
+    return tombstones.filter(user=user.pk).exclude(reason='unassigned')
+
+
+def encode_token(state):
+    return signing.dumps(state, salt=TOKEN_SALT, compress=True)
+
+
+def decode_token(token, company_id, user):
+    """The cursors of a sync token, raising when it's forged, expired or for another caller."""
+    try:
+        state = signing.loads(token, salt=TOKEN_SALT)
+        tickets, tombstones = state['t'], state['d']
+        tickets = tickets and (parse_datetime(tickets[0]), UUID(tickets[1]))
+        tombstones = (parse_datetime(tombstones[0]), tombstones[1])
+    except (signing.BadSignature, KeyError, IndexError, TypeError, ValueError):
+        raise ValidationError({'sync_token': 'Invalid sync token.'})
+    if (state.get('c'), state.get('u'), state.get('s')) != (company_id, user.pk, caller_scope(user)):
+        raise SyncTokenExpired()
+    # older tombstones may be pruned already
+    if tombstones[0] < timezone.now() - timedelta(days=settings.TICKET_SYNC_TOMBSTONE_DAYS):
+        raise SyncTokenExpired()
+    return tickets, tombstones
+
+
+def after(cursor, time_field, key_field):
+    moment, key = cursor
+    return Q(**{f'{time_field}__gt': moment}) | Q(**{time_field: moment, f'{key_field}__gt': key})
+
+
+def changes_since(tickets, company_id, user, token=None, page_size=500):
+    """
+    One page of the changes feed of ``tickets``, the caller's visible tickets.
+
+    Returns the rows changed since ``token`` in (updated_at, public_id) order,
+    tombstones of tickets the caller no longer sees, and the token of the
+    next call. Rows younger than TICKET_SYNC_SETTLE_SECONDS are left for the
+    next call, so a transaction committing after a read can't slip behind
+    a cursor that already moved past its timestamp.
+    """
+    settled = timezone.now() - timedelta(seconds=settings.TICKET_SYNC_SETTLE_SECONDS)
+    if token:
+        ticket_cursor, tombstone_cursor = decode_token(token, company_id, user)
+    else:
+        # a first sync gets every visible ticket, only later deletions matter
+        ticket_cursor, tombstone_cursor = None, (settled, 0)
+
+    changed = tickets.filter(updated_at__lte=settled)
+    if ticket_cursor is not None:
+        changed = changed.filter(after(ticket_cursor, 'updated_at', 'public_id'))
+    changed = list(TicketListSerializer.values(changed.order_by('updated_at', 'public_id'))[:page_size + 1])
+
+    gone = tombstones_for(company_id, user).filter(created_at__lte=settled).filter(
+        after(tombstone_cursor, 'created_at', 'id')
+    )
+    gone = list(gone.order_by('created_at', 'id').values('id', 'public_id', 'reason', 'created_at')[:page_size + 1])
+
+    has_more = len(changed) > page_size or len(gone) > page_size
+    changed, gone = changed[:page_size], gone[:page_size]
+    if changed:
+        ticket_cursor = (changed[-1]['updated_at'], changed[-1]['public_id'])
+    if gone:
+        tombstone_cursor = (gone[-1]['created_at'], gone[-1]['id'])
+        # a ticket reassigned back, or visible again, is not gone
+        visible = set(tickets.filter(public_id__in=[row['public_id'] for row in gone]).values_list('public_id', flat=True))
+        gone = [row for row in gone if row['public_id'] not in visible]
+
+    token = encode_token({
+        'c': company_id,
+        'u': user.pk,
+        's': caller_scope(user),
+        't': ticket_cursor and [ticket_cursor[0].isoformat(), str(ticket_cursor[1])],
+        'd': [tombstone_cursor[0].isoformat(), tombstone_cursor[1]],
+    })
+    return {
+        'changes': TicketListSerializer(changed, many=True).data,
+        'deleted': [{'public_id': str(row['public_id']), 'reason': row['reason']} for row in gone],
+        'sync_token': token,
+        'has_more': has_more,
+    }
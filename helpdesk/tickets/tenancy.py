@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.http import Http404
+
+from .models import Company
+
+# process-local entries can't be invalidated by other workers. Each company
+# change bumps a generation in the shared Django cache, the source of truth
+# between processes, and a worker checks it at most once per interval before
+# trusting its entries, so a renamed or deleted slug stops resolving within it
+LOCAL_CACHE_SIZE = getattr(settings, 'TENANT_LOCAL_CACHE_SIZE', 1024)
+LOCAL_CACHE_TTL = getattr(settings, 'TENANT_LOCAL_CACHE_TTL', 30)
+LOCAL_CACHE_CHECK_INTERVAL = getattr(settings, 'TENANT_LOCAL_CACHE_CHECK_INTERVAL', 1)
+SHARED_CACHE_TIMEOUT = getattr(settings, 'TENANT_CACHE_TIMEOUT', 60 * 60)
+GENERATION_KEY = 'tenant:generation'
+
+_local = OrderedDict()
+_lock = threading.Lock()
+# the shared generation the local entries belong to, and when it was last read
+_generation = [None, float('-inf')]
+
+
+def _cache_key(slug):
+    return f'tenant:company-id:{slug}'
+
+
+def _generation_due():
+    return time.monotonic() >= _generation[1] + LOCAL_CACHE_CHECK_INTERVAL
+
+
+def _apply_generation(generation):
+    with _lock:
+        if generation != _generation[0]:
+            _local.clear()
+            _generation[0] = generation
+        _generation[1] = time.monotonic()
+
+
+def _local_lookup(slug):
+    with _lock:
+        entry = _local.get(slug)
+        if entry is not None and entry[1] > time.monotonic():
+            _local.move_to_end(slug)
+            return entry[0]
+    return None
+
+
+def _remember(slug, company_id):
+    with _lock:
+        _local[slug] = (company_id, time.monotonic() + LOCAL_CACHE_TTL)
+        _local.move_to_end(slug)
+        while len(_local) > LOCAL_CACHE_SIZE:
+            _local.popitem(last=False)
+
+
+def resolve_company_id(slug):
+    """Return the id of the company with ``slug``, or None if there is none."""
+    if not slug:
+        return None
+    if _generation_due():
+        _apply_generation(cache.get(GENERATION_KEY))
+    company_id = _local_lookup(slug)
+    if company_id is not None:
+        return company_id
+
+    company_id = cache.get(_cache_key(slug))
+    if company_id is None:
+        company_id = Company.objects.filter(slug=slug).values_list('pk', flat=True).first()
+        if company_id is None:
+            return None
+        cache.set(_cache_key(slug), company_id, SHARED_CACHE_TIMEOUT)
+    _remember(slug, company_id)
+    return company_id
+
+
+async def aresolve_company_id(slug):
+    """Async ``resolve_company_id``, for async views and ASGI middleware."""
+    if not slug:
+        return None
+    if _generation_due():
+        _apply_generation(await cache.aget(GENERATION_KEY))
+    company_id = _local_lookup(slug)
+    if company_id is not None:
+        return company_id
+
+    company_id = await cache.aget(_cache_key(slug))
+    if company_id is None:
+        company_id = await Company.objects.filter(slug=slug).values_list('pk', flat=True).afirst()
+        if company_id is None:
+            return None
+        await cache.aset(_cache_key(slug), company_id, SHARED_CACHE_TIMEOUT)
+    _remember(slug, company_id)
+    return company_id
+
+
+def invalidate_company_slug(slug):
+    with _lock:
+        _local.pop(slug, None)
+    _invalidate_shared(slug)
+
+
+def _invalidate_shared(slug):
+    cache.delete(_cache_key(slug))
+    # other workers drop their local entries when they next read the generation
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def get_request_company_id(request, slug):
+    """
+    Resolve the tenant for ``slug`` once per request.
+
+    Raises Http404 when no company has that slug.
+    """
+    resolved = getattr(request, '_tenant', None)
+    if resolved is None or resolved[0] != slug:
+        resolved = (slug, resolve_company_id(slug))
+        request._tenant = resolved
+    if resolved[1] is None:
+        raise Http404('No Company matches the given query.')
+    return resolved[1]
+
+
+async def aget_request_company_id(request, slug):
+    resolved = getattr(request, '_tenant', None)
+    if resolved is None or resolved[0] != slug:
+        resolved = (slug, await aresolve_company_id(slug))
+        request._tenant = resolved
+    if resolved[1] is None:
+        raise Http404('No Company matches the given query.')
+    return resolved[1]
+
+
+class TenantMiddleware:
+    """Resolve the company of ``<slug>`` routes and expose it as ``request.tenant_id``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            # served over ASGI: resolve on the event loop, not in a worker thread
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slug = view_kwargs.get('slug')
+        request.tenant_id = resolve_company_id(slug) if slug else None
+        if slug:
+            request._tenant = (slug, request.tenant_id)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        slug = view_kwargs.get('slug')
+        request.tenant_id = await aresolve_company_id(slug) if slug else None
+        if slug:
+            request._tenant = (slug, request.tenant_id)
+
+
+@receiver(pre_save, sender=Company)
+def _remember_previous_slug(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_slug = Company.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+# invalidated once the change commits: before that, a concurrent request still
+# reads the old row and would cache it under the new generation
+@receiver(post_save, sender=Company)
+def _invalidate_saved_company(sender, instance, using, **kwargs):
+    slugs = {instance.slug, getattr(instance, '_previous_slug', None)} - {None}
+
+    def invalidate():
+        for slug in slugs:
+            invalidate_company_slug(slug)
+    transaction.on_commit(invalidate, using=using)
+
+
+@receiver(post_delete, sender=Company)
+def _invalidate_deleted_company(sender, instance, using, **kwargs):
+    slug = instance.slug
+    transaction.on_commit(lambda: invalidate_company_slug(slug), using=using)
@@ -1,3 +1,1535 @@
-from django.test import TestCase
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
+from uuid import UUID
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.utils import timezone
+from django.test import modify_settings, override_settings
+from django.urls import include, path
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase, APITransactionTestCase
+from .models import (
+    Ticket, Company, TicketResolution, TicketCounter, AgentLoad, TicketImport, ArchivedTicket, ArchivedTicketResolution,
+    TicketEvent, WebhookEndpoint, TicketTombstone
+)
+from .counters import rebuild_counters
+from .serializers import TicketSerializer, TicketListSerializer
+from .webhooks import WebhookDispatcher
+from . import tenancy
+from .tenancy import resolve_company_id
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.authentication import add_claims
+from helpdesk.middleware import histograms
+from helpdesk.replicas import PIN_COOKIE, read_from_replica
+from helpdesk.urls import urlpatterns as project_urlpatterns
+from .urls import async_urlpatterns
 
-# Create your tests here.
+User = get_user_model()
+
+# the project routes with the async ticket views in front, as ASYNC_TICKET_VIEWS sets them up
+urlpatterns = [path('api/', include(async_urlpatterns))] + project_urlpatterns
+
+
+class TicketPaginationTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(
+            username='owner', password='password123', company=self.company, role='owner'
+        )
+        # few distinct priorities so most rows tie on the first ordering field
+        Ticket.objects.bulk_create([
+            Ticket(company=self.company, subject=f'Ticket {i}', description='...', priority=i % 3)
+            for i in range(25)
+        ])
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/companies/{self.company.slug}/tickets/'
+
+    def walk(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_pages_cover_every_ticket_once_in_order(self):
+        tickets = self.walk(f'{self.url}?page_size=4')
+        self.assertEqual(len({ticket['public_id'] for ticket in tickets}), 25)
+        priorities = [ticket['priority'] for ticket in tickets]
+        self.assertEqual(priorities, sorted(priorities, reverse=True))
+
+    def test_ordering_param_is_respected(self):
+        tickets = self.walk(f'{self.url}?page_size=4&ordering=priority')
+        self.assertEqual(len(tickets), 25)
+        priorities = [ticket['priority'] for ticket in tickets]
+        self.assertEqual(priorities, sorted(priorities))
+
+    def test_previous_link_returns_the_prior_page(self):
+        first = self.client.get(f'{self.url}?page_size=4').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(
+            [ticket['public_id'] for ticket in back['results']],
+            [ticket['public_id'] for ticket in first['results']]
+        )
+
+    def test_deep_page_runs_no_count_or_offset(self):
+        url = self.client.get(f'{self.url}?page_size=10').data['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        # the only aggregate is the list's ETag validator, the page itself is a range query
+        page_queries = [query['sql'].upper() for query in queries.captured_queries if 'MAX(' not in query['sql'].upper()]
+        self.assertEqual(len(page_queries), 1)
+        self.assertNotIn('COUNT(', page_queries[0])
+        self.assertNotIn('OFFSET', page_queries[0])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(f'{self.url}?cursor=cD1nYXJiYWdl')
+        self.assertEqual(response.status_code, 404)
+
+
+class SeedCommandTests(APITestCase):
+    def test_seeding_again_with_the_same_seed_adds_new_data(self):
+        for _ in range(3):
+            call_command('seed', companies=2, users=6, tickets=20, seed=7, batch_size=8, stdout=io.StringIO())
+        self.assertEqual(Company.objects.count(), 6)
+        self.assertEqual(Ticket.objects.count(), 60)
+        self.assertEqual(TicketCounter.objects.aggregate(total=Sum('count'))['total'], 60)
+
+    def test_failed_run_leaves_nothing_behind(self):
+        users = User.objects.count()
+        with mock.patch('tickets.management.commands.seed.seed_ticket_batch', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                call_command('seed', companies=2, users=6, tickets=20, seed=7, stdout=io.StringIO())
+        self.assertFalse(Company.objects.exists())
+        self.assertEqual(User.objects.count(), users)
+
+
+class BenchmarkEndpointsTests(APITestCase):
+    def test_runs_again_on_kept_data(self):
+        call_command('seed', companies=1, users=4, tickets=10, seed=1, stdout=io.StringIO())
+        for _ in range(2):
+            output = io.StringIO()
+            call_command(
+                'benchmark_endpoints', companies=2, users=6, tickets=20, requests=2, keep=True,
+                stdout=output, stderr=io.StringIO()
+            )
+            self.assertEqual(json.loads(output.getvalue())['dataset']['tickets'], 20)
+        self.assertEqual(Company.objects.count(), 5)
+
+
+class BenchmarkTicketQueriesTests(APITransactionTestCase):
+    def test_refuses_without_flag_and_leaves_the_database_as_it_was(self):
+        company = Company.objects.create(name='Acme', email='acme@example.com')
+        Ticket.objects.create(company=company, subject='real', description='...')
+        indexes = set(connection.introspection.get_constraints(connection.cursor(), Ticket._meta.db_table))
+        with self.assertRaises(CommandError):
+            call_command('benchmark_ticket_queries', tickets=10, stdout=io.StringIO())
+
+        call_command(
+            'benchmark_ticket_queries', tickets=10, companies=2, agents=1, customers=2, repeat=1,
+            allow_destructive=True, stdout=io.StringIO()
+        )
+        self.assertEqual(list(Ticket.objects.values_list('subject', flat=True)), ['real'])
+        self.assertEqual(list(Company.objects.values_list('name', flat=True)), ['Acme'])
+        self.assertFalse(User.objects.filter(username__startswith='bench-').exists())
+        self.assertEqual(set(connection.introspection.get_constraints(connection.cursor(), Ticket._meta.db_table)), indexes)
+
+
+class TicketCounterMigrationTests(APITransactionTestCase):
+    before = [('tickets', '0004_ticket_search')]
+    after = [('tickets', '0005_ticketcounter')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_counts_existing_tickets(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        company = apps.get_model('tickets', 'Company').objects.create(name='Acme', email='acme@example.com')
+        agent = apps.get_model(settings.AUTH_USER_MODEL).objects.create(username='agent', company_id=company.pk, role='agent')
+        HistoricalTicket = apps.get_model('tickets', 'Ticket')
+        for status, assigned_to in [('open', None), ('open', None), ('in_progress', agent), ('closed', agent)]:
+            HistoricalTicket.objects.create(
+                company_id=company.pk, subject='s', description='d', status=status, priority=2, assigned_to=assigned_to
+            )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        counters = executor.loader.project_state(self.after).apps.get_model('tickets', 'TicketCounter')
+        self.assertEqual(
+            set(counters.objects.values_list('company_id', 'status', 'priority', 'assigned_to', 'count')),
+            {(company.pk, 'open', 2, 0, 2), (company.pk, 'in_progress', 2, agent.pk, 1), (company.pk, 'closed', 2, agent.pk, 1)}
+        )
+
+
+class TenantResolutionTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(
+            username='owner', password='password123', company=self.company, role='owner'
+        )
+        self.client.force_authenticate(self.owner)
+
+    def test_company_row_is_not_loaded_per_request(self):
+        url = f'/api/companies/{self.company.slug}/tickets/'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        company_table = Company._meta.db_table
+        self.assertFalse(any(company_table in query['sql'] for query in queries.captured_queries))
+
+    def test_renamed_slug_stops_resolving(self):
+        self.assertEqual(resolve_company_id('acme'), self.company.pk)
+        self.company.slug = 'acme-corp'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.company.save()
+        self.assertIsNone(resolve_company_id('acme'))
+        self.assertEqual(resolve_company_id('acme-corp'), self.company.pk)
+        response = self.client.get('/api/companies/acme/tickets/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_rename_is_invalidated_when_it_commits(self):
+        self.assertEqual(resolve_company_id('acme'), self.company.pk)
+        generation = cache.get(tenancy.GENERATION_KEY)
+        self.company.slug = 'acme-corp'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.company.save()
+            # other requests still read the old row, nothing may be invalidated yet
+            self.assertEqual(cache.get(tenancy.GENERATION_KEY), generation)
+            self.assertEqual(resolve_company_id('acme'), self.company.pk)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(cache.get(tenancy.GENERATION_KEY), generation)
+        self.assertIsNone(resolve_company_id('acme'))
+
+    def test_slug_renamed_by_another_worker_stops_resolving(self):
+        self.assertEqual(resolve_company_id('acme'), self.company.pk)
+        # the rename and its invalidation happen in another process, this one keeps its local entry
+        Company.objects.filter(pk=self.company.pk).update(slug='acme-corp')
+        tenancy._invalidate_shared('acme')
+        with mock.patch.object(tenancy, 'LOCAL_CACHE_CHECK_INTERVAL', 0):
+            self.assertIsNone(resolve_company_id('acme'))
+
+
+class CompanyListTests(APITestCase):
+    def test_listing_companies_runs_constant_queries(self):
+        companies = Company.objects.bulk_create([
+            Company(name=f'Company {i}', slug=f'company-{i}', email=f'company{i}@example.com')
+            for i in range(1000)
+        ])
+        User.objects.bulk_create([
+            User(username=f'owner-{company.pk}', company=company, role='owner')
+            for company in companies
+        ])
+        admin = User.objects.create_superuser(username='root', password='password123')
+        self.client.force_authenticate(admin)
+
+        # one query for the companies and one for their owners
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/companies/')
+        self.assertEqual(len(response.data), 1000)
+        self.assertTrue(all(company['owner'] for company in response.data))
+
+
+class TicketListSerializerTests(APITestCase):
+    def test_matches_ticket_serializer_output(self):
+        company = Company.objects.create(name='Acme', email='acme@example.com')
+        agent = User.objects.create_user(username='agent', company=company, role='agent')
+        closed = Ticket.objects.create(
+            company=company, subject='Closed', description='...', status='closed', assigned_to=agent
+        )
+        TicketResolution.objects.create(ticket=closed, message='Fixed')
+        Ticket.objects.create(company=company, subject='Open', description='...', user=agent)
+
+        queryset = Ticket.objects.filter(company=company).order_by('subject')
+        expected = TicketSerializer(queryset.select_related('resolution'), many=True).data
+        actual = TicketListSerializer(TicketListSerializer.values(queryset), many=True).data
+        self.assertEqual(json.dumps(actual), json.dumps(expected))
+
+
+class TicketBulkCreateTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.user = User.objects.create_user(username='integration', password='password123')
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/companies/{self.company.slug}/tickets/bulk/'
+
+    def test_creates_valid_items_and_reports_invalid_ones(self):
+        response = self.client.post(self.url, [
+            {'subject': 'Disk full', 'description': 'db-01 is at 98%'},
+            {'description': 'missing subject'},
+            {'subject': 'CPU high', 'description': 'api-03', 'priority': 3},
+        ], format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertIn('subject', response.data['results'][1]['errors'])
+        public_ids = [result['public_id'] for result in response.data['results'] if 'public_id' in result]
+        self.assertEqual(
+            set(Ticket.objects.filter(company=self.company, user=self.user).values_list('public_id', flat=True)),
+            {UUID(public_id) for public_id in public_ids}
+        )
+
+    def test_accepts_ndjson(self):
+        body = '{"subject": "a", "description": "1"}\n\n{"subject": "b", "description": "2"}\n'
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Ticket.objects.filter(company=self.company).count(), 2)
+
+
+class TicketBulkTransitionTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.admin = User.objects.create_user(username='admin', company=self.company, role='admin')
+        self.client.force_authenticate(self.admin)
+        self.url = f'/api/companies/{self.company.slug}/tickets/bulk_transition/'
+
+    def test_closing_requires_a_message(self):
+        ticket = Ticket.objects.create(company=self.company, subject='a', description='...')
+        response = self.client.post(self.url, {'public_ids': [str(ticket.public_id)], 'status': 'closed'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('resolution_message', response.data)
+
+    def test_bulk_close_skips_closed_tickets(self):
+        open_tickets = [
+            Ticket.objects.create(company=self.company, subject=str(i), description='...', priority=3)
+            for i in range(3)
+        ]
+        closed = Ticket.objects.create(company=self.company, subject='done', description='...', status='closed', priority=3)
+        TicketResolution.objects.create(ticket=closed, message='Original')
+
+        response = self.client.post(self.url, {
+            'filter': {'priority': 3},
+            'status': 'closed',
+            'resolution_message': 'Incident resolved'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 3)
+        for ticket in open_tickets:
+            ticket.refresh_from_db()
+            self.assertEqual((ticket.status, ticket.priority), ('closed', 0))
+            self.assertEqual(ticket.resolution.message, 'Incident resolved')
+        closed.refresh_from_db()
+        self.assertEqual(closed.resolution.message, 'Original')
+
+    def test_customers_cannot_transition(self):
+        customer = User.objects.create_user(username='customer')
+        self.client.force_authenticate(customer)
+        response = self.client.post(self.url, {'filter': {'status': 'open'}, 'status': 'in_progress'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class TicketCounterTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.customer = User.objects.create_user(username='customer')
+        self.url = f'/api/companies/{self.company.slug}/tickets/'
+
+    def counters(self):
+        return set(
+            TicketCounter.objects.filter(count__gt=0).values_list('status', 'priority', 'assigned_to', 'count')
+        )
+
+    def test_write_paths_keep_counters_exact(self):
+        self.client.force_authenticate(self.customer)
+        created = [
+            self.client.post(self.url, {'subject': str(i), 'description': '...', 'priority': 3}, format='json')
+            for i in range(4)
+        ]
+        self.client.post(f'{self.url}bulk/', [{'subject': 'bulk', 'description': '...'}] * 2, format='json')
+        public_ids = [response.data['public_id'] for response in created]
+
+        self.client.force_authenticate(self.owner)
+        self.client.patch(f'{self.url}{public_ids[0]}/assign_agent/', {'assigned_to': self.agent.pk}, format='json')
+        self.client.patch(f'{self.url}{public_ids[1]}/', {'priority': 2}, format='json')
+        self.client.patch(
+            f'{self.url}{public_ids[2]}/', {'status': 'closed', 'resolution_message': 'Done'}, format='json'
+        )
+        self.client.post(f'{self.url}bulk_transition/', {
+            'public_ids': public_ids[3:], 'status': 'in_progress'
+        }, format='json')
+        self.client.delete(f'{self.url}{public_ids[1]}/')
+
+        self.assertEqual(self.counters(), {
+            ('open', 1, 0, 2),
+            ('in_progress', 3, self.agent.pk, 1),
+            ('in_progress', 3, 0, 1),
+            ('closed', 0, 0, 1),
+        })
+        maintained = self.counters()
+        rebuild_counters()
+        self.assertEqual(self.counters(), maintained)
+
+    def test_deleting_an_agent_moves_counts_to_unassigned(self):
+        Ticket.objects.create(company=self.company, subject='a', description='...', assigned_to=self.agent)
+        rebuild_counters()
+        self.agent.delete()
+        self.assertEqual(self.counters(), {('open', 1, 0, 1)})
+
+    def test_stats_read_counters_only(self):
+        Ticket.objects.bulk_create([
+            Ticket(company=self.company, subject=str(i), description='...', status=status, assigned_to=self.agent)
+            for i, status in enumerate(['open', 'open', 'in_progress', 'closed'])
+        ])
+        rebuild_counters()
+        self.client.force_authenticate(self.agent)
+        url = f'/api/companies/{self.company.slug}/stats/'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('tickets_ticket"' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(response.data['total'], 4)
+        self.assertEqual(response.data['by_status'], {'open': 2, 'in_progress': 1, 'closed': 1})
+        self.assertEqual(response.data['by_priority'][1]['open'], 2)
+        self.assertEqual(response.data['by_agent'], [
+            {'assigned_to': self.agent.pk, 'open': 2, 'in_progress': 1, 'closed': 1}
+        ])
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.tickets = Ticket.objects.bulk_create([
+            Ticket(company=self.company, subject=str(i), description='...') for i in range(3)
+        ])
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/companies/{self.company.slug}/tickets/'
+
+    def test_list_revalidates_without_serializing(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(queries), 1)
+
+        # another page is another representation
+        self.assertEqual(self.client.get(f'{self.url}?page_size=1', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.client.patch(f'{self.url}{self.tickets[0].public_id}/', {'priority': 3}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # deleting an older ticket leaves MAX(updated_at) alone, the count still changes
+        self.client.delete(f'{self.url}{self.tickets[1].public_id}/')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_validators_follow_updated_at(self):
+        url = f'{self.url}{self.tickets[0].public_id}/'
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        self.client.patch(f'{url}assign_agent/', {'assigned_to': self.agent.pk}, format='json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_resolution_list_revalidates(self):
+        url = f'/api/companies/{self.company.slug}/ticket-resolution/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.patch(
+            f'{self.url}{self.tickets[2].public_id}/', {'status': 'closed', 'resolution_message': 'Done'}, format='json'
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AgentRoutingTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com', auto_assign=True)
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.agents = [
+            User.objects.create_user(username=f'agent{i}', company=self.company, role=role)
+            for i, role in enumerate(['agent', 'agent', 'admin'])
+        ]
+        self.customer = User.objects.create_user(username='customer')
+        self.client.force_authenticate(self.customer)
+        self.url = f'/api/companies/{self.company.slug}/tickets/'
+
+    def create(self, priority):
+        response = self.client.post(self.url, {'subject': 's', 'description': '...', 'priority': priority}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def loads(self):
+        return dict(AgentLoad.objects.values_list('agent_id', 'load'))
+
+    def test_new_tickets_go_to_the_least_loaded_agent(self):
+        first, second, third = self.agents
+        assigned = [self.create(priority)['assigned_to'] for priority in [3, 1, 1, 2]]
+        # loads go 4/0/0, 4/2/0, 4/2/2, then the tie on 2 goes to the lower id
+        self.assertEqual(assigned, [first.pk, second.pk, third.pk, second.pk])
+        self.assertEqual(self.loads(), {first.pk: 4, second.pk: 5, third.pk: 2})
+
+    def test_routed_tickets_are_assigned_like_assign_agent(self):
+        ticket = self.create(2)
+        self.assertEqual((ticket['status'], ticket['assigned_to']), ('in_progress', self.agents[0].pk))
+        self.assertEqual(
+            list(TicketEvent.objects.filter(ticket_id=ticket['public_id']).order_by('pk').values_list('event_type', flat=True)),
+            ['ticket.created', 'ticket.assigned']
+        )
+        self.assertEqual(
+            TicketCounter.objects.get(status='in_progress', assigned_to=self.agents[0].pk).count, 1
+        )
+
+    def test_closed_tickets_are_not_routed(self):
+        response = self.client.post(self.url, {'subject': 's', 'description': '...', 'status': 'closed'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data['assigned_to'])
+        self.assertEqual(set(self.loads().values()), {0})
+
+    def test_bulk_created_tickets_are_spread_over_agents(self):
+        first, second, third = self.agents
+        response = self.client.post(f'{self.url}bulk/', [
+            {'subject': 's', 'description': '...', 'priority': priority} for priority in [3, 1, 1, 2]
+        ] + [{'subject': 'done', 'description': '...', 'status': 'closed'}], format='json')
+        self.assertEqual(response.status_code, 201)
+        tickets = Ticket.objects.in_bulk([result['public_id'] for result in response.data['results']])
+        # the same spread as four single creates
+        self.assertEqual(
+            [(tickets[UUID(result['public_id'])].assigned_to_id, tickets[UUID(result['public_id'])].status)
+             for result in response.data['results'][:4]],
+            [(first.pk, 'in_progress'), (second.pk, 'in_progress'), (third.pk, 'in_progress'), (second.pk, 'in_progress')]
+        )
+        self.assertEqual(self.loads(), {first.pk: 4, second.pk: 5, third.pk: 2})
+        self.assertIsNone(Ticket.objects.get(subject='done').assigned_to_id)
+        self.assertEqual(TicketEvent.objects.filter(event_type='ticket.assigned').count(), 4)
+
+    def test_manual_companies_are_not_routed(self):
+        Company.objects.filter(pk=self.company.pk).update(auto_assign=False)
+        self.assertIsNone(self.create(3)['assigned_to'])
+
+    def test_loads_follow_ticket_and_role_changes(self):
+        first, second, third = self.agents
+        ticket = self.create(3)
+        self.client.force_authenticate(self.owner)
+        self.client.patch(f"{self.url}{ticket['public_id']}/assign_agent/", {'assigned_to': second.pk}, format='json')
+        self.assertEqual(self.loads(), {first.pk: 0, second.pk: 4, third.pk: 0})
+
+        self.client.patch(f"{self.url}{ticket['public_id']}/", {'status': 'closed', 'resolution_message': 'Done'}, format='json')
+        self.assertEqual(self.loads()[second.pk], 0)
+
+        Ticket.objects.create(company=self.company, subject='s', description='...', assigned_to=third, priority=2)
+        rebuild_counters()
+        self.assertEqual(self.loads(), {first.pk: 0, second.pk: 0, third.pk: 3})
+
+        # demoted users leave the pool, promoted ones join with their current load
+        third.role = 'customer'
+        third.save()
+        self.assertNotIn(third.pk, self.loads())
+        third.role = 'agent'
+        third.save()
+        self.assertEqual(self.loads()[third.pk], 3)
+
+
+class TicketClaimTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.client.force_authenticate(self.agent)
+        self.url = f'/api/companies/{self.company.slug}/tickets/claim/'
+
+    def test_claims_highest_priority_oldest_unassigned_first(self):
+        other = User.objects.create_user(username='other', company=self.company, role='agent')
+        old_low, old_high, new_high, _, _ = Ticket.objects.bulk_create([
+            Ticket(company=self.company, subject='old low', description='...', priority=1),
+            Ticket(company=self.company, subject='old high', description='...', priority=3),
+            Ticket(company=self.company, subject='new high', description='...', priority=3),
+            Ticket(company=self.company, subject='taken', description='...', priority=3, assigned_to=other),
+            Ticket(company=self.company, subject='closed', description='...', priority=3, status='closed'),
+        ])
+        rebuild_counters()
+
+        claimed = [self.client.post(self.url).data['public_id'] for _ in range(3)]
+        self.assertEqual(claimed, [str(old_high.public_id), str(new_high.public_id), str(old_low.public_id)])
+        self.assertEqual(self.client.post(self.url).status_code, 204)
+
+        old_high.refresh_from_db()
+        self.assertEqual((old_high.status, old_high.assigned_to_id), ('in_progress', self.agent.pk))
+        maintained = set(TicketCounter.objects.filter(count__gt=0).values_list('status', 'priority', 'assigned_to', 'count'))
+        rebuild_counters()
+        self.assertEqual(
+            set(TicketCounter.objects.filter(count__gt=0).values_list('status', 'priority', 'assigned_to', 'count')),
+            maintained
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', 'the fallback is chosen by the SQLite version')
+    def test_sqlite_without_update_returning_claims_with_the_fallback(self):
+        ticket = Ticket.objects.create(company=self.company, subject='a', description='...')
+        rebuild_counters()
+        with mock.patch.object(connection.Database, 'sqlite_version_info', (3, 34, 1)):
+            with CaptureQueriesContext(connection) as queries:
+                claimed = self.client.post(self.url).data['public_id']
+        self.assertEqual(claimed, str(ticket.public_id))
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].lstrip().startswith('UPDATE')]
+        self.assertFalse([sql for sql in updates if 'RETURNING' in sql])
+        ticket.refresh_from_db()
+        self.assertEqual((ticket.status, ticket.assigned_to_id), ('in_progress', self.agent.pk))
+
+    def test_claim_writes_values_like_the_orm(self):
+        ticket = Ticket.objects.create(company=self.company, subject='a', description='...')
+        claimed = self.client.post(self.url).data['public_id']
+        self.assertEqual(claimed, str(ticket.public_id))
+        event = TicketEvent.objects.get(event_type='ticket.assigned')
+        self.assertEqual(event.payload['public_id'], str(ticket.public_id))
+        self.assertEqual(event.ticket_id, ticket.public_id)
+
+        # same stored format as the rows the ORM writes
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT CAST(updated_at AS TEXT) FROM tickets_ticket')
+            claimed_at, = cursor.fetchone()
+        Ticket.objects.create(company=self.company, subject='c', description='...')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT CAST(updated_at AS TEXT) FROM tickets_ticket WHERE subject = %s', ['c'])
+            saved_at, = cursor.fetchone()
+        self.assertEqual(len(claimed_at), len(saved_at))
+
+    def test_only_company_staff_can_claim(self):
+        Ticket.objects.create(company=self.company, subject='a', description='...')
+        self.client.force_authenticate(User.objects.create_user(username='customer'))
+        self.assertEqual(self.client.post(self.url).status_code, 403)
+        self.client.force_authenticate(User.objects.create_superuser(username='root', password='password123'))
+        self.assertEqual(self.client.post(self.url).status_code, 403)
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'helpdesk.middleware.PerformanceMiddleware'})
+class PerformanceMiddlewareTests(APITestCase):
+    def setUp(self):
+        histograms.reset()
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.admin = User.objects.create_superuser(username='root', password='password123')
+        self.client.force_authenticate(self.admin)
+
+    def test_server_timing_and_route_histograms(self):
+        response = self.client.get(f'/api/companies/{self.company.slug}/tickets/')
+        timings = response['Server-Timing']
+        for entry in ['db;dur=', 'serialize;dur=', 'view;dur=', 'render;dur=', 'total;dur=']:
+            self.assertIn(entry, timings)
+
+        stats = self.client.get('/api/performance/').data
+        routes = [route for route in stats['routes'] if 'tickets' in route]
+        self.assertEqual(len(routes), 1)
+        self.assertEqual(stats['routes'][routes[0]]['count'], 1)
+
+    def test_stats_are_admin_only(self):
+        self.client.force_authenticate(User.objects.create_user(username='owner', role='owner'))
+        self.assertEqual(self.client.get('/api/performance/').status_code, 403)
+
+
+class TicketSearchTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.printer = Ticket.objects.create(
+            company=self.company, subject='Printer jammed', description='Paper stuck in tray', assigned_to=self.agent
+        )
+        self.mention = Ticket.objects.create(
+            company=self.company, subject='Office move', description='Also take the printer', assigned_to=self.agent
+        )
+        # not assigned to the agent, so outside their visibility
+        Ticket.objects.create(company=self.company, subject='Printer offline', description='...')
+        self.url = f'/api/companies/{self.company.slug}/tickets/search/'
+
+    def test_ranks_subject_matches_first_within_visibility(self):
+        self.client.force_authenticate(self.agent)
+        response = self.client.get(self.url, {'q': 'printer'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [ticket['public_id'] for ticket in response.data['results']],
+            [str(self.printer.public_id), str(self.mention.public_id)]
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', 'the FTS5 index is SQLite only')
+    def test_index_survives_renumbered_ticket_rowids(self):
+        # what VACUUM and the table rebuilds of migrations may do to the implicit rowid
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE tickets_ticket SET rowid = rowid + 1000')
+        self.client.force_authenticate(self.agent)
+        response = self.client.get(self.url, {'q': 'paper'})
+        self.assertEqual([ticket['public_id'] for ticket in response.data['results']], [str(self.printer.public_id)])
+
+    @skipUnless(connection.vendor == 'sqlite', 'the FTS5 index is SQLite only')
+    def test_rebuild_command_checks_and_repairs_the_index(self):
+        call_command('rebuild_ticket_search', check=True, stdout=io.StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM tickets_ticket_fts_key WHERE public_id = %s', [self.printer.public_id.hex])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ticket_search', check=True, stdout=io.StringIO())
+        call_command('rebuild_ticket_search', stdout=io.StringIO())
+        call_command('rebuild_ticket_search', check=True, stdout=io.StringIO())
+        self.client.force_authenticate(self.agent)
+        response = self.client.get(self.url, {'q': 'paper'})
+        self.assertEqual([ticket['public_id'] for ticket in response.data['results']], [str(self.printer.public_id)])
+
+    def test_index_follows_updates(self):
+        self.printer.subject = 'Scanner jammed'
+        self.printer.save()
+        admin = User.objects.create_user(username='admin', company=self.company, role='admin')
+        self.client.force_authenticate(admin)
+        response = self.client.get(self.url, {'q': 'scanner'})
+        self.assertEqual([ticket['subject'] for ticket in response.data['results']], ['Scanner jammed'])
+
+    def test_query_is_required(self):
+        self.client.force_authenticate(self.agent)
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+    def test_pages_through_equal_ranks(self):
+        Ticket.objects.bulk_create([
+            Ticket(company=self.company, subject='Printer jammed', description='Paper stuck in tray', assigned_to=self.agent)
+            for _ in range(6)
+        ])
+        self.client.force_authenticate(self.agent)
+        seen = []
+        response = self.client.get(self.url, {'q': 'printer', 'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(ticket['public_id'] for ticket in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(len(set(seen)), 8)
+        self.assertEqual(seen[-1], str(self.mention.public_id))
+
+
+class TicketExportTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.tickets = Ticket.objects.bulk_create([
+            Ticket(company=self.company, subject=f'Ticket {i}', description='a, "quoted"\nline', priority=i % 4)
+            for i in range(5)
+        ])
+        TicketResolution.objects.create(ticket=self.tickets[0], message='Fixed')
+        self.url = f'/api/companies/{self.company.slug}/tickets/export/'
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_matches_the_ticket_serializer(self):
+        self.client.force_authenticate(self.owner)
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        records = {record['public_id']: record for record in map(json.loads, content.splitlines())}
+        self.assertEqual(len(records), 5)
+        ticket = Ticket.objects.select_related('resolution').get(pk=self.tickets[0].pk)
+        self.assertEqual(records[str(ticket.public_id)], json.loads(json.dumps(TicketSerializer(ticket).data)))
+
+    def test_csv_flattens_resolutions(self):
+        self.client.force_authenticate(self.owner)
+        response, content = self.export(format='csv')
+        self.assertIn('attachment; filename="acme-tickets.csv"', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 5)
+        row = next(row for row in rows if row['public_id'] == str(self.tickets[0].public_id))
+        self.assertEqual((row['description'], row['resolution_message']), ('a, "quoted"\nline', 'Fixed'))
+
+    def test_visibility_and_updated_range(self):
+        Ticket.objects.filter(pk=self.tickets[1].pk).update(assigned_to=self.agent)
+        self.client.force_authenticate(self.agent)
+        _, content = self.export()
+        self.assertEqual([json.loads(line)['public_id'] for line in content.splitlines()], [str(self.tickets[1].public_id)])
+
+        self.client.force_authenticate(self.owner)
+        cutoff = timezone.now()
+        Ticket.objects.filter(pk=self.tickets[2].pk).update(updated_at=cutoff + timedelta(hours=1))
+        _, content = self.export(updated_since=cutoff.isoformat())
+        self.assertEqual([json.loads(line)['public_id'] for line in content.splitlines()], [str(self.tickets[2].public_id)])
+        _, content = self.export(updated_before=cutoff.isoformat())
+        self.assertEqual(len(content.splitlines()), 4)
+
+        response = self.client.get(self.url, {'updated_since': cutoff.isoformat(), 'updated_before': cutoff.isoformat()})
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class ImportTicketsTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.agent = User.objects.create_user(
+            username='agent', email='agent@acme.com', company=self.company, role='agent'
+        )
+        self.customer = User.objects.create_user(username='customer', email='Customer@example.com')
+        self.rows = [
+            {
+                'subject': 'Printer jammed', 'description': 'Tray 2', 'status': 'closed', 'priority': '3',
+                'user_email': 'customer@example.com', 'assigned_to_email': 'agent@acme.com',
+                'created_at': '2019-05-01T10:00:00Z', 'updated_at': '2019-05-02T10:00:00Z',
+                'resolution_message': 'Cleared the tray',
+            },
+            {'subject': 'VPN down', 'description': 'tab\there, "quoted"', 'first_name': 'Ann', 'email': 'ann@example.com'},
+            {'subject': 'Laptop', 'description': '...', 'status': 'in_progress', 'assigned_to_email': 'agent@acme.com'},
+        ]
+
+    def write(self, rows, name='tickets.csv'):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w', newline='') as output:
+            writer = csv.DictWriter(output, fieldnames=sorted({key for row in rows for key in row}))
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def run_import(self, path, **options):
+        output = io.StringIO()
+        call_command('import_tickets', path, company=self.company.slug, stdout=output, **options)
+        return output.getvalue()
+
+    def test_imports_tickets_resolutions_and_history(self):
+        self.run_import(self.write(self.rows))
+        printer = Ticket.objects.select_related('resolution').get(subject='Printer jammed')
+        self.assertEqual((printer.user_id, printer.assigned_to_id, printer.priority), (self.customer.pk, self.agent.pk, 0))
+        self.assertEqual(printer.created_at.isoformat(), '2019-05-01T10:00:00+00:00')
+        self.assertGreater(printer.updated_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(printer.resolution.message, 'Cleared the tray')
+        self.assertEqual(printer.resolution.created_at.isoformat(), '2019-05-02T10:00:00+00:00')
+        self.assertEqual(Ticket.objects.get(subject='VPN down').description, 'tab\there, "quoted"')
+
+        # counters and agent loads reflect the imported rows
+        self.assertEqual(
+            set(TicketCounter.objects.filter(count__gt=0).values_list('status', 'assigned_to', 'count')),
+            {('closed', self.agent.pk, 1), ('open', 0, 1), ('in_progress', self.agent.pk, 1)}
+        )
+        self.assertEqual(AgentLoad.objects.get(agent=self.agent).load, 2)
+
+    @override_settings(TICKET_SYNC_SETTLE_SECONDS=0)
+    def test_changes_feed_and_webhooks_see_imported_tickets(self):
+        owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.client.force_authenticate(owner)
+        url = f'/api/companies/{self.company.slug}/tickets/changes/'
+        Ticket.objects.create(company=self.company, subject='Existing', description='...')
+        token = self.client.get(url).data['sync_token']
+
+        self.run_import(self.write(self.rows))
+        data = self.client.get(url, {'sync_token': token}).data
+        self.assertEqual(
+            sorted(ticket['subject'] for ticket in data['changes']), ['Laptop', 'Printer jammed', 'VPN down']
+        )
+        events = TicketEvent.objects.filter(event_type='ticket.created')
+        self.assertEqual(
+            sorted((event.payload['status'], event.payload['imported']) for event in events),
+            [('closed', True), ('in_progress', True), ('open', True)]
+        )
+        self.assertEqual(
+            set(events.values_list('ticket_id', flat=True)),
+            set(Ticket.objects.exclude(subject='Existing').values_list('public_id', flat=True))
+        )
+
+    def test_no_events_imports_without_webhook_events(self):
+        self.run_import(self.write(self.rows), events=False)
+        self.assertEqual(Ticket.objects.count(), 3)
+        self.assertFalse(TicketEvent.objects.exists())
+
+    def test_dry_run_reports_invalid_rows_without_writing(self):
+        rows = self.rows + [
+            {'subject': 'x', 'description': '...', 'status': 'closed'},
+            {'subject': 'x', 'description': '...', 'assigned_to_email': 'customer@example.com'},
+            {'subject': 'x', 'description': '...', 'priority': '9'},
+        ]
+        output = self.run_import(self.write(rows), dry_run=True)
+        self.assertIn('Row 4: resolution_message is required for closed tickets.', output)
+        self.assertIn("Row 5: assigned_to_email 'customer@example.com' does not belong to the company.", output)
+        self.assertIn('Row 6: priority', output)
+        self.assertIn('3 valid, 3 invalid', output)
+        self.assertFalse(Ticket.objects.exists())
+        self.assertFalse(TicketImport.objects.exists())
+
+    def test_resumes_from_the_last_committed_batch(self):
+        rows = self.rows + [{'subject': 'Broken', 'description': ''}, {'subject': 'Last', 'description': '...'}]
+        path = self.write(rows)
+        with self.assertRaises(CommandError):
+            self.run_import(path, batch_size=2)
+        self.assertEqual(Ticket.objects.count(), 2)
+        self.assertEqual(TicketImport.objects.get().rows_read, 2)
+
+        rows[3]['description'] = 'fixed'
+        path = self.write(rows)
+        output = self.run_import(path, batch_size=2)
+        self.assertIn('Resuming tickets.csv after row 2.', output)
+        self.assertEqual(Ticket.objects.count(), 5)
+        self.assertEqual(TicketCounter.objects.aggregate(total=Sum('count'))['total'], 5)
+        with self.assertRaises(CommandError):
+            self.run_import(path)
+
+        # given public_ids must be new
+        taken = str(Ticket.objects.first().public_id)
+        output = self.run_import(self.write([{'public_id': taken, 'subject': 'a', 'description': '...'}], 'again.csv'), dry_run=True)
+        self.assertIn(f'Row 1: public_id {taken} already exists.', output)
+
+
+    def test_public_id_lookups_stay_within_the_parameter_limit(self):
+        taken = Ticket.objects.create(company=self.company, subject='Existing', description='...').public_id
+        public_ids = [str(uuid.uuid4()) for _ in range(4)] + [str(taken)]
+        rows = [{'public_id': public_id, 'subject': 's', 'description': '...'} for public_id in public_ids]
+        with mock.patch.object(connection.features, 'max_query_params', 2):
+            with CaptureQueriesContext(connection) as queries:
+                output = self.run_import(self.write(rows), dry_run=True)
+        self.assertIn(f'Row 5: public_id {taken} already exists.', output)
+        lookups = [query['sql'] for query in queries.captured_queries if '."public_id" IN (' in query['sql']]
+        # three chunks of at most two ids, against the hot and the archived tickets
+        self.assertEqual(len(lookups), 6)
+
+
+class ArchiveTicketsTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.customer = User.objects.create_user(username='customer')
+        self.tickets = Ticket.objects.bulk_create([
+            Ticket(
+                company=self.company, subject=str(i), description='...', status='closed', priority=0,
+                user=self.customer if i % 2 else None
+            )
+            for i in range(6)
+        ] + [Ticket(company=self.company, subject='open', description='...')])
+        TicketResolution.objects.bulk_create([
+            TicketResolution(ticket=ticket, message=f'fixed {ticket.subject}') for ticket in self.tickets[:6]
+        ])
+        # four closed tickets are a year old
+        old = [ticket.pk for ticket in self.tickets[:4]]
+        Ticket.objects.filter(pk__in=old).update(updated_at=timezone.now() - timedelta(days=365))
+        Ticket.objects.filter(pk=self.tickets[6].pk).update(updated_at=timezone.now() - timedelta(days=365))
+        rebuild_counters()
+        self.url = f'/api/companies/{self.company.slug}/ticket-resolution/'
+
+    def archive(self, **options):
+        output = io.StringIO()
+        call_command('archive_tickets', older_than=30, stdout=output, **options)
+        return output.getvalue()
+
+    def test_moves_old_closed_tickets_in_batches(self):
+        counters = list(TicketCounter.objects.values_list('status', 'priority', 'count'))
+        self.assertIn('4 closed tickets', self.archive(dry_run=True))
+        self.assertEqual(ArchivedTicket.objects.count(), 0)
+
+        updated_at = Ticket.objects.get(subject='1').updated_at
+        self.archive(batch_size=3)
+        self.assertEqual(
+            set(ArchivedTicket.objects.values_list('subject', flat=True)), {'0', '1', '2', '3'}
+        )
+        self.assertEqual(set(Ticket.objects.values_list('subject', flat=True)), {'4', '5', 'open'})
+        self.assertEqual(
+            ArchivedTicketResolution.objects.get(ticket__subject='1').message, 'fixed 1'
+        )
+        self.assertEqual(TicketResolution.objects.count(), 2)
+        archived = ArchivedTicket.objects.get(subject='1')
+        self.assertEqual((archived.user_id, archived.updated_at), (self.customer.pk, updated_at))
+
+        # counters keep counting archived tickets, also once rebuilt
+        self.assertEqual(list(TicketCounter.objects.values_list('status', 'priority', 'count')), counters)
+        rebuild_counters()
+        self.assertEqual(
+            sorted(TicketCounter.objects.values_list('status', 'priority', 'count')), sorted(counters)
+        )
+        self.assertIn('Archived 0', self.archive())
+
+    def test_resolutions_read_hot_and_archived_tickets(self):
+        self.archive()
+        self.client.force_authenticate(self.owner)
+        seen, url = [], f'{self.url}?page_size=4'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.data['results'])
+            url = response.data['next']
+        expected = sorted(self.tickets[:6], key=lambda ticket: (ticket.created_at, ticket.public_id))
+        self.assertEqual([ticket['public_id'] for ticket in seen], [str(ticket.public_id) for ticket in expected])
+        self.assertEqual(seen[0]['resolution']['message'], f'fixed {expected[0].subject}')
+
+        response = self.client.get(f'{self.url}{self.tickets[1].public_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['subject'], response.data['resolution']['message']), ('1', 'fixed 1'))
+        self.assertEqual(self.client.get(f'{self.url}not-a-uuid/').status_code, 404)
+
+        # customers see their own, hot and archived
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(self.url)
+        self.assertEqual(sorted(ticket['subject'] for ticket in response.data['results']), ['1', '3', '5'])
+        self.assertEqual(self.client.get(f'{self.url}{self.tickets[0].public_id}/').status_code, 404)
+
+    def test_public_lookup_finds_archived_tickets(self):
+        self.archive()
+        url = f'/api/companies/{self.company.slug}/tickets/'
+        for urlconf in ('helpdesk.urls', 'tickets.tests'):
+            with self.settings(ROOT_URLCONF=urlconf):
+                response = self.client.get(url, {'public_id': str(self.tickets[2].public_id)})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([ticket['subject'] for ticket in response.data['results']], ['2'])
+                self.assertEqual(response.data['results'][0]['resolution']['message'], 'fixed 2')
+                response = self.client.get(url, {'public_id': str(self.tickets[4].public_id)})
+                self.assertEqual([ticket['subject'] for ticket in response.data['results']], ['4'])
+
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    # keep-alive, so tests can count connections
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, self.headers, body))
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class WebhookOutboxTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.url = f'/api/companies/{self.company.slug}/tickets/'
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubWebhookHandler)
+        self.server.requests, self.server.statuses, self.server.connections = [], [], 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.stub_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def events(self):
+        return list(TicketEvent.objects.order_by('id').values_list('event_type', 'payload'))
+
+    def dispatch(self, **options):
+        output = io.StringIO()
+        call_command('dispatch_webhooks', once=True, retry_backoff=0, stdout=output, **options)
+        return json.loads(output.getvalue().splitlines()[-1])
+
+    def test_prune_deletes_old_delivered_and_given_up_events(self):
+        old = timezone.now() - timedelta(days=30)
+        ticket_id = UUID(int=1)
+        events = TicketEvent.objects.bulk_create([
+            TicketEvent(company=self.company, ticket_id=ticket_id, event_type='ticket.created', delivered_at=old),
+            TicketEvent(company=self.company, ticket_id=ticket_id, event_type='ticket.created', delivered_at=timezone.now()),
+            TicketEvent(company=self.company, ticket_id=ticket_id, event_type='ticket.created', attempts=10),
+            TicketEvent(company=self.company, ticket_id=ticket_id, event_type='ticket.created', attempts=3),
+        ])
+        # auto_now_add ignores the given created_at
+        TicketEvent.objects.filter(pk__in=[events[2].pk, events[3].pk]).update(created_at=old)
+        output = io.StringIO()
+        call_command('prune_ticket_events', batch_size=1, stdout=output)
+        self.assertIn('Deleted 1 delivered and 1 given up events', output.getvalue())
+        # recent deliveries and events still being retried stay
+        self.assertEqual(set(TicketEvent.objects.values_list('pk', flat=True)), {events[1].pk, events[3].pk})
+
+    def test_write_paths_append_events(self):
+        self.client.force_authenticate(self.owner)
+        public_id = self.client.post(self.url, {'subject': 'a', 'description': '...'}, format='json').data['public_id']
+        self.client.patch(f'{self.url}{public_id}/assign_agent/', {'assigned_to': self.agent.pk}, format='json')
+        # a rejected change appends nothing
+        self.assertEqual(self.client.patch(f'{self.url}{public_id}/', {'status': 'closed'}, format='json').status_code, 400)
+        self.client.patch(f'{self.url}{public_id}/', {'status': 'closed', 'resolution_message': 'done'}, format='json')
+        self.assertEqual(self.events(), [
+            ('ticket.created', {'public_id': public_id, 'status': 'open', 'priority': 1, 'assigned_to': None}),
+            ('ticket.assigned', {'public_id': public_id, 'status': 'in_progress', 'priority': 1, 'assigned_to': self.agent.pk}),
+            ('ticket.closed', {
+                'public_id': public_id, 'status': 'closed', 'priority': 0, 'assigned_to': self.agent.pk,
+                'resolution_message': 'done'
+            }),
+        ])
+
+        TicketEvent.objects.all().delete()
+        self.client.post(f'{self.url}bulk/', [{'subject': 'b', 'description': '...'}] * 2, format='json')
+        self.client.force_authenticate(self.agent)
+        claimed = self.client.post(f'{self.url}claim/').data['public_id']
+        self.client.post(
+            f'{self.url}bulk_transition/',
+            {'public_ids': [claimed], 'status': 'closed', 'resolution_message': 'bulk'},
+            format='json'
+        )
+        self.assertEqual([event_type for event_type, _ in self.events()], [
+            'ticket.created', 'ticket.created', 'ticket.assigned', 'ticket.closed'
+        ])
+        self.assertEqual(self.events()[-1][1]['resolution_message'], 'bulk')
+
+    def test_batches_per_endpoint_over_keep_alive_connections(self):
+        WebhookEndpoint.objects.create(company=self.company, url=f'{self.stub_url}/all')
+        WebhookEndpoint.objects.create(
+            company=self.company, url=f'{self.stub_url}/closed', secret='s3cret', event_types=['ticket.closed']
+        )
+        tickets = Ticket.objects.bulk_create([
+            Ticket(company=self.company, subject=str(i), description='...') for i in range(5)
+        ])
+        TicketEvent.objects.bulk_create(
+            [TicketEvent(company=self.company, ticket_id=ticket.pk, event_type='ticket.created') for ticket in tickets]
+            + [TicketEvent(company=self.company, ticket_id=tickets[0].pk, event_type='ticket.closed')]
+        )
+
+        report = self.dispatch(endpoint_batch_size=2)
+        self.assertEqual((report['delivered'], report['failed'], report['pending']), (6, 0, 0))
+        self.assertFalse(TicketEvent.objects.filter(delivered_at__isnull=True).exists())
+
+        requests = {path: [] for path in ('/all', '/closed')}
+        for path, headers, body in self.server.requests:
+            requests[path].append((headers, body))
+        self.assertEqual([len(json.loads(body)['events']) for _, body in requests['/all']], [2, 2, 2])
+        self.assertEqual(len(requests['/closed']), 1)
+        headers, body = requests['/closed'][0]
+        self.assertEqual(
+            (json.loads(body)['company'], [event['type'] for event in json.loads(body)['events']]),
+            (self.company.slug, ['ticket.closed'])
+        )
+        signature = hmac.new(b's3cret', body, hashlib.sha256).hexdigest()
+        self.assertEqual(headers['X-Helpdesk-Signature'], f'sha256={signature}')
+        # one connection per endpoint, reused across its requests
+        self.assertEqual(self.server.connections, 2)
+
+    def test_failed_deliveries_are_retried_with_backoff(self):
+        WebhookEndpoint.objects.create(company=self.company, url=f'{self.stub_url}/hook')
+        event = TicketEvent.objects.create(
+            company=self.company, ticket_id=Ticket.objects.create(company=self.company, subject='a', description='...').pk,
+            event_type='ticket.created'
+        )
+        self.server.statuses = [500, 503]
+        report = self.dispatch(tries=2)
+        self.assertEqual((report['delivered'], report['failed'], report['pending']), (0, 1, 1))
+        event.refresh_from_db()
+        self.assertEqual((event.attempts, event.delivered_at), (1, None))
+        self.assertIn('HTTP 503', event.last_error)
+        self.assertGreater(event.next_attempt_at, timezone.now())
+
+        # client errors are not retried within a round
+        TicketEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now())
+        self.server.statuses = [400]
+        self.assertEqual(self.dispatch(tries=2)['failed'], 1)
+        self.assertEqual(len(self.server.requests), 3)
+
+        TicketEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.dispatch()['delivered'], 1)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertIsNotNone(event.delivered_at)
+
+    def test_events_without_endpoints_are_settled(self):
+        TicketEvent.objects.create(company=self.company, ticket_id=Ticket.objects.create(
+            company=self.company, subject='a', description='...'
+        ).pk, event_type='ticket.created')
+        dispatcher = WebhookDispatcher()
+        self.addCleanup(dispatcher.close)
+        self.assertEqual(dispatcher.run_once()[:2], (1, 0))
+        self.assertEqual(dispatcher.run_once(), (0, 0, []))
+
+
+@override_settings(TICKET_SYNC_SETTLE_SECONDS=0)
+class TicketChangesTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.other = User.objects.create_user(username='other', company=self.company, role='agent')
+        self.tickets = Ticket.objects.bulk_create([
+            Ticket(company=self.company, subject=str(i), description='...', assigned_to=self.agent if i < 3 else None)
+            for i in range(5)
+        ])
+        self.url = f'/api/companies/{self.company.slug}/tickets/changes/'
+
+    def sync(self, token=None, **params):
+        if token:
+            params['sync_token'] = token
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def sync_all(self, token=None, **params):
+        changes, deleted = [], []
+        while True:
+            data = self.sync(token, **params)
+            changes.extend(ticket['subject'] for ticket in data['changes'])
+            deleted.extend((row['public_id'], row['reason']) for row in data['deleted'])
+            token = data['sync_token']
+            if not data['has_more']:
+                return changes, deleted, token
+
+    def test_pages_through_changes_then_only_new_ones(self):
+        self.client.force_authenticate(self.owner)
+        changes, deleted, token = self.sync_all(page_size=2)
+        self.assertEqual(sorted(changes), ['0', '1', '2', '3', '4'])
+        self.assertEqual(self.sync(token)['changes'], [])
+
+        ticket = self.tickets[3]
+        self.client.patch(f'/api/companies/{self.company.slug}/tickets/{ticket.public_id}/', {'priority': 3}, format='json')
+        self.client.delete(f'/api/companies/{self.company.slug}/tickets/{self.tickets[4].public_id}/')
+        changes, deleted, token = self.sync_all(token)
+        self.assertEqual(changes, ['3'])
+        self.assertEqual(deleted, [(str(self.tickets[4].public_id), 'deleted')])
+        self.assertEqual(self.sync_all(token)[:2], ([], []))
+
+    def test_reassigned_tickets_leave_the_agents_feed(self):
+        self.client.force_authenticate(self.agent)
+        changes, _, agent_token = self.sync_all()
+        self.assertEqual(sorted(changes), ['0', '1', '2'])
+        self.client.force_authenticate(self.owner)
+        owner_token = self.sync_all()[2]
+
+        url = f'/api/companies/{self.company.slug}/tickets/{self.tickets[0].public_id}/assign_agent/'
+        self.client.patch(url, {'assigned_to': self.other.pk}, format='json')
+        # staff still see it, as a change
+        self.assertEqual(self.sync_all(owner_token)[:2], (['0'], []))
+        self.client.force_authenticate(self.agent)
+        changes, deleted, agent_token = self.sync_all(agent_token)
+        self.assertEqual((changes, deleted), ([], [(str(self.tickets[0].public_id), 'unassigned')]))
+
+        # given back, it's a change again and not gone
+        self.client.force_authenticate(self.owner)
+        self.client.patch(url, {'assigned_to': self.agent.pk}, format='json')
+        self.client.force_authenticate(self.agent)
+        self.assertEqual(self.sync_all(agent_token)[:2], (['0'], []))
+
+    def test_fresh_rows_wait_for_the_settle_window(self):
+        self.client.force_authenticate(self.owner)
+        with self.settings(TICKET_SYNC_SETTLE_SECONDS=60):
+            data = self.sync()
+        self.assertEqual(data['changes'], [])
+        self.assertEqual(len(self.sync(data['sync_token'])['changes']), 5)
+
+    def test_rejects_foreign_and_forged_tokens(self):
+        self.client.force_authenticate(self.owner)
+        token = self.sync()['sync_token']
+        self.assertEqual(self.client.get(self.url, {'sync_token': token[:-2]}).status_code, 400)
+        self.client.force_authenticate(self.agent)
+        self.assertEqual(self.client.get(self.url, {'sync_token': token}).status_code, 410)
+        TicketTombstone.objects.create(
+            company=self.company, public_id=self.tickets[0].public_id, reason='deleted',
+            created_at=timezone.now() - timedelta(days=365)
+        )
+        call_command('prune_ticket_tombstones', stdout=io.StringIO())
+        self.assertFalse(TicketTombstone.objects.exists())
+
+    @skipUnless(connection.vendor == 'sqlite', 'reads the SQLite query plan')
+    def test_changes_feed_reads_the_updated_index(self):
+        self.client.force_authenticate(self.owner)
+        token = self.sync()['sync_token']
+        with CaptureQueriesContext(connection) as queries:
+            self.sync(token)
+        plan = connection.cursor().execute(f'EXPLAIN QUERY PLAN {queries.captured_queries[0]["sql"]}').fetchall()
+        self.assertIn('ticket_co_updated_id_idx', str(plan))
+
+
+@override_settings(ROOT_URLCONF='tickets.tests')
+class AsyncTicketViewTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com', auto_assign=True)
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.tickets = Ticket.objects.bulk_create([
+            Ticket(company=self.company, subject=str(i), description='...', priority=i % 3) for i in range(5)
+        ])
+        self.url = f'/api/companies/{self.company.slug}/tickets/'
+
+    def login(self, user, claims=False):
+        token = AccessToken.for_user(user)
+        if claims:
+            add_claims(token, user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_list_and_detail_match_the_sync_views(self):
+        self.login(self.owner)
+        paths = [f'{self.url}?page_size=2', f'{self.url}{self.tickets[0].public_id}/']
+        with self.settings(ROOT_URLCONF='helpdesk.urls'):
+            expected = [self.client.get(url) for url in paths]
+        for url, sync in zip(paths, expected):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, sync.content)
+            self.assertEqual(response['ETag'], sync['ETag'])
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=sync['ETag']).status_code, 304)
+
+        next_page = self.client.get(self.client.get(paths[0]).data['next'])
+        self.assertEqual(len(next_page.data['results']), 2)
+
+    @override_settings(JWT_STATELESS_AUTH=True)
+    def test_visibility_and_errors(self):
+        Ticket.objects.filter(pk=self.tickets[1].pk).update(assigned_to=self.agent)
+        self.login(self.agent, claims=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual([ticket['public_id'] for ticket in response.data['results']], [str(self.tickets[1].public_id)])
+        self.assertFalse(any('accounts_customuser' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self.client.get(f'{self.url}{self.tickets[0].public_id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'{self.url}not-a-uuid/').status_code, 404)
+        self.assertEqual(self.client.get('/api/companies/missing/tickets/').status_code, 404)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+        # anonymous callers only find a ticket by its public id
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.url).data['results'], [])
+        response = self.client.get(self.url, {'public_id': str(self.tickets[2].public_id)})
+        self.assertEqual([ticket['subject'] for ticket in response.data['results']], ['2'])
+
+    def test_list_actions_are_not_taken_for_ticket_ids(self):
+        self.login(self.owner)
+        self.assertEqual(self.client.get(f'{self.url}changes/').status_code, 200)
+
+    def test_create_routes_and_counts(self):
+        customer = User.objects.create_user(username='customer')
+        self.login(customer)
+        response = self.client.post(self.url, {'subject': 'new', 'description': '...', 'priority': 2}, format='json')
+        self.assertEqual(response.status_code, 201)
+        ticket = Ticket.objects.get(public_id=response.data['public_id'])
+        self.assertEqual((ticket.user_id, ticket.assigned_to_id), (customer.pk, self.agent.pk))
+        self.assertEqual(AgentLoad.objects.get(agent=self.agent).load, 3)
+        self.assertEqual(
+            TicketCounter.objects.get(company=self.company, status='in_progress', priority=2, assigned_to=self.agent.pk).count, 1
+        )
+
+        self.assertEqual(self.client.post(self.url, {'subject': 'new'}, format='json').status_code, 400)
+        # writes on a ticket still go through the DRF view
+        self.login(self.owner)
+        response = self.client.patch(f'{self.url}{ticket.public_id}/', {'priority': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the replica is a copy of the SQLite test database')
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_ROUTERS=['helpdesk.replicas.ReplicaRouter'])
+@modify_settings(MIDDLEWARE={'prepend': 'helpdesk.replicas.ReplicaRoutingMiddleware'})
+class ReplicaRoutingTests(APITransactionTestCase):
+    # includes the replica, a file the class adds and replicate() refreshes
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.settings['replica'] = {
+            **connections.settings['default'], 'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.owner = User.objects.create_user(username='owner', company=self.company, role='owner')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.owner)}')
+        self.url = f'/api/companies/{self.company.slug}/tickets/'
+        self.replicate()
+
+    def replicate(self):
+        """Catch the replica up with the primary."""
+        primary, replica = connections['default'], connections['replica']
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+
+    def unpin(self):
+        self.client.cookies.clear()
+        cache.clear()
+
+    def test_reads_are_consistent_for_the_writer_while_the_replica_lags(self):
+        response = self.client.post(self.url, {'subject': 'new', 'description': '...'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        detail = f"{self.url}{response.data['public_id']}/"
+        self.assertEqual(self.client.get(detail).status_code, 200)
+
+        # a token client that drops cookies is still pinned by its credentials
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(detail).status_code, 200)
+
+        # once the pin expired reads go to the replica, which hasn't seen the ticket yet
+        self.unpin()
+        self.assertEqual(self.client.get(detail).status_code, 404)
+        self.replicate()
+        self.assertEqual(self.client.get(detail).status_code, 200)
+
+    def test_safe_reads_use_the_replica_and_writes_the_primary(self):
+        Ticket.objects.create(company=self.company, subject='replicated', description='...')
+        self.replicate()
+        with CaptureQueriesContext(connection) as primary, CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(self.url)
+        self.assertEqual([ticket['subject'] for ticket in response.data['results']], ['replicated'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(replica.captured_queries)
+        self.assertFalse([query for query in primary.captured_queries if 'tickets_' in query['sql']])
+
+        # unsafe requests read the primary even when they're not pinned
+        ticket = Ticket.objects.create(company=self.company, subject='lagging', description='...')
+        self.unpin()
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.patch(f'{self.url}{ticket.public_id}/', {'priority': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica.captured_queries, [])
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.priority, 3)
+
+    def test_code_outside_requests_reads_the_primary(self):
+        Ticket.objects.create(company=self.company, subject='lagging', description='...')
+        self.assertEqual(Ticket.objects.count(), 1)
+        with read_from_replica():
+            self.assertEqual(Ticket.objects.count(), 0)
+
+
+class TicketAdminTests(APITestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name='Acme', email='acme@example.com')
+        self.other_company = Company.objects.create(name='Globex', email='globex@example.com')
+        self.agent = User.objects.create_user(username='agent', company=self.company, role='agent')
+        self.other = User.objects.create_user(username='other', company=self.company, role='agent')
+        self.customer = User.objects.create_user(username='customer')
+        self.staff = User.objects.create_superuser(username='staff', password='password123')
+        self.client.force_login(self.staff)
+        self.url = '/admin/tickets/ticket/'
+
+    def create_tickets(self, count, company=None, **fields):
+        tickets = Ticket.objects.bulk_create([
+            Ticket(company=company or self.company, user=self.customer, subject=f'Ticket {i}', description='...', **fields)
+            for i in range(count)
+        ])
+        rebuild_counters()
+        return tickets
+
+    def counters(self):
+        return set(TicketCounter.objects.filter(count__gt=0).values_list('company', 'status', 'priority', 'assigned_to', 'count'))
+
+    def assert_counters_exact(self):
+        counters, loads = self.counters(), set(AgentLoad.objects.values_list('agent', 'load'))
+        rebuild_counters()
+        self.assertEqual(counters, self.counters())
+        self.assertEqual(loads, set(AgentLoad.objects.values_list('agent', 'load')))
+
+    def action(self, action, tickets, **data):
+        return self.client.post(self.url, {
+            'action': action, '_selected_action': [str(ticket.public_id) for ticket in tickets], **data
+        })
+
+    def test_changelists_query_count_does_not_grow_with_rows(self):
+        filters = {'company': self.company.pk, 'status': 'open'}
+        self.create_tickets(2, assigned_to=self.agent)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(self.url, filters).status_code, 200)
+        self.create_tickets(40, assigned_to=self.agent)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url, filters)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 42)
+        self.assertEqual(len(many), len(few))
+        # the company filter lists only the selected company
+        self.assertFalse([query for query in many.captured_queries if 'FROM "tickets_company"' in query['sql'] and 'WHERE' not in query['sql']])
+
+        for url in ['/admin/tickets/company/', '/admin/tickets/ticketresolution/', '/admin/accounts/customuser/']:
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_close_and_reassign_actions_keep_counters_exact(self):
+        tickets = self.create_tickets(4, assigned_to=self.agent)
+        foreign = self.create_tickets(1, company=self.other_company)
+
+        response = self.action('close_tickets', tickets[:2])
+        self.assertEqual(Ticket.objects.filter(status='closed').count(), 0)
+        response = self.action('close_tickets', tickets[:2], resolution_message='Fixed')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(TicketResolution.objects.filter(message='Fixed').count(), 2)
+        self.assert_counters_exact()
+
+        self.action('reassign_tickets', [*tickets, *foreign], agent='other')
+        self.assertEqual(
+            set(Ticket.objects.values_list('subject', 'company', 'status', 'assigned_to')),
+            {
+                ('Ticket 0', self.company.pk, 'closed', self.agent.pk),
+                ('Ticket 1', self.company.pk, 'closed', self.agent.pk),
+                ('Ticket 2', self.company.pk, 'in_progress', self.other.pk),
+                ('Ticket 3', self.company.pk, 'in_progress', self.other.pk),
+                ('Ticket 0', self.other_company.pk, 'open', None),
+            }
+        )
+        self.assertEqual(TicketTombstone.objects.filter(reason='unassigned', assigned_to=self.agent.pk).count(), 2)
+        self.assertEqual(TicketEvent.objects.filter(event_type='ticket.assigned').count(), 2)
+        self.assert_counters_exact()
+
+    def test_reassign_rejects_customers_and_other_companies_agents(self):
+        tickets = self.create_tickets(2, assigned_to=self.agent)
+        User.objects.create_user(username='client', company=self.company, role='customer')
+        User.objects.create_user(username='stranger', company=self.other_company, role='agent')
+        for username in ['client', 'stranger']:
+            self.action('reassign_tickets', tickets, agent=username)
+        self.assertEqual(set(Ticket.objects.values_list('status', 'assigned_to')), {('open', self.agent.pk)})
+        self.assertFalse(TicketEvent.objects.exists())
+
+    def test_malformed_company_filter_is_ignored(self):
+        self.create_tickets(2)
+        response = self.client.get(self.url, {'company': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_edits_and_deletes_keep_counters_exact(self):
+        ticket, deleted = self.create_tickets(2, assigned_to=self.agent)
+        response = self.client.post(f'{self.url}{ticket.public_id}/change/', {
+            'priority': 3, 'assigned_to': self.other.pk, 'subject': 'Edited', 'description': '...',
+            'first_name': '', 'last_name': '', 'email': '',
+        })
+        self.assertEqual(response.status_code, 302)
+        ticket.refresh_from_db()
+        self.assertEqual((ticket.subject, ticket.priority, ticket.assigned_to_id), ('Edited', 3, self.other.pk))
+        self.assert_counters_exact()
+
+        stranger = User.objects.create_user(username='stranger', company=self.other_company, role='agent')
+        response = self.client.post(f'{self.url}{ticket.public_id}/change/', {
+            'priority': 3, 'assigned_to': stranger.pk, 'subject': 'Edited', 'description': '...',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Ticket.objects.get(pk=ticket.pk).assigned_to_id, self.other.pk)
+
+        self.action('delete_selected', [deleted], post='yes')
+        self.assertFalse(Ticket.objects.filter(pk=deleted.pk).exists())
+        self.assertTrue(TicketTombstone.objects.filter(public_id=deleted.pk, reason='deleted').exists())
+        self.assert_counters_exact()
+
+    def test_search_uses_ticket_ids_and_the_text_index(self):
+        ticket, _ = self.create_tickets(2)
+        Ticket.objects.filter(pk=ticket.pk).update(subject='Printer on fire')
+        response = self.client.get(self.url, {'q': 'printer'})
+        self.assertEqual([row.pk for row in response.context['cl'].result_list], [ticket.pk])
+        response = self.client.get(self.url, {'q': str(ticket.pk)})
+        self.assertEqual([row.pk for row in response.context['cl'].result_list], [ticket.pk])
@@ -0,0 +1,120 @@
+from collections import Counter
+
+from django.utils import timezone
+
+from .counters import apply_deltas
+from .models import Ticket, TicketResolution, TicketTombstone
+from .outbox import record_events, ticket_event
+
+
+def transition_tickets(tickets, new_status, resolution_message=None, batch_size=500):
+    """
+    Move ``tickets`` to ``new_status`` with batched UPDATEs, closing them
+    with ``resolution_message``. Closed tickets and tickets already in
+    ``new_status`` are skipped. Returns the public_ids changed.
+
+    Call inside a transaction: the rows stay locked until it ends, so the
+    counter, agent load and outbox changes commit with the tickets.
+    """
+    tickets = tickets.exclude(status='closed').exclude(status=new_status)
+    changes = {'status': new_status, 'updated_at': timezone.now()}
+    if new_status == 'closed':
+        changes['priority'] = 0
+
+    rows = list(
+        tickets.select_for_update().order_by('public_id')
+        .values_list('public_id', 'company_id', 'status', 'priority', 'assigned_to')
+    )
+    public_ids = [row[0] for row in rows]
+    for start in range(0, len(public_ids), batch_size):
+        batch = public_ids[start:start + batch_size]
+        Ticket.objects.filter(public_id__in=batch).update(**changes)
+        if new_status == 'closed':
+            # reopened tickets still carry their previous resolution
+            TicketResolution.objects.filter(ticket_id__in=batch).delete()
+            TicketResolution.objects.bulk_create([
+                TicketResolution(ticket_id=public_id, message=resolution_message)
+                for public_id in batch
+            ])
+
+    deltas = Counter()
+    for public_id, company_id, old_status, priority, assigned_to in rows:
+        deltas[(company_id, old_status, priority, assigned_to or 0)] -= 1
+        deltas[(company_id, new_status, changes.get('priority', priority), assigned_to or 0)] += 1
+    apply_deltas(deltas)
+    if new_status == 'closed':
+        record_events([
+            ticket_event(
+                'ticket.closed',
+                Ticket(public_id=public_id, company_id=company_id, assigned_to_id=assigned_to, **changes),
+                resolution_message=resolution_message
+            )
+            for public_id, company_id, _, _, assigned_to in rows
+        ])
+    return public_ids
+
+
+def reassign_tickets(tickets, agent, batch_size=500):
+    """
+    Assign the open tickets among ``tickets`` that belong to the agent's
+    company to ``agent`` and move them to in_progress, like assign_agent
+    does for one ticket. Returns the public_ids changed. Call inside a
+    transaction.
+    """
+    tickets = (
+        tickets.filter(company_id=agent.company_id)
+        .exclude(status='closed')
+        .exclude(assigned_to=agent.pk)
+    )
+    changes = {'assigned_to_id': agent.pk, 'status': 'in_progress', 'updated_at': timezone.now()}
+
+    rows = list(
+        tickets.select_for_update().order_by('public_id')
+        .values_list('public_id', 'company_id', 'status', 'priority', 'assigned_to', 'user')
+    )
+    public_ids = [row[0] for row in rows]
+    for start in range(0, len(public_ids), batch_size):
+        Ticket.objects.filter(public_id__in=public_ids[start:start + batch_size]).update(**changes)
+
+    deltas = Counter()
+    for public_id, company_id, old_status, priority, assigned_to, user in rows:
+        deltas[(company_id, old_status, priority, assigned_to or 0)] -= 1
+        deltas[(company_id, 'in_progress', priority, agent.pk)] += 1
+    apply_deltas(deltas)
+    # drop out of the previous agents' changes feeds
+    TicketTombstone.objects.bulk_create([
+        TicketTombstone(
+            company_id=company_id, public_id=public_id, user=user, assigned_to=assigned_to, reason='unassigned'
+        )
+        for public_id, company_id, _, _, assigned_to, user in rows if assigned_to is not None
+    ], batch_size=batch_size)
+    record_events([
+        ticket_event('ticket.assigned', Ticket(public_id=public_id, company_id=company_id, priority=priority, **changes))
+        for public_id, company_id, _, priority, _, _ in rows
+    ])
+    return public_ids
+
+
+def delete_tickets(tickets, batch_size=500):
+    """
+    Delete ``tickets``, leaving tombstones for the changes feed and taking
+    them off the counters. Returns how many were deleted. Call inside a
+    transaction.
+    """
+    rows = list(
+        tickets.select_for_update().order_by('public_id')
+        .values_list('public_id', 'company_id', 'status', 'priority', 'assigned_to', 'user')
+    )
+    TicketTombstone.objects.bulk_create([
+        TicketTombstone(company_id=company_id, public_id=public_id, user=user, assigned_to=assigned_to, reason='deleted')
+        for public_id, company_id, _, _, assigned_to, user in rows
+    ], batch_size=batch_size)
+    public_ids = [row[0] for row in rows]
+    for start in range(0, len(public_ids), batch_size):
+        Ticket.objects.filter(public_id__in=public_ids[start:start + batch_size]).delete()
+
+    deltas = Counter()
+    for _, company_id, status, priority, assigned_to, _ in rows:
+        deltas[(company_id, status, priority, assigned_to or 0)] -= 1
+    apply_deltas(deltas)
+    return len(rows)
@@ -1,6 +1,8 @@
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from .views import  TicketViewSet, CompanyViewSet, TicketResolutionViewset
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'companies', CompanyViewSet, basename='company')
@@ -16,6 +18,19 @@ router.register(
 )
 
 
+# the ticket list and detail routes, served by async views under ASGI; the
+# detail pk only matches UUIDs so list actions (export/, changes/, ...) reach the router
+async_urlpatterns = [
+    re_path(r'^companies/(?P<slug>[^/.]+)/tickets/$', async_views.ticket_collection, name='company-tickets-async-list'),
+    re_path(
+        r'^companies/(?P<slug>[^/.]+)/tickets/(?P<pk>[0-9a-fA-F-]{32,36})/$',
+        async_views.ticket_detail,
+        name='company-tickets-async-detail'
+    ),
+]
+
 urlpatterns = [
     path('', include(router.urls))
 ]
+if settings.ASYNC_TICKET_VIEWS:
+    urlpatterns = async_urlpatterns + urlpatterns
@@ -1,38 +1,165 @@
-from rest_framework import viewsets, status
+from rest_framework import generics, viewsets, status
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from .models import Ticket, Company
-from .serializers import TicketSerializer, CompanySerializer
+from .models import ArchivedTicket, Ticket, Company, TicketTombstone
+from .serializers import (
+    TicketSerializer, TicketListSerializer, CompanySerializer, BulkTransitionSerializer, TicketExportSerializer,
+    TicketChangesSerializer
+)
 from django.contrib.auth import get_user_model
 from uuid import UUID
+from collections import Counter
+from itertools import chain
+import hashlib
 from django.shortcuts import get_object_or_404
+from django.http import Http404, StreamingHttpResponse
 from django.db import transaction
+from django.db.models import Count, Max, Prefetch
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from accounts.permissions import CanAssignAgent
-from .permissions import CanAccessTicketResolution
+from accounts.authentication import load_user
+from .permissions import CanAccessTicketResolution, IsCompanyStaff
 from rest_framework.filters import OrderingFilter
+from .pagination import TicketCursorPagination, TicketSearchPagination
+from .parsers import NDJSONParser
+from .renderers import CSVRenderer, NDJSONRenderer
+from .exports import CSV_COLUMNS, export_records, flatten
+from .tenancy import get_request_company_id
+from .counters import apply_deltas, company_stats, counter_key, record_change
+from .search import search_tickets
+from .routing import assign, route_tickets
+from .queue import claim_next_ticket
+from .outbox import record_events, ticket_event
+from .transitions import transition_tickets
+from .sync import changes_since
+from helpdesk.middleware import timing
 
 
 User =  get_user_model()
 
-class TicketViewSet(viewsets.ModelViewSet):
+class TicketListMixin:
+    # read-only fast path for list responses, same JSON as TicketSerializer
+    def list(self, request, *args, **kwargs):
+        querysets = [TicketListSerializer.values(queryset) for queryset in self.get_list_querysets()]
+        page = self.paginate_querysets(querysets)
+        if page is not None:
+            with timing(request, 'serialize'):
+                data = TicketListSerializer(page, many=True).data
+            return self.get_paginated_response(data)
+        with timing(request, 'serialize'):
+            data = TicketListSerializer(chain(*querysets), many=True).data
+        return Response(data)
+
+    def get_archived_queryset(self):
+        # archived tickets listed next to get_queryset(), None when the caller can't read any
+        return None
+
+    def get_list_querysets(self):
+        querysets = [self.filter_queryset(self.get_queryset())]
+        archived = self.get_archived_queryset()
+        if archived is not None:
+            querysets.append(self.filter_queryset(archived))
+        return querysets
+
+    def paginate_querysets(self, querysets):
+        if len(querysets) == 1 or self.paginator is None:
+            return self.paginate_queryset(querysets[0])
+        return self.paginator.paginate_querysets(querysets, self.request, view=self)
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified validators for ticket list and detail reads.
+
+    A client sending a matching validator gets a 304 before any page is
+    fetched or serialized. Lists are validated by MAX(updated_at) and the
+    row count of the caller's querysets, details by the row's updated_at.
+    """
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.list_validators(request, [
+            queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+            for queryset in self.get_list_querysets()
+        ])
+        # a deletion doesn't move MAX(updated_at), so only the ETag can answer 304
+        not_modified = self.not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        response = super().list(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.make_etag(request, instance.updated_at.isoformat())
+        not_modified = self.not_modified(request, etag, instance.updated_at)
+        if not_modified is not None:
+            return not_modified
+        response = Response(self.get_serializer(instance).data)
+        return self.add_validators(response, etag, instance.updated_at)
+
+    def list_validators(self, request, summaries):
+        """The ETag and Last-Modified of a list from the aggregates of its querysets."""
+        count = sum(summary['count'] for summary in summaries)
+        last_modified = max(
+            (summary['last_modified'] for summary in summaries if summary['last_modified'] is not None),
+            default=None
+        )
+        return self.make_etag(request, count, last_modified and last_modified.isoformat()), last_modified
+
+    def make_etag(self, request, *parts):
+        # the path carries the cursor, page size and ordering of a list
+        key = '|'.join(str(part) for part in [request.get_full_path(), request.accepted_renderer.format, *parts])
+        return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+    def not_modified(self, request, etag, last_modified=None):
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp())
+        )
+        if response is not None:
+            response['ETag'] = etag
+            self.add_cache_headers(response)
+        return response
+
+    def add_validators(self, response, etag, last_modified):
+        if response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+            self.add_cache_headers(response)
+        return response
+
+    def add_cache_headers(self, response):
+        # responses depend on the caller, so shared caches must not reuse them
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        patch_cache_control(response, private=True, no_cache=True)
+
+
+class TicketViewSet(ConditionalGetMixin, TicketListMixin, viewsets.ModelViewSet):
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
+    pagination_class = TicketCursorPagination
+    filter_backends = [OrderingFilter]
     ordering_fields = ["priority"]
     ordering = ["-priority"]
+    bulk_max_items = 5000
+    bulk_batch_size = 500
+    export_chunk_size = 2000
+    changes_page_size = 500
     
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Ticket.objects.none()
         
-        company = get_object_or_404(
-            Company,
-            # slug=self.kwargs['slug']
-            slug = self.kwargs.get('slug')
-        )
+        company_id = get_request_company_id(self.request, self.kwargs.get('slug'))
 
-        queryset = Ticket.objects.filter(company=company)
+        queryset = Ticket.objects.filter(company_id=company_id).select_related('resolution')
         user = self.request.user
 
         if user.is_authenticated:
@@ -40,42 +167,228 @@ class TicketViewSet(viewsets.ModelViewSet):
                 return queryset
             if user.role == "agent":
                 # Agents can see tickets assigned to them
-                return queryset.filter(assigned_to=user)
+                return queryset.filter(assigned_to_id=user.pk)
             # Authenticated users can see their own tickets
-            return queryset.filter(user=user)
+            return queryset.filter(user_id=user.pk)
         else:
-            public_id = self.request.query_params.get('public_id')
-            if public_id:
-                try:
-                   uuid_obj = UUID(public_id, 4)
-                except ValueError:
-                   return queryset.none()
-                return  queryset.filter(public_id = uuid_obj)
+            public_id = self.get_public_id()
+            if public_id is not None:
+                return  queryset.filter(public_id = public_id)
         return queryset.none()
+
+    def get_archived_queryset(self):
+        # public lookups find a ticket wherever it is stored
+        if getattr(self, 'swagger_fake_view', False) or self.request.user.is_authenticated:
+            return None
+        public_id = self.get_public_id()
+        if public_id is None:
+            return None
+        company_id = get_request_company_id(self.request, self.kwargs.get('slug'))
+        return ArchivedTicket.objects.filter(company_id=company_id, public_id=public_id).select_related('resolution')
+
+    def get_public_id(self):
+        # the ?public_id= of an anonymous lookup, None when missing or not a UUID
+        try:
+            return UUID(self.request.query_params.get('public_id', ''))
+        except ValueError:
+            return None
     
+    @transaction.atomic
     def perform_create(self, serializer):
-
-        company = get_object_or_404(
-            Company,
-            slug=self.kwargs['slug']
+        company_id = get_request_company_id(self.request, self.kwargs['slug'])
+        user_id = self.request.user.pk if self.request.user.is_authenticated else None
+        # routed like the bulk create, on an unsaved copy of the fields routing reads
+        data = serializer.validated_data
+        probe = Ticket(company_id=company_id, **{
+            field: data[field] for field in ['status', 'priority', 'assigned_to'] if field in data
+        })
+        routing = {}
+        if route_tickets(company_id, [probe]):
+            data.pop('assigned_to', None)
+            routing = {'assigned_to_id': probe.assigned_to_id, 'status': probe.status}
+        ticket = serializer.save(
+            company_id=company_id,
+            user_id=user_id,
+            **routing
         )
-        user = self.request.user if self.request.user.is_authenticated else None
-        serializer.save(
-            company=company,
-            user=user
+        record_change(None, counter_key(ticket))
+        events = [ticket_event('ticket.created', ticket)]
+        if routing:
+            events.append(ticket_event('ticket.assigned', ticket))
+        record_events(events)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        key = counter_key(instance)
+        TicketTombstone.objects.create(
+            company_id=instance.company_id, public_id=instance.public_id, user=instance.user_id,
+            assigned_to=instance.assigned_to_id, reason='deleted'
         )
+        instance.delete()
+        record_change(key, None)
     
+    @action(detail=False, methods=['get'], pagination_class=TicketSearchPagination, filter_backends=[])
+    def search(self, request, slug=None):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'q': 'A search query is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # ranked full-text match within the caller's usual ticket visibility
+        queryset = search_tickets(self.get_queryset(), query).values(*TicketListSerializer.columns, 'rank')
+        page = self.paginate_queryset(queryset)
+        with timing(request, 'serialize'):
+            data = TicketListSerializer(page, many=True).data
+        return self.get_paginated_response(data)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[IsAuthenticated],
+        parser_classes=[JSONParser, NDJSONParser]
+    )
+    def bulk(self, request, slug=None):
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a list of tickets.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {'detail': f'A bulk request can create at most {self.bulk_max_items} tickets.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        company_id = get_request_company_id(request, slug)
+        # one serializer validates every item, invalid items are reported and skipped
+        serializer = self.get_serializer()
+        tickets = []
+        results = []
+        for index, item in enumerate(items):
+            try:
+                data = serializer.run_validation(item)
+            except ValidationError as exc:
+                results.append({'index': index, 'errors': exc.detail})
+                continue
+            data.pop('resolution_message', None)
+            ticket = Ticket(company_id=company_id, user_id=request.user.pk, **data)
+            tickets.append(ticket)
+            results.append({'index': index, 'public_id': str(ticket.public_id)})
+
+        with transaction.atomic():
+            routed = route_tickets(company_id, tickets)
+            Ticket.objects.bulk_create(tickets, batch_size=self.bulk_batch_size)
+            apply_deltas(Counter(counter_key(ticket) for ticket in tickets))
+            record_events(
+                [ticket_event('ticket.created', ticket) for ticket in tickets]
+                + [ticket_event('ticket.assigned', ticket) for ticket in routed]
+            )
+
+        return Response(
+            {
+                'created': len(tickets),
+                'failed': len(items) - len(tickets),
+                'results': results
+            },
+            status=status.HTTP_201_CREATED if len(tickets) == len(items) else status.HTTP_207_MULTI_STATUS
+        )
+
+    @action(detail=False, methods=['post'], permission_classes=[IsCompanyStaff])
+    def bulk_transition(self, request, slug=None):
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        new_status = data['status']
+
+        # same visibility as the list; closed tickets and no-op transitions are skipped
+        tickets = self.get_queryset()
+        if 'public_ids' in data:
+            tickets = tickets.filter(public_id__in=data['public_ids'])
+        else:
+            tickets = tickets.filter(**data['filter'])
+
+        with transaction.atomic():
+            public_ids = transition_tickets(
+                tickets, new_status, data.get('resolution_message'), batch_size=self.bulk_batch_size
+            )
+
+        return Response(
+            {
+                'updated': len(public_ids),
+                'public_ids': [str(public_id) for public_id in public_ids]
+            },
+            status=status.HTTP_200_OK
+        )
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+        filter_backends=[],
+        pagination_class=None
+    )
+    def export(self, request, slug=None):
+        filters = TicketExportSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        # same visibility as the list, streamed instead of materialized
+        tickets = self.get_queryset()
+        if 'updated_since' in filters.validated_data:
+            tickets = tickets.filter(updated_at__gte=filters.validated_data['updated_since'])
+        if 'updated_before' in filters.validated_data:
+            tickets = tickets.filter(updated_at__lt=filters.validated_data['updated_before'])
+
+        renderer = request.accepted_renderer
+        records = export_records(tickets, self.export_chunk_size)
+        if renderer.format == 'csv':
+            content = renderer.stream(flatten(records), CSV_COLUMNS)
+        else:
+            content = renderer.stream(records)
+        response = StreamingHttpResponse(content, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Content-Disposition'] = f'attachment; filename="{slug}-tickets.{renderer.format}"'
+        return response
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated], filter_backends=[], pagination_class=None)
+    def changes(self, request, slug=None):
+        params = TicketChangesSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        company_id = get_request_company_id(request, slug)
+        data = changes_since(
+            self.get_queryset(),
+            company_id,
+            request.user,
+            token=params.validated_data.get('sync_token'),
+            page_size=params.validated_data.get('page_size', self.changes_page_size)
+        )
+        return Response(data)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsCompanyStaff])
+    def claim(self, request, slug=None):
+        company_id = get_request_company_id(request, slug)
+        if request.user.company_id != company_id:
+            return Response(
+                {'detail': 'Only staff of this company can claim its tickets.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        public_id = claim_next_ticket(company_id, request.user.pk)
+        if public_id is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        ticket = Ticket.objects.select_related('resolution').get(public_id=public_id)
+        return Response(self.get_serializer(ticket).data, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['patch'], permission_classes=[CanAssignAgent])
     def assign_agent(self, request, pk=None, slug=None):
         ticket = self.get_object()
         agent_id = request.data.get('assigned_to')
         agent = get_object_or_404(User, pk=agent_id)
-        if agent.company != ticket.company:
+        if agent.company_id != ticket.company_id:
             return Response(
                 {'detail' : 'The agent does not belong to the same company as the ticket.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if ticket.assigned_to == agent:
+        if ticket.assigned_to_id == agent.pk:
             return Response(
                 {'detail' : 'This agent is already assigned to this ticket.'},
                 status = status.HTTP_400_BAD_REQUEST
@@ -85,9 +398,19 @@ class TicketViewSet(viewsets.ModelViewSet):
                 {'detail' : 'Cannot assign agent to a closed ticked.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        ticket.assigned_to = agent
-        ticket.status = 'in_progress'
-        ticket.save(update_fields=['assigned_to', 'status'])
+        old_key = counter_key(ticket)
+        old_assigned_to = ticket.assigned_to_id
+        assign(ticket, agent.pk)
+        with transaction.atomic():
+            ticket.save(update_fields=['assigned_to', 'status', 'updated_at'])
+            record_change(old_key, counter_key(ticket))
+            if old_assigned_to is not None:
+                # drops out of the previous agent's changes feed
+                TicketTombstone.objects.create(
+                    company_id=ticket.company_id, public_id=ticket.public_id, user=ticket.user_id,
+                    assigned_to=old_assigned_to, reason='unassigned'
+                )
+            record_events([ticket_event('ticket.assigned', ticket)])
         return Response(
             {'detail' : f'{agent.username} has been assigned to the ticket'},
             status=status.HTTP_200_OK
@@ -103,16 +426,30 @@ class CompanyViewSet(viewsets.ModelViewSet):
         user = self.request.user
 
         if user.is_superuser:
-            return Company.objects.all()
-        if user.company and user.role=='owner':
-            return Company.objects.filter(pk=user.company.pk)
-        return Company.objects.none()
+            queryset = Company.objects.all()
+        elif user.company_id and user.role=='owner':
+            queryset = Company.objects.filter(pk=user.company_id)
+        else:
+            return Company.objects.none()
+        return queryset.prefetch_related(
+            Prefetch(
+                'company_staff',
+                queryset=User.objects.filter(role='owner').order_by('pk').only('id', 'username', 'email', 'company'),
+                to_attr='prefetched_owners'
+            )
+        )
     
+    @action(detail=True, methods=['get'], permission_classes=[IsCompanyStaff])
+    def stats(self, request, slug=None):
+        # served from the maintained counters, never a COUNT(*) over tickets
+        company_id = get_request_company_id(request, slug)
+        return Response(company_stats(company_id), status=status.HTTP_200_OK)
+
     @transaction.atomic   
     def create(self, request, *args, **kwargs):
-        user =self.request.user
+        user = load_user(self.request.user)
         
-        if user.company and user.role == 'owner':
+        if user.company_id and user.role == 'owner':
             return Response(
                 {'error': 'You already own a company. Each user can only own one company.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -132,31 +469,49 @@ class CompanyViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class TicketResolutionViewset(viewsets.ModelViewSet):
+class TicketResolutionViewset(ConditionalGetMixin, TicketListMixin, viewsets.ModelViewSet):
     queryset = Ticket.objects.filter(status='closed').select_related('resolution')
     serializer_class = TicketSerializer
     permissson_classes = [CanAccessTicketResolution]
     http_method_names = ['get']
+    pagination_class = TicketCursorPagination
+    filter_backends = [OrderingFilter]
+    ordering_fields = ["priority"]
+    ordering = ["-priority"]
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Ticket.objects.none()
-        
-        company = get_object_or_404(
-            Company,
-            slug=self.kwargs.get('slug')
-        )
+        return self.closed_tickets(Ticket)
+
+    def get_archived_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return None
+        return self.closed_tickets(ArchivedTicket)
+
+    def closed_tickets(self, model):
+        # the same rules for hot Ticket rows and ArchivedTicket rows
+        company_id = get_request_company_id(self.request, self.kwargs.get('slug'))
         user = self.request.user
-        if user.company == company and user.role in ['owner', 'admin', 'agent']:
-            return Ticket.objects.filter(
-                company=company, 
+        if user.is_authenticated and user.company_id == company_id and user.role in ['owner', 'admin', 'agent']:
+            return model.objects.filter(
+                company_id=company_id, 
                 status='closed'
                 ).select_related('resolution')
-        if user:
-            return Ticket.objects.filter(
-                company=company,
+        if user.is_authenticated:
+            return model.objects.filter(
+                company_id=company_id,
                 status='closed',
-                user=user
+                user_id=user.pk
             ).select_related('resolution')
-        return Ticket.objects.none()
+        return model.objects.none()
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # old resolutions live in the archive
+            instance = generics.get_object_or_404(self.get_archived_queryset(), pk=self.kwargs['pk'])
+            self.check_object_permissions(self.request, instance)
+            return instance
         
\ No newline at end of file
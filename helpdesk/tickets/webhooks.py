@@ -0,0 +1,217 @@
+import hashlib
+import hmac
+import http.client
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Company, TicketEvent, WebhookEndpoint
+
+USER_AGENT = 'helpdesk-webhooks/1.0'
+# statuses worth retrying at once; other 4xx answers won't change on a resend
+RETRYABLE_STATUSES = {408, 425, 429}
+
+
+class DeliveryError(Exception):
+    pass
+
+
+class EndpointConnection:
+    """A keep-alive HTTP connection to one webhook URL, reopened after errors."""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host, self.port = parts.hostname, parts.port
+        self.path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        self.timeout = timeout
+        self.connection = None
+        # connections opened so far, for tests and reports
+        self.opened = 0
+
+    def post(self, body, headers):
+        if self.connection is None:
+            self.connection = self.connection_class(self.host, self.port, timeout=self.timeout)
+            self.opened += 1
+        try:
+            self.connection.request('POST', self.path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # a keep-alive connection the server already closed fails here too
+            self.close()
+            raise
+        if response.will_close:
+            self.close()
+        return response.status
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class WebhookDispatcher:
+    """
+    Drain the TicketEvent outbox to the companies' webhook endpoints.
+
+    Each ``run_once`` leases a batch of due events in a short transaction,
+    posts them outside any transaction, one request per ``endpoint_batch_size``
+    events of an endpoint, with endpoints served concurrently over
+    connections kept open between runs. Delivery is at least once: an event
+    any endpoint failed is sent again to all of them after a backoff, and a
+    crashed worker's lease simply expires. Receivers dedupe on the event id.
+    """
+
+    def __init__(self, batch_size=500, endpoint_batch_size=100, concurrency=8, timeout=10, tries=3,
+                 retry_backoff=0.5, max_attempts=10, lease=60):
+        self.batch_size = batch_size
+        self.endpoint_batch_size = endpoint_batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.tries = tries
+        self.retry_backoff = retry_backoff
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.connections = {}
+        self.executor = ThreadPoolExecutor(concurrency)
+
+    def close(self):
+        self.executor.shutdown()
+        for connection in self.connections.values():
+            connection.close()
+
+    def run_once(self):
+        """Deliver one batch of due events, returns ``(delivered, failed, lags_ms)``."""
+        events = self.lease_events()
+        if not events:
+            return 0, 0, []
+
+        company_ids = {event['company_id'] for event in events}
+        slugs = dict(Company.objects.filter(pk__in=company_ids).values_list('pk', 'slug'))
+        endpoints = defaultdict(list)
+        for endpoint in WebhookEndpoint.objects.filter(company_id__in=company_ids, is_active=True):
+            endpoints[endpoint.company_id].append(endpoint)
+
+        deliveries = []
+        for company_id, company_events in group_by(events, 'company_id').items():
+            for endpoint in endpoints[company_id]:
+                subscribed = [
+                    event for event in company_events
+                    if not endpoint.event_types or event['event_type'] in endpoint.event_types
+                ]
+                if subscribed:
+                    deliveries.append((endpoint, slugs[company_id], subscribed))
+
+        errors = {}
+        for failed in self.executor.map(lambda delivery: self.deliver(*delivery), deliveries):
+            errors.update(failed)
+        lags = self.finish(events, errors)
+        return len(events) - len(errors), len(errors), lags
+
+    def lease_events(self):
+        """Due undelivered events, hidden from other workers for ``lease`` seconds."""
+        connection = connections[router.db_for_write(TicketEvent)]
+        now = timezone.now()
+        with transaction.atomic(using=connection.alias):
+            due = (
+                TicketEvent.objects
+                .filter(delivered_at__isnull=True, next_attempt_at__lte=now, attempts__lt=self.max_attempts)
+                .order_by('next_attempt_at', 'id')
+            )
+            if connection.features.has_select_for_update_skip_locked:
+                # concurrent workers take the next events instead of waiting
+                due = due.select_for_update(skip_locked=True)
+            events = list(
+                due.values('id', 'company_id', 'ticket_id', 'event_type', 'payload', 'created_at', 'attempts')
+                [:self.batch_size]
+            )
+            TicketEvent.objects.filter(pk__in=[event['id'] for event in events]).update(
+                next_attempt_at=now + timedelta(seconds=self.lease)
+            )
+        # deliver in commit order within an endpoint's batch
+        events.sort(key=lambda event: event['id'])
+        return events
+
+    def deliver(self, endpoint, company_slug, events):
+        """POST ``events`` to an endpoint in chunks, returns ``{event_id: error}`` of the chunks that failed."""
+        connection = self.connections.get(endpoint.pk)
+        if connection is None or connection.url != endpoint.url:
+            connection = self.connections[endpoint.pk] = EndpointConnection(endpoint.url, self.timeout)
+        errors = {}
+        for start in range(0, len(events), self.endpoint_batch_size):
+            chunk = events[start:start + self.endpoint_batch_size]
+            body = json.dumps({
+                'company': company_slug,
+                'events': [
+                    {
+                        'id': event['id'],
+                        'type': event['event_type'],
+                        'created_at': event['created_at'].isoformat(),
+                        'ticket': event['payload'],
+                    }
+                    for event in chunk
+                ],
+            }).encode()
+            try:
+                self.post(connection, endpoint, body)
+            except DeliveryError as exc:
+                errors.update((event['id'], f'{endpoint.url}: {exc}') for event in chunk)
+        return errors
+
+    def post(self, connection, endpoint, body):
+        headers = {'Content-Type': 'application/json', 'User-Agent': USER_AGENT}
+        if endpoint.secret:
+            signature = hmac.new(endpoint.secret.encode(), body, hashlib.sha256).hexdigest()
+            headers['X-Helpdesk-Signature'] = f'sha256={signature}'
+        error = None
+        for attempt in range(self.tries):
+            if attempt:
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                status = connection.post(body, headers)
+            except (OSError, http.client.HTTPException) as exc:
+                error = f'{type(exc).__name__}: {exc}'
+                continue
+            if 200 <= status < 300:
+                return
+            error = f'HTTP {status}'
+            if 400 <= status < 500 and status not in RETRYABLE_STATUSES:
+                break
+        raise DeliveryError(error)
+
+    def finish(self, events, errors):
+        """Mark delivered events and reschedule failed ones, returns the delivery lags in ms."""
+        now = timezone.now()
+        delivered = [event for event in events if event['id'] not in errors]
+        TicketEvent.objects.filter(pk__in=[event['id'] for event in delivered]).update(delivered_at=now)
+        retried = defaultdict(list)
+        for event in events:
+            if event['id'] in errors:
+                retried[(event['attempts'], errors[event['id']])].append(event['id'])
+        for (attempts, error), ids in retried.items():
+            TicketEvent.objects.filter(pk__in=ids).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + timedelta(seconds=self.backoff(attempts + 1)),
+                last_error=error[:1000]
+            )
+        return [(now - event['created_at']).total_seconds() * 1000 for event in delivered]
+
+    def backoff(self, attempts):
+        """Seconds before an event failed ``attempts`` times is tried again, capped at an hour."""
+        return min(30 * 2 ** (attempts - 1), 3600)
+
+
+def group_by(rows, key):
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row[key]].append(row)
+    return groups